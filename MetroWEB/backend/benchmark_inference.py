@@ -0,0 +1,174 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+
+# --- BENCHMARK DE INFERÊNCIA (BACKBONES, OUTPUT STRIDE, RESOLUÇÃO) ---
+# Mede cada variante de network.modeling com pesos aleatórios (nenhum download)
+# varrendo resolução de entrada, tamanho do lote e número de threads do torch.
+# Cada configuração roda num processo próprio (threads e pico de memória não
+# vazam de uma medição para a outra). O resultado sai em JSON.
+#
+# Uso:
+#   python benchmark_inference.py --output bench_antes.json
+#   python benchmark_inference.py --archs deeplabv3plus_mobilenet --sizes 512 1024 --threads 1 4
+#   python benchmark_inference.py --compare bench_antes.json bench_depois.json --tolerance 10
+
+ARQUITETURAS_PADRAO = ['deeplabv3plus_resnet101', 'deeplabv3plus_resnet50', 'deeplabv3plus_mobilenet']
+CAMPOS_CONFIG = ('arch', 'output_stride', 'size', 'batch_size', 'threads')
+
+
+def chave_config(config):
+    """Identifica a configuração (usada para casar as medições de duas execuções)."""
+    return tuple(config[campo] for campo in CAMPOS_CONFIG)
+
+
+def pico_rss_mb():
+    """Pico de memória residente do processo atual (MB), ou None se a plataforma não informar."""
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa em KB, macOS em bytes
+        return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except (ImportError, AttributeError):
+        return None
+
+
+# --- 1. MEDIÇÃO DE UMA CONFIGURAÇÃO (roda no processo filho) ---
+def medir_config(config, repeticoes, aquecimento, num_classes=4, seed=0):
+    import torch
+    import network
+    from model_compare import medir_latencia
+
+    torch.manual_seed(seed)
+    torch.set_num_threads(config['threads'])
+    model = network.modeling.__dict__[config['arch']](
+        num_classes=num_classes, output_stride=config['output_stride'], pretrained_backbone=False)
+    model.eval()
+
+    # Mesma faixa de valores da inferência real (0-255, sem normalização)
+    entrada = torch.rand(config['batch_size'], 3, config['size'], config['size']) * 255
+    latencia = medir_latencia(model, entrada, repeticoes=repeticoes, aquecimento=aquecimento)
+    return {
+        **config,
+        **latencia,
+        "imagens_por_segundo": round(config['batch_size'] * 1000 / latencia["media_ms"], 3),
+        "pico_rss_mb": pico_rss_mb(),
+    }
+
+
+def ambiente():
+    import torch
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "plataforma": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+        "nucleos": os.cpu_count(),
+    }
+
+
+# --- 2. VARREDURA (um subprocesso por configuração) ---
+def rodar_suite(configs, repeticoes, aquecimento):
+    resultados = []
+    for i, config in enumerate(configs, start=1):
+        print(f"[{i}/{len(configs)}] {json.dumps(config)}", file=sys.stderr)
+        processo = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--_config', json.dumps(config),
+             '--repeats', str(repeticoes), '--warmup', str(aquecimento)],
+            capture_output=True, text=True
+        )
+        if processo.returncode != 0:
+            erro = processo.stderr.strip().splitlines()[-1:] or ['(sem saída)']
+            print(f"  falhou: {erro[0]}", file=sys.stderr)
+            resultados.append({**config, "error": erro[0]})
+            continue
+        resultado = json.loads(processo.stdout)
+        print(f"  p50 {resultado['p50_ms']} ms | {resultado['imagens_por_segundo']} img/s | "
+              f"pico {resultado['pico_rss_mb']} MB", file=sys.stderr)
+        resultados.append(resultado)
+    return resultados
+
+
+# --- 3. COMPARAÇÃO ENTRE DUAS EXECUÇÕES ---
+def comparar_execucoes(antes, depois, tolerancia_percentual=10.0):
+    """Casa as configurações das duas execuções e marca regressões de latência (p50/p95) e memória."""
+    por_chave = {chave_config(r): r for r in antes["resultados"] if "error" not in r}
+    comparacoes = []
+    for novo in depois["resultados"]:
+        antigo = por_chave.get(chave_config(novo))
+        if antigo is None or "error" in novo:
+            continue
+        variacoes = {}
+        for campo in ("p50_ms", "p95_ms", "pico_rss_mb"):
+            if antigo.get(campo) and novo.get(campo) is not None:
+                variacoes[campo] = round((novo[campo] - antigo[campo]) / antigo[campo] * 100, 2)
+        comparacoes.append({
+            **{campo: novo[campo] for campo in CAMPOS_CONFIG},
+            "variacao_percentual": variacoes,
+            "regressao": any(v > tolerancia_percentual for v in variacoes.values()),
+        })
+    return {
+        "tolerancia_percentual": tolerancia_percentual,
+        "regressoes": sum(c["regressao"] for c in comparacoes),
+        "comparacoes": comparacoes,
+    }
+
+
+# --- 4. PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark de inferência das variantes do DeepLabV3+')
+    parser.add_argument('--archs', nargs='+', default=ARQUITETURAS_PADRAO, help='Funções de network.modeling')
+    parser.add_argument('--output_strides', nargs='+', type=int, default=[8, 16], choices=[8, 16])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[512], help='Lado da entrada quadrada (px)')
+    parser.add_argument('--batch_sizes', nargs='+', type=int, default=[1])
+    parser.add_argument('--threads', nargs='+', type=int, default=[os.cpu_count() or 1],
+                        help='Valores de torch.set_num_threads')
+    parser.add_argument('--repeats', type=int, default=10, help='Forwards medidos por configuração')
+    parser.add_argument('--warmup', type=int, default=2, help='Forwards de aquecimento (não medidos)')
+    parser.add_argument('--output', help='Arquivo JSON de saída (padrão: stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DEPOIS'),
+                        help='Compara dois JSON do benchmark e marca regressões')
+    parser.add_argument('--tolerance', type=float, default=10.0,
+                        help='Aumento percentual (p50/p95/memória) considerado regressão')
+    parser.add_argument('--_config', help=argparse.SUPPRESS)  # uso interno: mede uma configuração
+    args = parser.parse_args()
+
+    if args._config:
+        print(json.dumps(medir_config(json.loads(args._config), args.repeats, args.warmup)))
+        sys.exit(0)
+
+    if args.compare:
+        execucoes = []
+        for caminho in args.compare:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                execucoes.append(json.load(f))
+        relatorio = comparar_execucoes(execucoes[0], execucoes[1], args.tolerance)
+        print(json.dumps(relatorio, indent=2))
+        # Código de saída 1 quando houver regressão (útil em scripts)
+        sys.exit(1 if relatorio["regressoes"] else 0)
+
+    configs = [dict(zip(CAMPOS_CONFIG, valores)) for valores in itertools.product(
+        args.archs, args.output_strides, args.sizes, args.batch_sizes, args.threads)]
+    relatorio = {
+        "ambiente": ambiente(),
+        "repeticoes": args.repeats,
+        "aquecimento": args.warmup,
+        "resultados": rodar_suite(configs, args.repeats, args.warmup),
+    }
+
+    saida = json.dumps(relatorio, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(saida)
+        print(f"Resultados salvos em '{args.output}'", file=sys.stderr)
+    else:
+        print(saida)
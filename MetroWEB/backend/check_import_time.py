@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# --- ORÇAMENTO DE TEMPO DE IMPORTAÇÃO DOS SCRIPTS ---
+# O server.js inicia inference_test.py, get_ifc_areas.py e process_ifc.py a cada
+# pedido; o import desses módulos é pago em toda requisição. Este script mede o
+# import de cada um com `python -X importtime` (melhor de N execuções, num
+# processo novo) e falha (código de saída 1) quando:
+#   - o tempo passa do orçamento (multiplicado por --fator, para máquinas lentas), ou
+#   - um módulo pesado que só deve ser importado sob demanda (torch, cv2, ...) aparece.
+#
+# Uso:
+#   python check_import_time.py
+#   python check_import_time.py --fator 2 --repeticoes 10
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+# orcamento_ms: import completo do módulo (cumulativo) numa máquina de desenvolvimento
+ENTRADAS = {
+    'inference_test': {'orcamento_ms': 400, 'proibidos': ['torch', 'cv2', 'matplotlib', 'network']},
+    'get_ifc_areas': {'orcamento_ms': 150, 'proibidos': ['ifcopenshell', 'numpy', 'torch']},
+    'process_ifc': {'orcamento_ms': 150, 'proibidos': ['ifcopenshell', 'numpy', 'torch']},
+}
+
+
+def medir_import(modulo):
+    """(tempo cumulativo do import em ms, módulos importados) num processo novo."""
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+        cwd=base_dir, capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"'import {modulo}' falhou: {processo.stderr.strip().splitlines()[-1:]}")
+    tempo_us, importados = None, set()
+    for linha in processo.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <indentação><módulo>"
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, cumulativo, nome = linha[len('import time:'):].split('|')
+        importados.add(nome.strip())
+        if nome.strip() == modulo and not nome[1:].startswith(' '):
+            tempo_us = int(cumulativo)
+    return (tempo_us or 0) / 1000, importados
+
+
+def verificar(entradas=ENTRADAS, repeticoes=5, fator=1.0):
+    resultados = {}
+    for modulo, regra in entradas.items():
+        medicoes = [medir_import(modulo) for _ in range(repeticoes)]
+        tempo_ms = min(tempo for tempo, _ in medicoes)
+        pesados = sorted(nome for nome in regra['proibidos']
+                         if any(m == nome or m.startswith(nome + '.') for m in medicoes[0][1]))
+        orcamento = regra['orcamento_ms'] * fator
+        resultados[modulo] = {
+            "import_ms": round(tempo_ms, 1),
+            "orcamento_ms": round(orcamento, 1),
+            "modulos_pesados": pesados,
+            "ok": tempo_ms <= orcamento and not pesados,
+        }
+    return resultados
+
+
+# --- PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Verifica o tempo de importação dos scripts chamados pelo server.js')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Execuções por módulo (vale a mais rápida)')
+    parser.add_argument('--fator', type=float, default=1.0, help='Multiplica os orçamentos (máquinas mais lentas)')
+    parser.add_argument('--modulos', nargs='+', choices=sorted(ENTRADAS), help='Só estes módulos')
+    args = parser.parse_args()
+
+    entradas = {m: ENTRADAS[m] for m in (args.modulos or ENTRADAS)}
+    resultados = verificar(entradas, repeticoes=args.repeticoes, fator=args.fator)
+    for modulo, r in resultados.items():
+        situacao = "ok" if r["ok"] else "FALHOU"
+        extra = f" (importa {', '.join(r['modulos_pesados'])})" if r["modulos_pesados"] else ""
+        print(f"{modulo}: {r['import_ms']} ms / orçamento {r['orcamento_ms']} ms - {situacao}{extra}", file=sys.stderr)
+    print(json.dumps(resultados, indent=2))
+    sys.exit(0 if all(r["ok"] for r in resultados.values()) else 1)
@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# --- CONVERSÃO PARA PESOS MAPEADOS EM MEMÓRIA ---
+# O Var_2plus_weights_28.Pt é o objeto DeepLabV3 inteiro serializado com pickle:
+# carregar exige weights_only=False, desserializa cada módulo, copia todos os
+# tensores para a memória do processo e quebra quando as classes de network/ mudam.
+#
+# Este script grava ao lado do .Pt um .weights.pt com a descrição da arquitetura
+# (network.weights.describe_architecture) e o state_dict (só tensores e tipos
+# simples, carregável com weights_only=True) e a assinatura do .Pt de origem
+# (tamanho, mtime e sha256). O carregar_modelo do inference_test.py passa a usar
+# esse arquivo sozinho quando ele existe e veio do .Pt atual (se o .Pt foi
+# substituído, volta ao pickle com um aviso):
+# a arquitetura é montada no device 'meta' (sem alocar pesos) e os tensores são
+# mapeados do arquivo (mmap) e atribuídos sem cópia. Os processos que carregam o
+# mesmo arquivo (worker, pool, scripts do server.js) compartilham as páginas
+# pelo cache do SO.
+#
+# Uso:
+#   python convert_weights.py --model_path Var_2plus_weights_28.Pt
+#   python convert_weights.py --model_path Var_2plus_weights_28.Pt --report   (tempo e RSS dos dois formatos)
+
+SUFIXO_PESOS = '.weights.pt'
+TAMANHO_VERIFICACAO = 512
+
+# Roda num processo novo: tempo de carga e memória (VmRSS/RssAnon/RssFile) antes
+# e depois de um forward. RssFile são páginas do arquivo, compartilháveis.
+_CODIGO_MEDICAO = r'''
+import json, sys, time
+import torch
+caminho, formato, tamanho = sys.argv[1], sys.argv[2], int(sys.argv[3])
+
+def memoria_mb():
+    valores = {}
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                nome, _, resto = linha.partition(':')
+                if nome in ('VmRSS', 'RssAnon', 'RssFile'):
+                    valores[nome] = round(int(resto.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return valores
+
+antes = memoria_mb()
+inicio = time.perf_counter()
+if formato == 'pickle':
+    from network._deeplab import DeepLabV3
+    torch.serialization.add_safe_globals([DeepLabV3])
+    model = torch.load(caminho, map_location='cpu', weights_only=False).eval()
+else:
+    from network.weights import load_weights
+    model, _ = load_weights(caminho)
+carga = time.perf_counter() - inicio
+depois_carga = memoria_mb()
+with torch.no_grad():
+    model(torch.zeros(1, 3, tamanho, tamanho))
+print(json.dumps({"carregamento_s": round(carga, 3), "memoria_inicial_mb": antes,
+                  "memoria_apos_carga_mb": depois_carga, "memoria_apos_forward_mb": memoria_mb()}))
+'''
+
+
+def caminho_pesos_para(model_path):
+    """Caminho do .weights.pt correspondente a um checkpoint (.Pt -> .weights.pt ao lado)."""
+    return os.path.splitext(model_path)[0] + SUFIXO_PESOS
+
+
+def assinatura_checkpoint(model_path):
+    """Identifica o .Pt de origem dentro do .weights.pt (guardada por save_weights)."""
+    from prediction_cache import hash_arquivo
+
+    info = os.stat(model_path)
+    return {"tamanho": info.st_size, "mtime_ns": info.st_mtime_ns, "sha256": hash_arquivo(model_path)}
+
+
+def origem_confere(model_path):
+    """
+    check_source do network.weights.load_weights: os pesos vieram deste .Pt?
+    Tamanho e mtime iguais bastam; com outro mtime (cópia, checkout...) o sha256 decide.
+    """
+    def conferir(origem):
+        if not origem:
+            return False  # convertido antes de a origem ser registrada
+        info = os.stat(model_path)
+        if origem.get("tamanho") != info.st_size:
+            return False
+        if origem.get("mtime_ns") == info.st_mtime_ns:
+            return True
+        from prediction_cache import hash_arquivo
+        return origem.get("sha256") == hash_arquivo(model_path)
+    return conferir
+
+
+def pesos_mapeaveis(model_path):
+    """
+    (arquivo de pesos a tentar no lugar de model_path, conferência da origem):
+    (model_path, None) se já for um .weights.pt, (.weights.pt ao lado, origem_confere)
+    se ele existir, ou (None, None).
+    """
+    if model_path.endswith(SUFIXO_PESOS):
+        return model_path, None
+    caminho_pesos = caminho_pesos_para(model_path)
+    if os.path.exists(caminho_pesos):
+        return caminho_pesos, origem_confere(model_path)
+    return None, None
+
+
+# --- 1. CONVERSÃO ---
+def carregar_pickle(model_path):
+    """O objeto DeepLabV3 completo do .Pt (sem passar pelo .weights.pt)."""
+    import torch
+    from network._deeplab import DeepLabV3
+
+    torch.serialization.add_safe_globals([DeepLabV3])
+    return torch.load(model_path, map_location='cpu', weights_only=False).eval()
+
+
+def converter(model_path, destino=None, verificar=True):
+    """Grava o .weights.pt e, com verificar, confere que o modelo remontado dá os mesmos logits."""
+    import torch
+    from network.weights import describe_architecture, load_weights, save_weights
+
+    destino = destino or caminho_pesos_para(model_path)
+    model = carregar_pickle(model_path)
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    save_weights(model, temporario, source=assinatura_checkpoint(model_path))
+    os.replace(temporario, destino)
+    resultado = {"origem": model_path, "destino": destino,
+                 "arquitetura": describe_architecture(model),
+                 "tamanho_mb": round(os.path.getsize(destino) / (1024 * 1024), 1)}
+
+    if verificar:
+        remontado, _ = load_weights(destino)
+        entrada = torch.randn(1, 3, TAMANHO_VERIFICACAO, TAMANHO_VERIFICACAO, generator=torch.Generator().manual_seed(0))
+        with torch.no_grad():
+            diferenca = (model(entrada) - remontado(entrada)).abs().max().item()
+        resultado["diferenca_maxima_logits"] = diferenca
+        if diferenca != 0:
+            raise ValueError(f"O modelo remontado de '{destino}' diverge do original (diferença {diferenca})")
+    return resultado
+
+
+# --- 2. RELATÓRIO (TEMPO E MEMÓRIA) ---
+def medir_carregamento(caminho, formato, tamanho=TAMANHO_VERIFICACAO):
+    """Mede carga e memória de um formato ('pickle' ou 'mmap') num processo novo."""
+    processo = subprocess.run(
+        [sys.executable, '-c', _CODIGO_MEDICAO, caminho, formato, str(tamanho)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"Medição de '{caminho}' falhou: {processo.stderr.strip().splitlines()[-1:]}")
+    return json.loads(processo.stdout)
+
+
+def relatorio_carregamento(model_path, caminho_pesos, repeticoes=3):
+    """Melhor de N processos para cada formato, com o ganho de tempo de carga."""
+    relatorio = {}
+    for formato, caminho in (('pickle', model_path), ('mmap', caminho_pesos)):
+        medicoes = [medir_carregamento(caminho, formato) for _ in range(repeticoes)]
+        relatorio[formato] = min(medicoes, key=lambda m: m["carregamento_s"])
+    pickle_s, mmap_s = relatorio['pickle']["carregamento_s"], relatorio['mmap']["carregamento_s"]
+    relatorio["aceleracao_carregamento"] = round(pickle_s / mmap_s, 2) if mmap_s > 0 else None
+    return relatorio
+
+
+# --- 3. PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Converte o modelo .Pt (pickle) em pesos mapeáveis em memória')
+    parser.add_argument('--model_path', required=True, help='Caminho para o modelo .Pt (objeto completo)')
+    parser.add_argument('--output', default=None, help='Arquivo de saída (padrão: .weights.pt ao lado do .Pt)')
+    parser.add_argument('--no_verify', action='store_true', help='Não confere os logits do modelo remontado')
+    parser.add_argument('--report', action='store_true',
+                        help='Mede tempo de carga e memória dos dois formatos (processos novos)')
+    parser.add_argument('--repeticoes', type=int, default=3, help='Processos por formato no --report')
+    args = parser.parse_args()
+
+    try:
+        resultado = converter(args.model_path, args.output, verificar=not args.no_verify)
+    except (ValueError, NotImplementedError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+    print(f"Pesos gravados em '{resultado['destino']}' ({resultado['tamanho_mb']} MB)", file=sys.stderr)
+    if args.report:
+        resultado["relatorio"] = relatorio_carregamento(args.model_path, resultado["destino"], args.repeticoes)
+    print(json.dumps(resultado, indent=2))
@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+from convert_weights import SUFIXO_PESOS
+from inference_test import MAPEAMENTO_ID_NOME, carregar_modelo, listar_imagens
+from model_compare import carregar_tensores, comparar_predicoes, medir_latencia, prever_mapas, tamanho_modelo_mb
+
+# --- DISTILAÇÃO: DEEPLABV3+ RESNET-101 (PROFESSOR) -> MOBILENETV2 (ALUNO) ---
+# Só existe o checkpoint ResNet-101 de produção, várias vezes mais lento na CPU
+# que o deeplabv3plus_mobilenet de network.modeling. Aqui o modelo de produção
+# é o professor: em cada passo um lote de recortes aleatórios de fotos da obra
+# (sem rótulo) passa pelos dois modelos, e o aluno aprende os logits suavizados
+# do professor (KL com temperatura, multiplicada por T^2) mais, com peso alpha,
+# a entropia cruzada com a classe escolhida pelo professor.
+#
+# O lote e o aumento de dados de cada passo saem de uma semente derivada de
+# (--seed, passo): continuar de um checkpoint (--resume) repete exatamente os
+# lotes que faltavam. O checkpoint (aluno, otimizador, passo, histórico) é
+# gravado a cada --salvar_cada passos e no fim.
+#
+# O aluno final é salvo no formato do convert_weights.py (.weights.pt, usável
+# direto em inference_test.py --model_path) e o relatório compara professor e
+# aluno em fotos de avaliação: latência, tamanho e contagem de pixels por classe.
+#
+# Uso:
+#   python distill.py --model_path Var_2plus_weights_28.Pt --image_dir fotos_obra/ --passos 20000
+#   python distill.py --model_path Var_2plus_weights_28.Pt --image_dir fotos_obra/ --passos 20000 --resume
+#   python distill.py --model_path Var_2plus_weights_28.Pt --image_dir fotos_obra/ \
+#       --passos 4 --batch_size 2 --crop 128 --max_eval 2   (teste rápido na CPU)
+
+TAMANHO_BASE = 512  # tamanho de entrada usado na inferência (foto redimensionada para 512x512)
+
+
+# --- 1. DADOS (RECORTES ALEATÓRIOS DAS FOTOS, SEM RÓTULO) ---
+def gerador_do_passo(seed, passo):
+    """Gerador do torch só deste passo: mesmo lote e mesmo aumento ao continuar do checkpoint."""
+    return torch.Generator().manual_seed(seed * 1_000_003 + passo)
+
+
+def recorte_aleatorio(caminho, crop, escala_min, escala_max, gerador):
+    """
+    Foto redimensionada como na inferência (quadrada, TAMANHO_BASE x escala aleatória),
+    recorte crop x crop e espelhamento horizontal aleatórios -> tensor 3 x crop x crop (0-255).
+    """
+    escala = escala_min + (escala_max - escala_min) * torch.rand(1, generator=gerador).item()
+    lado = max(crop, int(round(TAMANHO_BASE * escala)))
+    x, y = (int(v) for v in torch.randint(0, lado - crop + 1, (2,), generator=gerador))
+    espelhar = bool(torch.rand(1, generator=gerador).item() < 0.5)
+
+    imagem = Image.open(caminho)
+    imagem.draft('RGB', (lado, lado))
+    imagem = imagem.convert('RGB').resize((lado, lado), Image.BILINEAR).crop((x, y, x + crop, y + crop))
+    if espelhar:
+        imagem = imagem.transpose(Image.FLIP_LEFT_RIGHT)
+    return torch.from_numpy(np.array(imagem, dtype=np.float32)).permute(2, 0, 1)
+
+
+def montar_lote(caminhos, passo, seed, batch_size, crop, escala_min, escala_max, pool):
+    """Lote batch_size x 3 x crop x crop do passo (fotos decodificadas em paralelo)."""
+    gerador = gerador_do_passo(seed, passo)
+    indices = torch.randint(0, len(caminhos), (batch_size,), generator=gerador).tolist()
+    sementes = torch.randint(0, 2 ** 31 - 1, (batch_size,), generator=gerador).tolist()
+    recortes = pool.map(lambda item: recorte_aleatorio(caminhos[item[0]], crop, escala_min, escala_max,
+                                                       torch.Generator().manual_seed(item[1])),
+                        zip(indices, sementes))
+    return torch.stack(list(recortes))
+
+
+# --- 2. MODELOS E PERDA ---
+def numero_de_classes(professor, device):
+    """Canais de saída do professor (funciona também para TorchScript/INT8)."""
+    with torch.no_grad():
+        return professor(torch.zeros(1, 3, 64, 64, device=device)).shape[1]
+
+
+def criar_aluno(num_classes, output_stride=16, pretrained_backbone=False):
+    """DeepLabV3+ MobileNetV2 de network.modeling, em modo de treino."""
+    from network.modeling import deeplabv3plus_mobilenet
+    return deeplabv3plus_mobilenet(num_classes=num_classes, output_stride=output_stride,
+                                   pretrained_backbone=pretrained_backbone).train()
+
+
+def perda_distilacao(logits_aluno, logits_professor, temperatura=2.0, alpha=0.5):
+    """KL(professor || aluno) com temperatura (x T^2) + alpha x entropia cruzada com o argmax do professor."""
+    kl = F.kl_div(F.log_softmax(logits_aluno / temperatura, dim=1),
+                  F.log_softmax(logits_professor / temperatura, dim=1),
+                  reduction='none', log_target=True).sum(dim=1).mean() * temperatura ** 2
+    if not alpha:
+        return kl, {"kl": kl.item()}
+    ce = F.cross_entropy(logits_aluno, logits_professor.argmax(dim=1))
+    return kl + alpha * ce, {"kl": kl.item(), "ce": ce.item()}
+
+
+# --- 3. CHECKPOINT ---
+def salvar_checkpoint(caminho, passo, aluno, otimizador, config, historico):
+    estado = {"passo": passo, "aluno": aluno.state_dict(), "otimizador": otimizador.state_dict(),
+              "config": config, "historico": historico}
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    torch.save(estado, temporario)
+    os.replace(temporario, caminho)
+
+
+def carregar_checkpoint(caminho, aluno, otimizador, config):
+    """Restaura aluno e otimizador; devolve (passo, histórico). A arquitetura do aluno precisa ser a mesma."""
+    estado = torch.load(caminho, map_location='cpu', weights_only=True)
+    for chave in ('num_classes', 'output_stride'):
+        if estado["config"].get(chave) != config[chave]:
+            raise ValueError(f"Checkpoint '{caminho}' tem {chave}={estado['config'].get(chave)}, "
+                             f"o aluno atual tem {config[chave]}")
+    aluno.load_state_dict(estado["aluno"])
+    otimizador.load_state_dict(estado["otimizador"])
+    return estado["passo"], estado["historico"]
+
+
+# --- 4. TREINO ---
+def distilar(professor, aluno, caminhos, device, config, checkpoint=None, retomar=False, salvar_cada=100,
+             log_cada=10, threads_decodificacao=2):
+    """
+    Treina o aluno até config['passos'] com os logits do professor.
+    config: passos, batch_size, crop, escala_min, escala_max, lr, temperatura, alpha, seed,
+    num_classes, output_stride. Devolve o histórico de perdas [{passo, perda, kl, ce, lr}].
+    """
+    otimizador = torch.optim.SGD(aluno.parameters(), lr=config["lr"], momentum=0.9, weight_decay=1e-4)
+    passo, historico = 0, []
+    if retomar and checkpoint and os.path.exists(checkpoint):
+        passo, historico = carregar_checkpoint(checkpoint, aluno, otimizador, config)
+        print(f"Continuando do passo {passo} ('{checkpoint}')", file=sys.stderr)
+
+    professor.eval()
+    aluno.to(device).train()
+    inicio = time.perf_counter()
+    passo_inicial = passo
+    with ThreadPoolExecutor(max_workers=threads_decodificacao) as pool:
+        while passo < config["passos"]:
+            lote = montar_lote(caminhos, passo, config["seed"], config["batch_size"], config["crop"],
+                               config["escala_min"], config["escala_max"], pool).to(device)
+            # LR polinomial (potência 0.9), calculada do passo: não depende de estado ao continuar
+            lr = config["lr"] * (1 - passo / config["passos"]) ** 0.9
+            for grupo in otimizador.param_groups:
+                grupo["lr"] = lr
+
+            torch.manual_seed(config["seed"] * 1_000_003 + passo)  # dropout do ASPP/head
+            with torch.no_grad():
+                logits_professor = professor(lote).float()
+            perda, partes = perda_distilacao(aluno(lote), logits_professor, config["temperatura"], config["alpha"])
+            otimizador.zero_grad(set_to_none=True)
+            perda.backward()
+            otimizador.step()
+            passo += 1
+
+            historico.append({"passo": passo, "perda": round(perda.item(), 5),
+                              **{k: round(v, 5) for k, v in partes.items()}, "lr": round(lr, 7)})
+            if passo % log_cada == 0 or passo == config["passos"]:
+                velocidade = (passo - passo_inicial) / (time.perf_counter() - inicio)
+                print(f"passo {passo}/{config['passos']}: perda {perda.item():.4f} "
+                      f"(lr {lr:.2e}, {velocidade:.2f} passo/s)", file=sys.stderr)
+            if checkpoint and (passo % salvar_cada == 0 or passo == config["passos"]):
+                salvar_checkpoint(checkpoint, passo, aluno, otimizador, config, historico)
+    return historico
+
+
+# --- 5. RELATÓRIO ---
+def iou_por_classe(mapas_professor, mapas_aluno):
+    """IoU do aluno tendo as predições do professor como referência, nas classes do progresso."""
+    resultado = {}
+    for class_id, class_name in MAPEAMENTO_ID_NOME.items():
+        intersecao = uniao = 0
+        for ref, var in zip(mapas_professor, mapas_aluno):
+            intersecao += int(np.count_nonzero((ref == class_id) & (var == class_id)))
+            uniao += int(np.count_nonzero((ref == class_id) | (var == class_id)))
+        resultado[class_name] = round(intersecao / uniao, 4) if uniao else None
+    return resultado
+
+
+def relatorio_distilacao(professor, aluno, tensores_avaliacao, repeticoes=5):
+    """Latência, tamanho e contagem de pixels por classe (aluno vs professor)."""
+    aluno.eval()
+    entrada = tensores_avaliacao[0]
+    latencia_professor = medir_latencia(professor, entrada, repeticoes=repeticoes)
+    latencia_aluno = medir_latencia(aluno, entrada, repeticoes=repeticoes)
+    mapas_professor = prever_mapas(professor, tensores_avaliacao)
+    mapas_aluno = prever_mapas(aluno, tensores_avaliacao)
+    return {
+        "latencia_professor": latencia_professor,
+        "latencia_aluno": latencia_aluno,
+        "speedup": round(latencia_professor["p50_ms"] / latencia_aluno["p50_ms"], 2),
+        "tamanho_professor_mb": tamanho_modelo_mb(professor),
+        "tamanho_aluno_mb": tamanho_modelo_mb(aluno),
+        "imagens_avaliadas": len(tensores_avaliacao),
+        "iou_por_classe": iou_por_classe(mapas_professor, mapas_aluno),
+        **comparar_predicoes(mapas_professor, mapas_aluno),
+    }
+
+
+# --- 6. PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Distila o DeepLabV3+ ResNet-101 num DeepLabV3+ MobileNetV2')
+    parser.add_argument('--model_path', required=True, help='Modelo professor (.Pt de produção)')
+    parser.add_argument('--image_dir', required=True, nargs='+', help='Pasta(s) com fotos da obra (sem rótulo)')
+    parser.add_argument('--eval_dir', help='Pasta com fotos para o relatório (padrão: as de treino)')
+    parser.add_argument('--max_eval', type=int, default=8, help='Máximo de fotos usadas no relatório')
+    parser.add_argument('--output', help=f'Aluno final (padrão: <modelo>_mobilenet{SUFIXO_PESOS})')
+    parser.add_argument('--checkpoint', help='Checkpoint do treino (padrão: <output>.ckpt)')
+    parser.add_argument('--resume', action='store_true', help='Continua do checkpoint, se existir')
+    parser.add_argument('--passos', type=int, default=20000, help='Total de passos de otimização')
+    parser.add_argument('--batch_size', type=int, default=8, help='Recortes por passo')
+    parser.add_argument('--crop', type=int, default=384, help='Lado do recorte aleatório (px)')
+    parser.add_argument('--escala_min', type=float, default=0.75, help='Escala mínima sobre a entrada de 512 px')
+    parser.add_argument('--escala_max', type=float, default=1.5, help='Escala máxima sobre a entrada de 512 px')
+    parser.add_argument('--lr', type=float, default=0.01, help='Taxa de aprendizado inicial (SGD, decaimento poly)')
+    parser.add_argument('--temperatura', type=float, default=2.0, help='Temperatura da distilação')
+    parser.add_argument('--alpha', type=float, default=0.5, help='Peso da entropia cruzada com o argmax do professor')
+    parser.add_argument('--output_stride', type=int, default=16, choices=[8, 16], help='Output stride do aluno')
+    parser.add_argument('--pretrained_backbone', action='store_true',
+                        help='Começa o aluno com o MobileNetV2 pré-treinado no ImageNet (baixa os pesos)')
+    parser.add_argument('--seed', type=int, default=0, help='Semente dos lotes e do aumento de dados')
+    parser.add_argument('--salvar_cada', type=int, default=100, help='Passos entre checkpoints')
+    parser.add_argument('--decode_threads', type=int, default=2, help='Threads decodificando as fotos do lote')
+    parser.add_argument('--cpu', action='store_true', help='Força a CPU mesmo com GPU disponível')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Forwards medidos por modelo na latência')
+    args = parser.parse_args()
+
+    caminhos = listar_imagens(args.image_dir)
+    if not caminhos:
+        parser.error('Nenhuma imagem encontrada em --image_dir')
+    saida = args.output or os.path.splitext(args.model_path)[0] + '_mobilenet' + SUFIXO_PESOS
+    checkpoint = args.checkpoint or saida + '.ckpt'
+
+    device = torch.device("cuda" if torch.cuda.is_available() and not args.cpu else "cpu")
+    professor = carregar_modelo(args.model_path, device)
+    num_classes = numero_de_classes(professor, device)
+    print(f"Professor '{args.model_path}' ({num_classes} classes) em {device}; {len(caminhos)} foto(s)",
+          file=sys.stderr)
+
+    config = {chave: getattr(args, chave) for chave in ('passos', 'batch_size', 'crop', 'escala_min', 'escala_max',
+                                                         'lr', 'temperatura', 'alpha', 'seed', 'output_stride')}
+    config["num_classes"] = num_classes
+    aluno = criar_aluno(num_classes, args.output_stride, args.pretrained_backbone)
+    try:
+        historico = distilar(professor, aluno, caminhos, device, config, checkpoint=checkpoint, retomar=args.resume,
+                             salvar_cada=args.salvar_cada, threads_decodificacao=args.decode_threads)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+    from network.weights import save_weights
+    aluno = aluno.cpu().eval()
+    temporario = f"{saida}.{os.getpid()}.tmp"
+    save_weights(aluno, temporario)
+    os.replace(temporario, saida)
+    print(f"Aluno salvo em '{saida}'", file=sys.stderr)
+
+    # Relatório na CPU, onde a diferença de latência importa (e como o server.js roda)
+    professor = professor.cpu()
+    avaliacao = carregar_tensores(args.eval_dir or args.image_dir, torch.device('cpu'), limite=args.max_eval)
+    relatorio = relatorio_distilacao(professor, aluno, avaliacao, repeticoes=args.repeticoes)
+    relatorio["aluno"] = saida
+    relatorio["checkpoint"] = checkpoint
+    relatorio["passos"] = len(historico)
+    relatorio["perda_final"] = historico[-1] if historico else None
+
+    # Relatório em JSON no stdout (mesmo padrão dos outros scripts)
+    print(json.dumps(relatorio, indent=2))
@@ -1,40 +1,35 @@
-import ifcopenshell
+import argparse
 import json
 import sys
-import os
 
-# --- CORREÇÃO DE CAMINHO ---
-base_dir = os.path.dirname(os.path.abspath(__file__))
-CAMINHO_DO_IFC = os.path.join(base_dir, 'MB-1.04.04.00-6B3-1001-1_v32.ifc')
-# --- FIM DA CORREÇÃO ---
+from ifc_cache import obter_catalogos, resolver_ifcs
 
-try:
-    if not os.path.exists(CAMINHO_DO_IFC):
-        raise Exception(f"Arquivo IFC não encontrado em '{CAMINHO_DO_IFC}'. Coloque-o na pasta /backend.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Lista as áreas (Andares e Espaços) do(s) IFC(s).')
+    parser.add_argument('--ifc', nargs='+',
+                        help='Arquivos IFC ou pastas com IFCs (padrão: variável IFC_PATHS ou o IFC da pasta /backend)')
+    args = parser.parse_args()
 
-    ifc_file = ifcopenshell.open(CAMINHO_DO_IFC)
-    
-    areas = []
-    
-    # Procura por Andares (BuildingStorey) e Espaços (Space)
-    for element_type in ['IfcBuildingStorey', 'IfcSpace']:
-        elements = ifc_file.by_type(element_type)
-        for element in elements:
-            if element.Name:
-                
-                # --- CORREÇÃO AQUI ---
-                # Adiciona à lista apenas se o nome NÃO for puramente numérico
-                if not element.Name.isdigit():
-                    areas.append(element.Name)
-                # --- FIM DA CORREÇÃO ---
-                
-    # Filtra nomes duplicados e ordena
-    areas_unicas = sorted(list(set(areas)))
-    
-    # Imprime o JSON para o Node.js capturar (no stdout)
-    print(json.dumps(areas_unicas))
-    
-except Exception as e:
-    # Imprime o erro no stderr
-    print(json.dumps({"error": f"Falha ao ler o arquivo IFC: {e}"}), file=sys.stderr)
-    sys.exit(1)
\ No newline at end of file
+    try:
+        try:
+            caminhos_ifc = resolver_ifcs(args.ifc)
+        except FileNotFoundError as e:
+            raise Exception(f"{e} Coloque-o na pasta /backend.")
+
+        # Lê a lista do catálogo salvo ao lado de cada IFC (milissegundos).
+        # Só abre um IFC com ifcopenshell se ele mudou desde a última vez;
+        # os que mudaram são relidos em paralelo.
+        catalogo = obter_catalogos(caminhos_ifc)
+
+        # Andares (BuildingStorey) e Espaços (Space), sem nomes puramente numéricos,
+        # sem duplicados e ordenados (ver ifc_cache.listar_areas).
+        # Com vários IFCs cada nome vem como "<modelo>::<área>".
+        areas_unicas = catalogo['areas']
+        
+        # Imprime o JSON para o Node.js capturar (no stdout)
+        print(json.dumps(areas_unicas))
+        
+    except Exception as e:
+        # Imprime o erro no stderr
+        print(json.dumps({"error": f"Falha ao ler o arquivo IFC: {e}"}), file=sys.stderr)
+        sys.exit(1)
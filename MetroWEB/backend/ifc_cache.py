@@ -0,0 +1,196 @@
+import gzip
+import json
+import os
+
+from process_ifc import CAMINHO_DO_IFC, MAPEAMENTO_CLASSES, IndiceContencao
+
+# --- CATÁLOGO PRÉ-CALCULADO DO IFC ---
+# Abrir o IFC inteiro com ifcopenshell leva segundos. O catálogo guarda, num
+# .json.gz ao lado do IFC, a lista de áreas (a mesma do get_ifc_areas.py) e o
+# plano base de cada área (o mesmo do process_ifc.py). Ele é invalidado quando
+# o IFC muda (tamanho/mtime) ou quando o MAPEAMENTO_CLASSES muda, e então é
+# reconstruído automaticamente na próxima chamada.
+
+VERSAO_CATALOGO = 1
+SUFIXO_CATALOGO = '.catalogo.json.gz'
+SEPARADOR_MODELO = '::'  # nome federado: '<modelo>::<área>'
+VARIAVEL_IFCS = 'IFC_PATHS'  # lista de IFCs/pastas separada por os.pathsep
+
+
+def caminho_catalogo(caminho_ifc):
+    """Arquivo do catálogo ao lado do IFC."""
+    return caminho_ifc + SUFIXO_CATALOGO
+
+
+def chave_do_ifc(caminho_ifc):
+    """Identifica a revisão do IFC (e das regras de contagem) que gerou o catálogo."""
+    info = os.stat(caminho_ifc)
+    return {
+        "versao": VERSAO_CATALOGO,
+        "tamanho": info.st_size,
+        "mtime_ns": info.st_mtime_ns,
+        "mapeamento": MAPEAMENTO_CLASSES,
+    }
+
+
+def listar_areas(nomes):
+    """Nomes de áreas exibidos na interface: sem nomes puramente numéricos, sem repetição, ordenados."""
+    return sorted({nome for nome in nomes if nome and not nome.isdigit()})
+
+
+def montar_catalogo(ifc_file):
+    """Monta o catálogo (áreas + plano de cada área) a partir do índice de contenção."""
+    indice = IndiceContencao(ifc_file)
+    nomes = [element.Name for element_type in ['IfcBuildingStorey', 'IfcSpace']
+             for element in ifc_file.by_type(element_type)]
+    planos = {
+        nome: {"id": area.id(), "plano": indice.contar_elementos(area)}
+        for nome, area in indice.areas_por_nome.items()
+    }
+    return {"areas": listar_areas(nomes), "planos": planos}
+
+
+def ler_catalogo(caminho_ifc):
+    """Devolve o catálogo salvo se ele corresponder à revisão atual do IFC; senão None."""
+    caminho = caminho_catalogo(caminho_ifc)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with gzip.open(caminho, 'rt', encoding='utf-8') as f:
+            catalogo = json.load(f)
+    except (OSError, ValueError):
+        return None  # arquivo corrompido/truncado: reconstrói
+    if catalogo.get('chave') != chave_do_ifc(caminho_ifc):
+        return None
+    return catalogo
+
+
+def salvar_catalogo(caminho_ifc, catalogo):
+    """Grava o catálogo de forma atômica (arquivo temporário + rename)."""
+    caminho = caminho_catalogo(caminho_ifc)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with gzip.open(temporario, 'wt', encoding='utf-8') as f:
+        json.dump(catalogo, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporario, caminho)
+
+
+def obter_catalogo(caminho_ifc, reconstruir=False, log=None):
+    """
+    Catálogo válido do IFC: lido do cache ou, se preciso, reconstruído abrindo o IFC.
+    'log' recebe as mensagens de progresso (o get_ifc_areas.py não pode escrever no stderr).
+    """
+    log = log or (lambda mensagem: None)
+    if not reconstruir:
+        catalogo = ler_catalogo(caminho_ifc)
+        if catalogo is not None:
+            log(f"Catálogo do IFC válido: {caminho_catalogo(caminho_ifc)}")
+            return catalogo
+
+    import ifcopenshell
+
+    chave = chave_do_ifc(caminho_ifc)
+    log(f"Catálogo ausente ou desatualizado. Carregando arquivo BIM de: {caminho_ifc}")
+    catalogo = montar_catalogo(ifcopenshell.open(caminho_ifc))
+    catalogo['chave'] = chave
+    try:
+        salvar_catalogo(caminho_ifc, catalogo)
+        log(f"Catálogo salvo em: {caminho_catalogo(caminho_ifc)}")
+    except OSError as e:
+        log(f"Aviso: não foi possível salvar o catálogo: {e}")
+    return catalogo
+
+
+# --- FEDERAÇÃO DE VÁRIOS IFCs ---
+# Uma linha de metrô tem um IFC por estação/disciplina. Os catálogos que faltam
+# são montados em paralelo (um processo por arquivo, até o número de núcleos) e
+# unidos num catálogo só: cada área aparece como '<modelo>::<área>' e o nome
+# puro da área soma os planos de todos os modelos que a contêm.
+
+def resolver_ifcs(caminhos=None):
+    """Arquivos IFC a carregar: os informados (arquivos ou pastas), a variável IFC_PATHS ou o IFC padrão."""
+    if not caminhos:
+        variavel = os.environ.get(VARIAVEL_IFCS)
+        caminhos = [c for c in variavel.split(os.pathsep) if c] if variavel else [CAMINHO_DO_IFC]
+
+    arquivos = []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            arquivos.extend(os.path.join(caminho, nome) for nome in sorted(os.listdir(caminho))
+                            if nome.lower().endswith('.ifc'))
+        elif os.path.exists(caminho):
+            arquivos.append(caminho)
+        else:
+            raise FileNotFoundError(f"Arquivo IFC não encontrado em '{caminho}'.")
+    if not arquivos:
+        raise FileNotFoundError(f"Nenhum arquivo .ifc em {caminhos}.")
+    return list(dict.fromkeys(os.path.abspath(arquivo) for arquivo in arquivos))
+
+
+def nome_do_modelo(caminho_ifc):
+    """Prefixo das áreas de um modelo federado (nome do arquivo sem extensão)."""
+    return os.path.splitext(os.path.basename(caminho_ifc))[0]
+
+
+def somar_planos(planos):
+    """Soma, classe a classe, os planos da mesma área em modelos diferentes."""
+    soma = {}
+    for plano in planos:
+        for classe, quantidade in plano.items():
+            soma[classe] = soma.get(classe, 0) + quantidade
+    return soma
+
+
+def federar_catalogos(catalogos_por_modelo):
+    """Une os catálogos: áreas com prefixo do modelo e planos por nome federado e por nome puro."""
+    areas, planos, por_nome = [], {}, {}
+    for modelo, catalogo in catalogos_por_modelo.items():
+        areas.extend(f"{modelo}{SEPARADOR_MODELO}{nome}" for nome in catalogo['areas'])
+        for nome, entrada in catalogo['planos'].items():
+            planos[f"{modelo}{SEPARADOR_MODELO}{nome}"] = entrada
+            por_nome.setdefault(nome, {})[modelo] = entrada
+
+    for nome, entradas in por_nome.items():
+        planos.setdefault(nome, {
+            "id": {modelo: entrada['id'] for modelo, entrada in entradas.items()},
+            "plano": somar_planos(entrada['plano'] for entrada in entradas.values()),
+        })
+    return {"areas": sorted(areas), "planos": planos}
+
+
+def obter_catalogos(caminhos_ifc, reconstruir=False, log=None, processos=None):
+    """
+    Catálogo (federado, se houver mais de um IFC) dos arquivos informados.
+    Os que não estão em cache são montados em paralelo, um processo por arquivo.
+    """
+    log = log or (lambda mensagem: None)
+    if len(caminhos_ifc) == 1:
+        return obter_catalogo(caminhos_ifc[0], reconstruir=reconstruir, log=log)
+
+    catalogos = {}
+    faltando = []
+    for caminho in caminhos_ifc:
+        catalogo = None if reconstruir else ler_catalogo(caminho)
+        if catalogo is None:
+            faltando.append(caminho)
+        else:
+            catalogos[caminho] = catalogo
+
+    if faltando:
+        processos = min(len(faltando), processos or os.cpu_count() or 1)
+        log(f"Montando {len(faltando)} catálogo(s) de {len(caminhos_ifc)} IFC(s) em {processos} processo(s)...")
+        if processos == 1:
+            montados = [obter_catalogo(caminho, reconstruir=True) for caminho in faltando]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=processos) as pool:
+                montados = list(pool.map(obter_catalogo, faltando, [True] * len(faltando)))
+        catalogos.update(zip(faltando, montados))
+
+    modelos = {}
+    for caminho in caminhos_ifc:
+        modelo = nome_do_modelo(caminho)
+        if modelo in modelos:
+            raise ValueError(f"Dois IFCs com o mesmo nome de modelo '{modelo}'.")
+        modelos[modelo] = catalogos[caminho]
+    log(f"Federação: {len(modelos)} modelo(s): {', '.join(modelos)}")
+    return federar_catalogos(modelos)
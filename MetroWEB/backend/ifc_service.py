@@ -0,0 +1,173 @@
+import argparse
+import json
+import sys
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ifc_cache import chave_do_ifc, obter_catalogos, resolver_ifcs
+from process_ifc import base_dir, gerar_plano_unico
+
+# --- SERVIÇO RESIDENTE DO IFC ---
+# Mantém o catálogo do IFC (áreas + plano de cada área, ver ifc_cache.py) em
+# memória entre requisições, no lugar de um processo Python novo por chamada
+# do server.js. Uma rajada de pastas criadas pelo app Android abre o IFC no
+# máximo uma vez: requisições idênticas simultâneas esperam o mesmo resultado
+# em vez de repetir o trabalho, e a memória não cresce com o número de pedidos.
+#
+# Uso:
+#   python ifc_service.py --port 8766
+#   set IFC_SERVICE_URL=http://127.0.0.1:8766   (server.js usa o serviço)
+
+HOST_PADRAO = '127.0.0.1'
+PORTA_PADRAO = 8766
+
+
+# --- 1. COALESCÊNCIA DE REQUISIÇÕES ---
+class Coalescedor:
+    """Executa cada chave uma vez por vez: chamadas simultâneas com a mesma chave recebem o mesmo resultado."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+
+    def executar(self, chave, funcao):
+        with self._lock:
+            futuro = self._em_andamento.get(chave)
+            dono = futuro is None
+            if dono:
+                futuro = self._em_andamento[chave] = Future()
+        if not dono:
+            return futuro.result()
+
+        try:
+            futuro.set_result(funcao())
+        except Exception as e:
+            futuro.set_exception(e)
+        finally:
+            with self._lock:
+                del self._em_andamento[chave]
+        return futuro.result()
+
+
+# --- 2. ESTADO DO SERVIÇO ---
+class ServicoIFC:
+    """Catálogo (federado) em memória dos IFCs, recarregado só quando algum arquivo muda."""
+
+    def __init__(self, caminhos_ifc):
+        self.caminhos_ifc = caminhos_ifc
+        self.catalogo = None
+        self.chaves = None
+        self.coalescedor = Coalescedor()
+
+    def _desatualizado(self):
+        return self.catalogo is None or self.chaves != [chave_do_ifc(c) for c in self.caminhos_ifc]
+
+    def _carregar(self):
+        if not self._desatualizado():
+            return self.catalogo  # outro pedido já recarregou enquanto este esperava
+        print(f"Carregando catálogo de {len(self.caminhos_ifc)} IFC(s)", file=sys.stderr)
+        chaves = [chave_do_ifc(c) for c in self.caminhos_ifc]
+        self.catalogo = obter_catalogos(self.caminhos_ifc, log=lambda m: print(m, file=sys.stderr))
+        self.chaves = chaves
+        return self.catalogo
+
+    def obter_catalogo(self):
+        """Catálogo atual (uma única recarga mesmo com vários pedidos chegando juntos)."""
+        if self._desatualizado():
+            return self.coalescedor.executar(('catalogo',), self._carregar)
+        return self.catalogo
+
+    def listar_areas(self):
+        return self.obter_catalogo()['areas']
+
+    def gerar_plano(self, pasta, nome_ifc):
+        """Mesma saída do 'process_ifc.py --folder --ifc_name': grava json_files/plano_base_<pasta>.json."""
+        pasta = pasta.lower().strip()
+        catalogo = self.obter_catalogo()
+
+        def gerar():
+            if not gerar_plano_unico(base_dir, catalogo, pasta, nome_ifc):
+                return None
+            return catalogo['planos'][nome_ifc]['plano']
+
+        return self.coalescedor.executar(('plano', pasta, nome_ifc), gerar)
+
+
+# --- 3. SERVIDOR ---
+class IFCHandler(BaseHTTPRequestHandler):
+    # Preenchido em servir()
+    servico = None
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path == '/saude':
+            self._responder(200, {"status": "ok", "ifc": self.servico.caminhos_ifc})
+        elif self.path == '/areas':
+            try:
+                self._responder(200, self.servico.listar_areas())
+            except Exception as e:
+                self._responder(500, {"error": f"Falha ao ler o arquivo IFC: {e}"})
+        else:
+            self._responder(404, {"error": "Rota não encontrada"})
+
+    def do_POST(self):
+        if self.path != '/plano':
+            self._responder(404, {"error": "Rota não encontrada"})
+            return
+        try:
+            tamanho = int(self.headers.get('Content-Length', 0))
+            pedido = json.loads(self.rfile.read(tamanho).decode('utf-8'))
+            pasta, nome_ifc = pedido['folder'], pedido['ifc_name']
+        except Exception as e:
+            self._responder(400, {"error": f"Pedido inválido: {e}"})
+            return
+
+        try:
+            plano = self.servico.gerar_plano(pasta, nome_ifc)
+        except Exception as e:
+            self._responder(500, {"error": f"Falha ao gerar o plano: {e}"})
+            return
+
+        if plano is None:
+            self._responder(404, {"error": f"A área técnica '{nome_ifc}' não foi encontrada no IFC."})
+        else:
+            self._responder(200, {"success": True, "folder": pasta.lower().strip(), "plano": plano})
+
+    def log_message(self, format, *args):
+        print(f"[ifc] {self.address_string()} - {format % args}", file=sys.stderr)
+
+
+def servir(caminhos_ifc=None, host=HOST_PADRAO, port=PORTA_PADRAO):
+    """Carrega o catálogo uma única vez e atende pedidos até ser interrompido."""
+    servico = ServicoIFC(resolver_ifcs(caminhos_ifc))
+    servico.obter_catalogo()
+    IFCHandler.servico = servico
+
+    server = ThreadingHTTPServer((host, port), IFCHandler)
+    print(f"Serviço IFC ouvindo em http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# --- 4. PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serviço residente do IFC (áreas e planos base)')
+    parser.add_argument('--ifc', nargs='+',
+                        help='Arquivos IFC ou pastas com IFCs (padrão: variável IFC_PATHS ou o IFC da pasta /backend)')
+    parser.add_argument('--host', default=HOST_PADRAO, help='Interface local de escuta')
+    parser.add_argument('--port', type=int, default=PORTA_PADRAO, help='Porta HTTP')
+    args = parser.parse_args()
+
+    servir(args.ifc, host=args.host, port=args.port)
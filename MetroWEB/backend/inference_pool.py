@@ -0,0 +1,252 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# --- POOL DE INFERÊNCIA NA CPU (VÁRIOS PROCESSOS, THREADS FIXAS) ---
+# Vários inference_test.py simultâneos usam cada um o pool de threads padrão do
+# torch (uma thread por núcleo) e disputam os mesmos núcleos: todos ficam lentos.
+# Aqui N processos carregam o modelo uma vez cada, com um número fixo de threads
+# intra-op, e cada processo fica preso (afinidade) ao seu próprio grupo de núcleos.
+# As fotos são distribuídas entre eles; o progresso da área é atualizado uma vez
+# no final (máximo por classe), como no modo lote do inference_test.py.
+#
+# Uso:
+#   python inference_pool.py --model_path Var_2plus_weights_28.Pt --image_dir fotos/ --area plataforma --workers 4 --threads 2
+#   python inference_pool.py --model_path Var_2plus_weights_28.Pt --image_dir fotos/ --tune   (melhor N x threads)
+
+# Estado de cada processo do pool (preenchido em _iniciar_worker)
+_MODELO = None
+_DEVICE = None
+_CODIFICACAO = None
+
+
+def nucleos_disponiveis():
+    """Núcleos que este processo pode usar (respeita taskset/cgroups quando o SO informa)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def fixar_nucleos(nucleos):
+    """Prende o processo atual aos núcleos dados. Devolve False se a plataforma não permitir."""
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, nucleos)
+            return True
+        import psutil  # Windows/macOS: só com o psutil instalado
+        psutil.Process().cpu_affinity(list(nucleos))
+        return True
+    except (ImportError, AttributeError, OSError, ValueError):
+        return False
+
+
+def dividir_nucleos(nucleos, workers, threads):
+    """Grupo de núcleos de cada worker (blocos contíguos; sobra núcleo quando workers*threads < total)."""
+    if workers * threads > len(nucleos):
+        raise ValueError(f"{workers} worker(s) x {threads} thread(s) > {len(nucleos)} núcleo(s) disponíveis")
+    return [nucleos[i * threads:(i + 1) * threads] for i in range(workers)]
+
+
+# --- 1. PROCESSO DO POOL ---
+def _iniciar_worker(vagas, threads, model_path, otimizar, precisao, codificacao):
+    """Roda uma vez em cada processo: afinidade, threads, modelo carregado e aquecido."""
+    global _MODELO, _DEVICE, _CODIFICACAO
+    nucleos = vagas.get()
+    fixado = fixar_nucleos(nucleos)
+    # Antes de importar o torch: o OpenMP lê estas variáveis na inicialização
+    os.environ['OMP_NUM_THREADS'] = os.environ['MKL_NUM_THREADS'] = str(threads)
+
+    import torch
+    from inference_test import aquecer_modelo, carregar_modelo
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    _DEVICE = torch.device("cpu")
+    _MODELO = carregar_modelo(model_path, _DEVICE, otimizar=otimizar, precisao=precisao)
+    aquecer_modelo(_MODELO, _DEVICE)
+    _CODIFICACAO = codificacao
+    print(f"[pool {os.getpid()}] pronto: {threads} thread(s), núcleos {nucleos}"
+          f"{'' if fixado else ' (afinidade não suportada)'}", file=sys.stderr)
+
+
+def _processar_no_worker(image_path, nome, output_dir, area_nome):
+    """Predição, overlay e contagem de uma foto (o progresso fica com o processo principal)."""
+    from inference_test import (carregar_imagem, contar_area_pixels, guardar_mascara, prever_imagem,
+                                salvar_imagens_resultado)
+
+    try:
+        original_image, resized_image = carregar_imagem(image_path)
+    except Exception as e:
+        return {"imagem": nome, "error": f"Falha ao carregar imagem: {e}"}
+    prediction_map, resized_image = prever_imagem(_MODELO, _DEVICE, original_image, imagem_reduzida=resized_image)
+    nome_overlay = salvar_imagens_resultado(original_image, prediction_map, os.path.join(output_dir, nome),
+                                            imagem_reduzida=resized_image, codificacao=_CODIFICACAO,
+                                            arquivo_original=image_path)
+    if area_nome:
+        guardar_mascara(area_nome, nome, prediction_map)
+    return {
+        "imagem": nome,
+        "contagem_pixels": contar_area_pixels(prediction_map),
+        "overlay": f"/results/{os.path.basename(output_dir)}/{nome}/{nome_overlay}"
+    }
+
+
+# --- 2. POOL ---
+class PoolInferencia:
+    """N processos com o modelo carregado, cada um com `threads` threads presas aos seus núcleos."""
+
+    def __init__(self, model_path, workers, threads, otimizar=False, precisao='fp32', codificacao=None):
+        contexto = multiprocessing.get_context('spawn')  # sem herdar o estado do torch do processo pai
+        vagas = contexto.Queue()
+        for nucleos in dividir_nucleos(nucleos_disponiveis(), workers, threads):
+            vagas.put(nucleos)
+        self.workers = workers
+        self.threads = threads
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=contexto, initializer=_iniciar_worker,
+            initargs=(vagas, threads, model_path, otimizar, precisao, codificacao)
+        )
+
+    def processar(self, image_paths, output_dir, area_nome=None):
+        """Resultados por foto, na ordem de image_paths (com area_nome, as máscaras são guardadas)."""
+        from inference_test import ids_do_lote
+
+        os.makedirs(output_dir, exist_ok=True)
+        futuros = [self.executor.submit(_processar_no_worker, os.path.abspath(caminho), imagem_id,
+                                        os.path.abspath(output_dir), area_nome)
+                   for caminho, imagem_id in zip(image_paths, ids_do_lote(image_paths))]
+        return [futuro.result() for futuro in futuros]
+
+    def aquecer(self):
+        """Espera todos os processos subirem (carregar o modelo não entra nas medições)."""
+        for futuro in [self.executor.submit(os.getpid) for _ in range(self.workers * 2)]:
+            futuro.result()
+
+    def fechar(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+        return False
+
+
+def processar_com_pool(model_path, image_paths, output_dir, area_nome, workers, threads,
+                       otimizar=False, precisao='fp32', codificacao=None):
+    """Mesmo JSON do modo lote do inference_test.py, com as fotos divididas entre os processos."""
+    from inference_test import atualizar_progresso, juntar_contagens_max
+
+    with PoolInferencia(model_path, workers, threads, otimizar, precisao, codificacao) as pool:
+        pool.aquecer()
+        inicio = time.perf_counter()
+        imagens = pool.processar(image_paths, output_dir, area_nome)
+        duracao = time.perf_counter() - inicio
+
+    contagens = [img["contagem_pixels"] for img in imagens if "contagem_pixels" in img]
+    try:
+        resultado = atualizar_progresso(area_nome, juntar_contagens_max(contagens),
+                                        observacoes=[(img["imagem"], img["contagem_pixels"])
+                                                     for img in imagens if "contagem_pixels" in img])
+    except Exception as e:
+        resultado = {"error": f"Falha ao calcular progresso: {e}"}
+    resultado['imagens'] = imagens
+    resultado['imagens_processadas'] = len(contagens)
+    resultado['imagens_por_segundo'] = round(len(contagens) / duracao, 3) if duracao > 0 else None
+    resultado['pool'] = {"workers": workers, "threads": threads}
+    return resultado
+
+
+# --- 3. AJUSTE (N x threads) ---
+def candidatos_divisao(total_nucleos):
+    """Divisões N x threads que usam todos os núcleos (1 x total, ..., total x 1)."""
+    return [(total_nucleos // threads, threads) for threads in range(total_nucleos, 0, -1)
+            if total_nucleos % threads == 0]
+
+
+def afinar(model_path, image_paths, divisoes=None, otimizar=False, precisao='fp32'):
+    """Mede imagens/s de cada divisão N x threads (sem tocar no progresso) e ordena da melhor para a pior."""
+    divisoes = divisoes or candidatos_divisao(len(nucleos_disponiveis()))
+    pasta_temporaria = tempfile.mkdtemp(prefix='pool_tune_')
+    resultados = []
+    try:
+        for workers, threads in divisoes:
+            print(f"Medindo {workers} worker(s) x {threads} thread(s)...", file=sys.stderr)
+            with PoolInferencia(model_path, workers, threads, otimizar, precisao) as pool:
+                pool.aquecer()
+                pool.processar(image_paths[:workers], pasta_temporaria)  # primeiro forward de cada processo
+                inicio = time.perf_counter()
+                pool.processar(image_paths, pasta_temporaria)
+                duracao = time.perf_counter() - inicio
+            resultados.append({
+                "workers": workers,
+                "threads": threads,
+                "imagens_por_segundo": round(len(image_paths) / duracao, 3),
+                "ms_por_imagem": round(duracao * 1000 / len(image_paths), 1),
+            })
+    finally:
+        shutil.rmtree(pasta_temporaria, ignore_errors=True)
+    resultados.sort(key=lambda r: r["imagens_por_segundo"], reverse=True)
+    return {"nucleos": len(nucleos_disponiveis()), "imagens": len(image_paths),
+            "melhor": resultados[0] if resultados else None, "divisoes": resultados}
+
+
+# --- 4. PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    from inference_test import CODIFICACAO_PADRAO, EXTENSAO_FORMATO, listar_imagens
+
+    parser = argparse.ArgumentParser(description='Inferência com vários processos presos a núcleos da CPU')
+    parser.add_argument('--model_path', required=True, help='Caminho para o modelo .pt')
+    parser.add_argument('--image_path', nargs='+', help='Imagens a processar')
+    parser.add_argument('--image_dir', help='Pasta com imagens da mesma área')
+    parser.add_argument('--output_dir', default='./inference_results', help='Pasta para salvar resultados')
+    parser.add_argument('--area', help='A zona de inspeção (ex: plataforma)')
+    parser.add_argument('--workers', type=int, default=None, help='Processos (padrão: núcleos / threads)')
+    parser.add_argument('--threads', type=int, default=1, help='Threads intra-op de cada processo')
+    parser.add_argument('--optimize', action='store_true', help='Aplica network.optimize_for_inference ao carregar')
+    parser.add_argument('--precision', choices=['fp32', 'bf16'], default='fp32',
+                        help='bf16: channels_last sob autocast bfloat16')
+    parser.add_argument('--overlay_format', choices=sorted(EXTENSAO_FORMATO), default=CODIFICACAO_PADRAO['formato'],
+                        help='Formato do overlay/original salvos')
+    parser.add_argument('--png_compress_level', type=int, choices=range(10),
+                        default=CODIFICACAO_PADRAO['png_compress_level'], help='Compressão PNG (0-9)')
+    parser.add_argument('--quality', type=int, default=CODIFICACAO_PADRAO['qualidade'],
+                        help='Qualidade JPEG/WebP (1-100)')
+    parser.add_argument('--tune', action='store_true',
+                        help='Mede as divisões N x threads nas imagens dadas e mostra a mais rápida')
+    parser.add_argument('--max_images', type=int, default=None, help='Máximo de imagens usadas no --tune')
+    args = parser.parse_args()
+
+    if not args.image_path and not args.image_dir:
+        parser.error('Informe --image_path ou --image_dir')
+    imagens = listar_imagens((args.image_path or []) + ([args.image_dir] if args.image_dir else []))
+    if not imagens:
+        parser.error('Nenhuma imagem encontrada')
+
+    if not args.tune and not args.area:
+        parser.error('--area é obrigatório (exceto com --tune)')
+    workers = args.workers or max(1, len(nucleos_disponiveis()) // args.threads)
+    codificacao = {'formato': args.overlay_format, 'png_compress_level': args.png_compress_level,
+                   'qualidade': args.quality}
+    try:
+        if args.tune:
+            resultado = afinar(args.model_path, imagens[:args.max_images], otimizar=args.optimize,
+                               precisao=args.precision)
+        else:
+            resultado = processar_com_pool(args.model_path, imagens, args.output_dir, args.area, workers,
+                                           args.threads, otimizar=args.optimize, precisao=args.precision,
+                                           codificacao=codificacao)
+    except Exception as e:
+        # Qualquer falha (modelo, worker, disco) vira JSON de ERRO no stdout, como o
+        # inference_test.py e o mask_store.py (o Node.js lê o stdout)
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    # Imprime o JSON final para o Node.js
+    print(json.dumps(resultado, indent=2))
@@ -1,16 +1,26 @@
-import torch
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from PIL import Image
-import argparse 
-import os
-import matplotlib.pyplot as plt
-import cv2 
-import json 
-import sys 
 
-# Importação do modelo
-from model_plus import createDeepLabv3Plus
-from network._deeplab import DeepLabV3
+from inference_tiling import escolher_tile_por_memoria
+from progress_store import abrir, registrar
+from inference_timing import CRONOMETRO, etapa
+from prediction_cache import CachePredicoes, LIMITE_MB_PADRAO, PASTA_CACHE
+from mask_store import salvar_mascara
+from inference_video import FPS_AMOSTRA_PADRAO, LIMIAR_CENA_PADRAO, eh_video
+
+# O torch e o modelo (network/) são importados só nas funções que rodam a rede:
+# o server.js inicia este script a cada foto, e o modo cliente do worker e os
+# acertos do cache de predições não precisam deles (ver check_import_time.py).
 
 # --- 1. CONFIGURAÇÕES DE PROGRESSO ---
 MAPEAMENTO_ID_NOME = {
@@ -21,15 +31,15 @@ MAPEAMENTO_ID_NOME = {
 
 # --- 2. FUNÇÕES DE CONTAGEM (Pixels) ---
 def contar_area_pixels(prediction_map):
-    """(NOVA LÓGICA) Conta quantos 'pixels' de cada classe existem."""
+    """(NOVA LÓGICA) Conta quantos 'pixels' de cada classe existem (um único bincount para todas)."""
+    histograma = np.bincount(prediction_map.ravel(), minlength=max(MAPEAMENTO_ID_NOME) + 1)
+    return contagem_do_histograma(histograma)
+
+def contagem_do_histograma(histograma):
+    """Pixels por id de classe -> contagem por nome de classe (só as classes presentes)."""
     contagem_real_pixels = {}
     for class_id, class_name in MAPEAMENTO_ID_NOME.items():
-        # Cria a máscara (array de True/False)
-        mask = (prediction_map == class_id)
-        
-        # Conta quantos pixels são 'True' (ou seja, pertencem à classe)
-        num_pixels = np.count_nonzero(mask)
-        
+        num_pixels = histograma[class_id]
         if num_pixels > 0:
             # Salva a contagem de PIXELS
             contagem_real_pixels[class_name] = int(num_pixels) # Converte para int nativo
@@ -38,14 +48,19 @@ def contar_area_pixels(prediction_map):
 # -------------------------------------------------------------------
 
 # --- 3. FUNÇÃO DE ATUALIZAR PROGRESSO (COM A MUDANÇA) ---
-def atualizar_progresso(area_nome_base, nova_contagem_ia):
+def atualizar_progresso(area_nome_base, nova_contagem_ia, observacoes=None, substituir=False):
+    """
+    Aplica a contagem ao progresso da área (lógica MAX limitada ao plano) no banco
+    de progresso (progress_store.py) e registra as observações no histórico.
+    observacoes: [(imagem_id, contagem)] de cada foto (padrão: a própria contagem, sem id).
+    substituir=True descarta o progresso anterior da área (recálculo pelo mask_store.py).
+    """
     base_dir = os.path.dirname(os.path.abspath(__file__))
     
     # Aponta para a pasta /json_files/
     json_dir = os.path.join(base_dir, "json_files")
     os.makedirs(json_dir, exist_ok=True) # Garante que a pasta exista
     ARQUIVO_PLANO = os.path.join(json_dir, f"plano_base_{area_nome_base}.json")
-    ARQUIVO_PROGRESSO = os.path.join(json_dir, f"progresso_{area_nome_base}.json")
 
     # 1. Carregar Plano Base
     if not os.path.exists(ARQUIVO_PLANO):
@@ -66,36 +81,25 @@ def atualizar_progresso(area_nome_base, nova_contagem_ia):
     percentual_da_imagem = (total_pixels_desta_imagem / total_planejado_geral) * 100
     # --- FIM DA MUDANÇA (PYTHON) ---
 
-    # 2. Carregar Progresso Atual (ou criar novo)
-    progresso_atual = {}
-    if os.path.exists(ARQUIVO_PROGRESSO):
-        try:
-            with open(ARQUIVO_PROGRESSO, 'r', encoding='utf-8') as f:
-                progresso_atual = json.load(f)
-        except json.JSONDecodeError:
-            progresso_atual = {} 
-
-    # 3. Atualizar Progresso (Lógica MAX)
-    for nome_classe_ia, contagem_ia in nova_contagem_ia.items():
-        chave_progresso = nome_classe_ia.replace('total_', '') 
-        if chave_progresso not in progresso_atual:
-            progresso_atual[chave_progresso] = 0 
-
-        chave_plano = nome_classe_ia 
-        limite_plano = plano_base.get(chave_plano, 0)
-        valor_antigo = progresso_atual[chave_progresso]
-        # Esta é a sua lógica de "recorde" (High-score)
-        valor_novo_max = max(valor_antigo, contagem_ia)
-        valor_final = min(valor_novo_max, limite_plano)
-        progresso_atual[chave_progresso] = valor_final
-
-    # 4. Recalcular o Total Geral (baseado nos valores MÁXIMOS salvos)
-    total_executado_geral = sum(progresso_atual.get(v.replace('total_', ''), 0) for v in MAPEAMENTO_ID_NOME.values())
-    progresso_atual['elementos_executados_geral'] = total_executado_geral
-
-    # 5. Salvar o arquivo de progresso
-    with open(ARQUIVO_PROGRESSO, 'w', encoding='utf-8') as f:
-        json.dump(progresso_atual, f, indent=4)
+    # 2-5. Atualizar Progresso (Lógica MAX, limitada ao plano) numa única transação.
+    # Chaves do progresso sem o prefixo 'total_' (ex: 'concreto')
+    sem_prefixo = lambda contagem: {nome.replace('total_', ''): valor for nome, valor in contagem.items()}
+    if observacoes is None:
+        observacoes = [(None, nova_contagem_ia)]
+
+    conexao = abrir()  # json_files/progresso.sqlite3
+    try:
+        progresso_atual = registrar(
+            conexao, area_nome_base,
+            sem_prefixo(nova_contagem_ia),
+            limites={nome.replace('total_', ''): plano_base.get(nome, 0) for nome in MAPEAMENTO_ID_NOME.values()},
+            observacoes=[(imagem_id, sem_prefixo(contagem)) for imagem_id, contagem in observacoes],
+            classes=[nome.replace('total_', '') for nome in MAPEAMENTO_ID_NOME.values()],
+            substituir=substituir
+        )
+    finally:
+        conexao.close()
+    total_executado_geral = progresso_atual['elementos_executados_geral']
         
     # 6. Preparar JSON de Retorno
     # O percentual geral é baseado no 'total_executado_geral' (o recorde salvo)
@@ -118,112 +122,705 @@ def atualizar_progresso(area_nome_base, nova_contagem_ia):
     }
 # --- FIM DA FUNÇÃO ---
 
-# --- 4. FUNÇÃO DE INFERÊNCIA ---
-def inference_model(model_path, image_path, output_dir, channels, area_nome):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Usando dispositivo: {device}", file=sys.stderr)
-    
-    try:
+# --- 4. FUNÇÕES DE INFERÊNCIA ---
+def eh_torchscript(model_path):
+    """True se o arquivo foi salvo com torch.jit.save (tem a pasta code/ dentro do zip)."""
+    if not zipfile.is_zipfile(model_path):
+        return False
+    with zipfile.ZipFile(model_path) as arquivo:
+        return any('/code/' in nome for nome in arquivo.namelist())
+
+def carregar_modelo(model_path, device, backend='torch', otimizar=False, output_stride=None, precisao='fp32'):
+    """
+    Carrega o modelo completo (objeto DeepLabV3 salvo com torch.save) no dispositivo.
+    Se houver um .weights.pt (convert_weights.py) feito a partir deste .Pt, usa ele:
+    a arquitetura é montada sem pesos e os tensores são mapeados do arquivo, sem cópia.
+    Com backend='onnx', devolve uma sessão do ONNX Runtime com a mesma interface.
+    Com otimizar=True, aplica network.optimize_for_inference (BN dobrado nas convs).
+    Com output_stride, troca o output stride do modelo (ex: 16 para prévias rápidas).
+    Com precisao='bf16', roda na CPU em channels_last sob autocast bfloat16 (logits em fp32).
+    """
+    if output_stride and (backend == 'onnx' or eh_torchscript(model_path)):
+        raise ValueError("output_stride só pode ser alterado em modelos PyTorch (.Pt com o objeto completo ou .weights.pt)")
+    if precisao == 'bf16' and (backend == 'onnx' or eh_torchscript(model_path) or device.type != 'cpu'):
+        raise ValueError("precisao='bf16' só vale para modelos PyTorch (.Pt com o objeto completo ou .weights.pt) na CPU")
+
+    if backend == 'onnx':
+        from onnx_backend import carregar_modelo_onnx
+        return carregar_modelo_onnx(model_path)
+
+    import torch
+
+    if eh_torchscript(model_path):
+        # Ex: modelo INT8 gerado pelo quantize_model.py
+        model = torch.jit.load(model_path, map_location=device)
+        model.eval()
+        return model
+
+    from convert_weights import pesos_mapeaveis
+    caminho_pesos, conferir_origem = pesos_mapeaveis(model_path)
+    model = None
+    if caminho_pesos:
+        # Só os pesos, mapeados em memória sobre a arquitetura montada por network.modeling
+        from network.weights import StaleWeightsError, load_weights
+        try:
+            model, arquitetura = load_weights(caminho_pesos, device, check_source=conferir_origem)
+            print(f"Pesos mapeados de '{caminho_pesos}' ({arquitetura['arch']})", file=sys.stderr)
+        except StaleWeightsError:
+            print(f"Aviso: '{caminho_pesos}' não foi gerado a partir do '{model_path}' atual; "
+                  f"carregando o .Pt (rode convert_weights.py de novo)", file=sys.stderr)
+    if model is None:
+        from network._deeplab import DeepLabV3
         torch.serialization.add_safe_globals([DeepLabV3])
         model = torch.load(model_path, map_location=device, weights_only=False)
         model = model.to(device)
         model.eval()
-        print("Modelo carregado de objeto completo", file=sys.stderr)
+    if output_stride:
+        from network.stride import set_output_stride
+        set_output_stride(model, output_stride)
+        print(f"Output stride do modelo: {output_stride}", file=sys.stderr)
+    if otimizar:
+        from network.optimize import optimize_for_inference
+        model = optimize_for_inference(model, inplace=True)
+        print("Modelo otimizado para inferência (BN dobrado, pads e ReLUs fundidos)", file=sys.stderr)
+    if precisao == 'bf16':
+        from network.precision import to_bfloat16_cpu
+        model = to_bfloat16_cpu(model)
+        print("Execução em bfloat16 (channels_last + autocast na CPU)", file=sys.stderr)
+    return model
+
+def aquecer_modelo(model, device, target_size=512):
+    """Roda um forward descartável para alocar buffers e inicializar os kernels."""
+    import torch
+    with torch.no_grad():
+        model(torch.zeros(1, 3, target_size, target_size, device=device))
+
+def prepare_image(image_pil, device, target_size=512):
+    """Redimensiona para a entrada do modelo e devolve (tensor 1x3xHxW, imagem redimensionada)."""
+    with etapa('redimensionar'):
+        image_resized = image_pil.resize((target_size, target_size), Image.LANCZOS)
+    return tensor_da_imagem(image_resized, device), image_resized
+
+def tensor_da_imagem(image_resized, device):
+    """Imagem já no tamanho de entrada -> tensor 1x3xHxW (0-255, sem normalização)."""
+    import torch
+    with etapa('preparar_tensor'):
+        image_array = np.array(image_resized).astype(np.float32)
+        tensor = torch.from_numpy(image_array).permute(2, 0, 1).float()
+        return tensor.unsqueeze(0).to(device)
+
+# --- 3.1 DECODIFICAÇÃO (JPEG reduzido no domínio DCT, em threads) ---
+def carregar_imagem(image_path, target_size=512, rascunho=True):
+    """
+    Decodifica a foto e devolve (imagem, imagem_reduzida).
+    A imagem é redimensionada UMA vez para target_size; essa imagem serve de
+    entrada do modelo e de base do overlay. Com rascunho=True, o JPEG já sai do
+    decodificador reduzido (PIL draft: escala 1/2, 1/4 ou 1/8 no domínio DCT,
+    sem ficar menor que target_size). Com target_size=None (tiling), decodifica
+    inteira e imagem_reduzida é None.
+    """
+    with etapa('decodificar_imagem'):
+        imagem = Image.open(image_path)
+        if target_size and rascunho:
+            imagem.draft('RGB', (target_size, target_size))
+        imagem = imagem.convert('RGB')
+    if not target_size:
+        return imagem, None
+    with etapa('redimensionar'):
+        return imagem, imagem.resize((target_size, target_size), Image.LANCZOS)
+
+def decodificar_em_fundo(image_paths, threads=2, fila=4, **opcoes):
+    """
+    Gera (caminho, (imagem, imagem_reduzida), erro) na ordem de image_paths.
+    As fotos são decodificadas em threads enquanto o modelo roda, com no máximo
+    `fila` fotos decodificadas à frente (limita a memória).
+    opcoes: repassadas ao carregar_imagem (target_size, rascunho).
+    """
+    caminhos = iter(image_paths)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pendentes = deque()
+        for caminho in caminhos:
+            pendentes.append((caminho, pool.submit(carregar_imagem, caminho, **opcoes)))
+            if len(pendentes) >= fila:
+                break
+        while pendentes:
+            caminho, futuro = pendentes.popleft()
+            proximo = next(caminhos, None)
+            if proximo is not None:
+                pendentes.append((proximo, pool.submit(carregar_imagem, proximo, **opcoes)))
+            try:
+                yield caminho, futuro.result(), None
+            except Exception as e:
+                yield caminho, None, e
+
+def prever_lote(model, input_tensor):
+    """Forward de um lote (N x 3 x H x W) e argmax -> mapas de predição uint8 (N x H x W)."""
+    import torch
+    with torch.no_grad():
+        with etapa('forward'), CRONOMETRO.perfil():
+            output = model(input_tensor)
+        with etapa('argmax'):
+            pred = torch.argmax(output, dim=1)
+            return pred.cpu().numpy().astype(np.uint8)
+
+# --- 4.0 PÓS-PROCESSAMENTO (overlay e codificação) ---
+COLOR_MAP = { 0: [0, 0, 0], 1: [255, 0, 0], 2: [0, 255, 0], 3: [0, 0, 255] }
+ALFA_OVERLAY = 0.4  # peso da cor da classe no overlay (a foto fica com 0.6)
+
+CODIFICACAO_PADRAO = {'formato': 'png', 'png_compress_level': 1, 'qualidade': 90}
+EXTENSAO_FORMATO = {'png': 'png', 'jpeg': 'jpg', 'webp': 'webp'}
+
+def gerar_paleta(num_classes):
+    """Paleta uint8 (num_classes x 3): COLOR_MAP para as classes conhecidas, padrão PASCAL VOC nas demais."""
+    paleta = np.zeros((num_classes, 3), dtype=np.uint8)
+    for class_id in range(num_classes):
+        if class_id in COLOR_MAP:
+            paleta[class_id] = COLOR_MAP[class_id]
+            continue
+        c, cor = class_id, [0, 0, 0]
+        for bit in range(8):
+            for canal in range(3):
+                cor[canal] |= ((c >> canal) & 1) << (7 - bit)
+            c >>= 3
+        paleta[class_id] = cor
+    return paleta
+
+def gerar_overlay(imagem, prediction_map, alfa=ALFA_OVERLAY):
+    """
+    Mistura a cor de cada classe na foto (uint8 H x W x 3) numa passada só:
+    duas tabelas (peso da foto e termo da cor, em ponto fixo /256) indexadas pelo
+    mapa de predição. O custo não depende do número de classes; o fundo (0) fica intacto.
+    """
+    num_classes = int(prediction_map.max()) + 1
+    paleta = gerar_paleta(num_classes).astype(np.uint16)
+    peso_foto = np.full(num_classes, round((1 - alfa) * 256), dtype=np.uint16)
+    termo_cor = np.round(alfa * 256 * paleta).astype(np.uint16)
+    peso_foto[0], termo_cor[0] = 256, 0
+
+    overlay = imagem.astype(np.uint16)
+    overlay *= peso_foto[prediction_map][..., None]
+    overlay += termo_cor[prediction_map]
+    overlay >>= 8
+    return overlay.astype(np.uint8)
+
+def salvar_imagem(imagem_pil, caminho_sem_extensao, codificacao=None):
+    """Codifica a imagem no formato configurado e devolve o nome do arquivo gerado."""
+    codificacao = {**CODIFICACAO_PADRAO, **(codificacao or {})}
+    formato = codificacao['formato']
+    caminho = f"{caminho_sem_extensao}.{EXTENSAO_FORMATO[formato]}"
+    if formato == 'png':
+        imagem_pil.save(caminho, format='PNG', compress_level=codificacao['png_compress_level'])
+    else:
+        imagem_pil.save(caminho, format=formato.upper(), quality=codificacao['qualidade'])
+    return os.path.basename(caminho)
+
+def salvar_imagens_resultado(original_image, prediction_map, output_dir, imagem_reduzida=None, codificacao=None,
+                             arquivo_original=None):
+    """
+    Salva o overlay e a original de uma imagem na pasta de saída e devolve o nome
+    do arquivo de overlay. 'imagem_reduzida' é a mesma 512x512 que entrou no
+    modelo (evita um segundo resize LANCZOS). Com 'arquivo_original' (a foto foi
+    decodificada reduzida), a original é o próprio arquivo copiado, sem recodificar.
+    """
+    inicio = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    if prediction_map.shape != (512, 512):
+        # Mapa na resolução nativa (tiling): reduz só para desenhar o overlay
+        with etapa('redimensionar_mapa'):
+            prediction_map = np.array(Image.fromarray(prediction_map).resize((512, 512), Image.NEAREST))
+    if imagem_reduzida is None:
+        with etapa('redimensionar'):
+            imagem_reduzida = original_image.resize((512, 512), Image.LANCZOS)
+
+    with etapa('overlay'):
+        overlay = Image.fromarray(gerar_overlay(np.asarray(imagem_reduzida), prediction_map))
+    with etapa('salvar_overlay'):
+        nome_overlay = salvar_imagem(overlay, os.path.join(output_dir, 'overlay'), codificacao)
+    with etapa('salvar_original'):
+        if arquivo_original:
+            extensao = os.path.splitext(arquivo_original)[1].lower()
+            shutil.copyfile(arquivo_original, os.path.join(output_dir, 'original' + extensao))
+        else:
+            salvar_imagem(original_image, os.path.join(output_dir, 'original'), codificacao)
+
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    print(f"Resultados de imagem salvos em: {output_dir} (pós-processamento: {duracao_ms:.1f} ms)", file=sys.stderr)
+    return nome_overlay
+
+def prever_imagem(model, device, original_image, tiling=None, imagem_reduzida=None):
+    """
+    Mapa de predição de uma imagem e a imagem 512x512 que entrou no modelo.
+    Sem tiling: entrada 512x512 (mapa 512x512); 'imagem_reduzida' já pronta evita o resize.
+    Com tiling ({'tile', 'overlap'}): janelas na resolução nativa (mapa H x W, sem imagem reduzida).
+    """
+    if tiling:
+        from inference_tiling import inferir_tiled
+        with etapa('forward_tiled'):
+            return inferir_tiled(model, original_image, device, **tiling), None
+    if imagem_reduzida is not None:
+        return prever_lote(model, tensor_da_imagem(imagem_reduzida, device))[0], imagem_reduzida
+    input_tensor, resized_image = prepare_image(original_image, device)
+    return prever_lote(model, input_tensor)[0], resized_image
+
+def guardar_mascara(area_nome, imagem_id, prediction_map):
+    """Guarda a máscara RLE da foto (mask_store.py) para recalcular o progresso sem o modelo."""
+    try:
+        salvar_mascara(area_nome, imagem_id, prediction_map)
+    except OSError as e:
+        print(f"Aviso: máscara de '{imagem_id}' não salva: {e}", file=sys.stderr)
+
+# --- 4.0.1 CACHE DE PREDIÇÕES (mesma foto + mesmo modelo + mesma configuração) ---
+def config_cache(tiling=None, backend='torch', otimizar=False, output_stride=None, precisao='fp32',
+                 reduzir_jpeg=True, codificacao=None):
+    """Tudo o que muda o mapa de predição ou o overlay entra na chave do cache."""
+    return {
+        "target_size": 512, "tiling": tiling, "backend": backend, "otimizar": otimizar,
+        "output_stride": output_stride, "precisao": precisao, "rascunho": reduzir_jpeg and not tiling,
+        "codificacao": {**CODIFICACAO_PADRAO, **(codificacao or {})},
+    }
+
+def resultado_do_cache(cache, image_path, output_dir, area_nome, chave=None):
+    """
+    Resposta completa a partir do cache, sem o modelo: grava o overlay e a
+    original, atualiza o progresso e devolve o JSON. None se a foto não estiver no cache.
+    chave: cache.chave(image_path), se o chamador já calculou.
+    """
+    try:
+        entrada = cache.ler(chave or cache.chave(image_path))
+    except OSError:
+        return None
+    if entrada is None:
+        return None
+    print("Predição encontrada no cache (forward pulado)", file=sys.stderr)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, entrada['nome_overlay']), 'wb') as f:
+        f.write(entrada['overlay'])
+    extensao = os.path.splitext(image_path)[1].lower()
+    shutil.copyfile(image_path, os.path.join(output_dir, 'original' + extensao))
+
+    contagem_ia = entrada['contagem']
+    imagem_id = os.path.splitext(os.path.basename(image_path))[0]
+    guardar_mascara(area_nome, imagem_id, entrada['mapa'])
+    try:
+        with etapa('progresso'):
+            resultado_progresso = atualizar_progresso(area_nome, contagem_ia, observacoes=[(imagem_id, contagem_ia)])
     except Exception as e:
-        print(f"Erro ao carregar modelo: {e}", file=sys.stderr)
-        return
+        resultado_progresso = {"error": f"Falha ao calcular progresso: {e}"}
+    resultado_progresso['overlay'] = f"/results/{os.path.basename(output_dir)}/{entrada['nome_overlay']}"
+    resultado_progresso['cache'] = True
+    return resultado_progresso
 
-    COLOR_MAP = { 0: [0, 0, 0], 1: [255, 0, 0], 2: [0, 255, 0], 3: [0, 0, 255] }
-    
+def processar_imagem(model, device, image_path, output_dir, area_nome, tiling=None, codificacao=None,
+                     reduzir_jpeg=True, cache=None, chave_cache=None):
+    """
+    Roda a inferência de uma imagem com um modelo já carregado e devolve o JSON de resultado.
+    Com cache (CachePredicoes), uma foto já vista com o mesmo modelo/configuração
+    não passa pelo modelo, e as novas predições são guardadas. chave_cache indica
+    que o chamador já consultou o cache com essa chave (e não achou a foto).
+    """
+    if cache is not None and chave_cache is None:
+        try:
+            chave_cache = cache.chave(image_path)
+        except OSError:
+            cache = None
+        else:
+            resultado = resultado_do_cache(cache, image_path, output_dir, area_nome, chave=chave_cache)
+            if resultado is not None:
+                return resultado
     try:
-        original_image = Image.open(image_path).convert('RGB')
-        print(f"Imagem original: {original_image.size}", file=sys.stderr)
+        original_image, resized_image = carregar_imagem(image_path, target_size=None if tiling else 512,
+                                                        rascunho=reduzir_jpeg)
+        print(f"Imagem decodificada: {original_image.size}", file=sys.stderr)
     except Exception as e:
         print(f"Erro ao carregar imagem: {e}", file=sys.stderr)
-        return
+        return None
     
-    def prepare_image(image_pil, target_size=512):
-        image_resized = image_pil.resize((target_size, target_size), Image.LANCZOS)
-        image_array = np.array(image_resized).astype(np.float32)
-        tensor = torch.from_numpy(image_array).permute(2, 0, 1).float()
-        tensor = tensor.unsqueeze(0)
-        return tensor.to(device), image_resized
-    
-    input_tensor, resized_image = prepare_image(original_image)
+    prediction_map, resized_image = prever_imagem(model, device, original_image, tiling=tiling,
+                                                  imagem_reduzida=resized_image)
     
-    with torch.no_grad():
-        output = model(input_tensor)
-        pred = torch.argmax(output, dim=1).squeeze(0)
-        prediction_map = pred.cpu().numpy().astype(np.uint8)
-    
-    os.makedirs(output_dir, exist_ok=True)
-    original_resized = original_image.resize((512, 512), Image.LANCZOS)
-    original_array = np.array(original_resized).astype(np.float32)
-    overlay_original = original_array.copy()
-    for class_id, color in COLOR_MAP.items():
-        if class_id != 0:
-            mask = prediction_map == class_id
-            overlay_original[mask] = 0.6 * overlay_original[mask] + 0.4 * np.array(color)
-    overlay_original = overlay_original.astype(np.uint8)
-    overlay_path = os.path.join(output_dir, 'overlay.png')
-    Image.fromarray(overlay_original).save(overlay_path)
-    original_image.save(os.path.join(output_dir, 'original.png'))
-    print(f"Resultados de imagem salvos em: {output_dir}", file=sys.stderr)
+    nome_overlay = salvar_imagens_resultado(original_image, prediction_map, output_dir,
+                                            imagem_reduzida=resized_image, codificacao=codificacao,
+                                            arquivo_original=image_path if reduzir_jpeg and not tiling else None)
 
 
     # --- 5. LÓGICA DE PROGRESSO (Atualizada com DEBUG) ---
     try:
         # Trocamos para a função de contagem de PIXELS
         contagem_ia = contar_area_pixels(prediction_map) 
+        # Id da foto no histórico de progresso (o server.js salva a foto como <id da imagem>.jpg)
+        imagem_id = os.path.splitext(os.path.basename(image_path))[0]
 
         # --- LINHA DE DEBUG ADICIONADA ---
         # Esta linha imprime a contagem bruta no terminal (stderr)
         print(f"DEBUG: Contagem de pixels brutos detectados: {json.dumps(contagem_ia)}", file=sys.stderr)
         # --- FIM DA LINHA DE DEBUG ---
 
-        if not contagem_ia:
-            # Mesmo se não detectar nada, precisamos retornar os valores corretos
-            # Chamamos a função com uma contagem vazia
-            resultado_progresso = atualizar_progresso(area_nome, {})
-        else:
-            # Chama a função de progresso 
-            resultado_progresso = atualizar_progresso(area_nome, contagem_ia)
-        
-        resultado_progresso['overlay'] = f"/results/{os.path.basename(output_dir)}/overlay.png"
+        guardar_mascara(area_nome, imagem_id, prediction_map)
+        if cache is not None:
+            try:
+                cache.guardar(chave_cache, prediction_map, contagem_ia,
+                              os.path.join(output_dir, nome_overlay))
+            except OSError as e:
+                print(f"Aviso: predição não guardada no cache: {e}", file=sys.stderr)
+
+        with etapa('progresso'):
+            if not contagem_ia:
+                # Mesmo se não detectar nada, precisamos retornar os valores corretos
+                # Chamamos a função com uma contagem vazia
+                resultado_progresso = atualizar_progresso(area_nome, {}, observacoes=[(imagem_id, {})])
+            else:
+                # Chama a função de progresso 
+                resultado_progresso = atualizar_progresso(area_nome, contagem_ia,
+                                                          observacoes=[(imagem_id, contagem_ia)])
         
-        # Imprime o JSON final para o Node.js
-        print(json.dumps(resultado_progresso, indent=2))
+        resultado_progresso['overlay'] = f"/results/{os.path.basename(output_dir)}/{nome_overlay}"
+        return resultado_progresso
         
     except Exception as e:
-        # Imprime o JSON de ERRO para o Node.js
-        print(json.dumps({
+        # JSON de ERRO para o Node.js
+        return {
             "error": f"Falha ao calcular progresso: {e}",
-            "overlay": f"/results/{os.path.basename(output_dir)}/overlay.png"
-        }))
+            "overlay": f"/results/{os.path.basename(output_dir)}/{nome_overlay}"
+        }
+
+# --- 4.1 INFERÊNCIA EM LOTE (várias fotos da mesma área) ---
+EXTENSOES_IMAGEM = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def listar_imagens(caminhos):
+    """Expande uma lista de arquivos e/ou pastas na lista ordenada de imagens."""
+    imagens = []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            for nome in sorted(os.listdir(caminho)):
+                if nome.lower().endswith(EXTENSOES_IMAGEM):
+                    imagens.append(os.path.join(caminho, nome))
+        else:
+            imagens.append(caminho)
+    return imagens
+
+def juntar_contagens_max(contagens):
+    """Combina contagens de várias imagens com a mesma lógica MAX do progresso."""
+    contagem_max = {}
+    for contagem in contagens:
+        for nome_classe, valor in contagem.items():
+            contagem_max[nome_classe] = max(contagem_max.get(nome_classe, 0), valor)
+    return contagem_max
+
+def ids_do_lote(image_paths):
+    """
+    Id de cada foto do lote (subpasta, máscara e observação), na ordem de image_paths.
+    É o nome do arquivo sem extensão; fotos com o mesmo nome (de pastas diferentes)
+    ganham um trecho do sha256 do conteúdo e, se ainda repetir, um índice.
+    """
+    ids, usados = [], set()
+    for image_path in image_paths:
+        imagem_id = os.path.splitext(os.path.basename(image_path))[0]
+        if imagem_id in usados:
+            from prediction_cache import hash_arquivo
+            try:
+                imagem_id = f"{imagem_id}_{hash_arquivo(image_path)[:8]}"
+            except OSError:
+                pass  # a decodificação vai relatar o erro; o índice abaixo separa o id
+            base, indice = imagem_id, 2
+            while imagem_id in usados:
+                imagem_id = f"{base}_{indice}"
+                indice += 1
+        usados.add(imagem_id)
+        ids.append(imagem_id)
+    return ids
+
+def processar_lote(model, device, image_paths, output_dir, area_nome, batch_size=8, tiling=None,
+                   codificacao=None, reduzir_jpeg=True, threads_decodificacao=2):
+    """
+    Inferência de várias imagens em mini-lotes.
+    Cada foto ganha sua subpasta em output_dir (<id>/overlay.png, ids_do_lote) e o progresso
+    da área é atualizado UMA vez, com o máximo por classe entre as fotos.
+    As fotos são decodificadas em threads (decodificar_em_fundo) enquanto o
+    lote anterior passa pelo modelo. Com tiling, cada imagem vira seu próprio
+    lote de janelas.
+    """
+    import torch
+
+    inicio = time.perf_counter()
+    imagens = []
+    contagens = []
+    reduzir = reduzir_jpeg and not tiling
+    ids = iter(ids_do_lote(image_paths))
+    decodificadas = decodificar_em_fundo(image_paths, threads=threads_decodificacao,
+                                         fila=max(batch_size, threads_decodificacao) * 2,
+                                         target_size=None if tiling else 512, rascunho=reduzir_jpeg)
+
+    while True:
+        tensores, mapas, originais, reduzidas, nomes, arquivos = [], [], [], [], [], []
+        for image_path, decodificada, erro in decodificadas:
+            imagem_id = next(ids)
+            if erro is not None:
+                print(f"Erro ao carregar imagem '{image_path}': {erro}", file=sys.stderr)
+                imagens.append({"imagem": os.path.basename(image_path), "error": f"Falha ao carregar imagem: {erro}"})
+                continue
+            original_image, resized_image = decodificada
+            if tiling:
+                prediction_map, resized_image = prever_imagem(model, device, original_image, tiling=tiling)
+                mapas.append(prediction_map)
+            else:
+                tensores.append(tensor_da_imagem(resized_image, device))
+            originais.append(original_image)
+            reduzidas.append(resized_image)
+            nomes.append(imagem_id)
+            arquivos.append(image_path if reduzir else None)
+            if len(originais) == batch_size:
+                break
+
+        if not originais:
+            break
+
+        prediction_maps = mapas if tiling else prever_lote(model, torch.cat(tensores, dim=0))
+        print(f"Lote de {len(originais)} imagem(ns) processado", file=sys.stderr)
+
+        for nome, original_image, resized_image, prediction_map, arquivo in zip(
+                nomes, originais, reduzidas, prediction_maps, arquivos):
+            pasta_imagem = os.path.join(output_dir, nome)
+            nome_overlay = salvar_imagens_resultado(original_image, prediction_map, pasta_imagem,
+                                                    imagem_reduzida=resized_image, codificacao=codificacao,
+                                                    arquivo_original=arquivo)
+            contagem_ia = contar_area_pixels(prediction_map)
+            contagens.append(contagem_ia)
+            guardar_mascara(area_nome, nome, prediction_map)
+            imagens.append({
+                "imagem": nome,
+                "contagem_pixels": contagem_ia,
+                "overlay": f"/results/{os.path.basename(output_dir)}/{nome}/{nome_overlay}"
+            })
+
+    duracao = time.perf_counter() - inicio
+    contagem_area = juntar_contagens_max(contagens)
+    print(f"DEBUG: Contagem máxima por classe no lote: {json.dumps(contagem_area)}", file=sys.stderr)
+
+    try:
+        with etapa('progresso'):
+            resultado = atualizar_progresso(area_nome, contagem_area,
+                                            observacoes=[(img["imagem"], img["contagem_pixels"])
+                                                         for img in imagens if "contagem_pixels" in img])
+    except Exception as e:
+        resultado = {"error": f"Falha ao calcular progresso: {e}"}
+
+    resultado['imagens'] = imagens
+    resultado['imagens_processadas'] = len(contagens)
+    resultado['imagens_por_segundo'] = round(len(contagens) / duracao, 3) if duracao > 0 else None
+    return resultado
+
+def inference_model(model_path, image_path, output_dir, channels, area_nome, batch_size=8, tiling=None,
+                    backend='torch', otimizar=False, codificacao=None, tempos=False, trace_forward=None,
+                    output_stride=None, precisao='fp32', reduzir_jpeg=True, threads_decodificacao=2,
+                    cache_dir=None, cache_mb=LIMITE_MB_PADRAO, video=None):
+    """
+    Carrega o modelo e processa uma imagem (str) ou várias em lote (lista de caminhos).
+    Um vídeo (str com extensão de vídeo) é processado em streaming (inference_video.py);
+    video={'fps_amostra', 'limiar_cena', 'salvar_overlays'} ajusta a amostragem.
+    tempos=True inclui no JSON o tempo de parede/CPU de cada etapa ('tempos');
+    trace_forward grava o primeiro forward com o torch.profiler nesse arquivo.
+    Com cache_dir, uma imagem única já processada vem do cache de predições
+    (o modelo nem é carregado).
+    """
+    if tempos:
+        CRONOMETRO.iniciar()
+    CRONOMETRO.trace = trace_forward
+
+    cache = chave_cache = None
+    if cache_dir and not isinstance(image_path, (list, tuple)) and not eh_video(image_path):
+        try:
+            config = config_cache(tiling, backend, otimizar, output_stride, precisao, reduzir_jpeg, codificacao)
+            cache = CachePredicoes(model_path, config, pasta=cache_dir, limite_mb=cache_mb)
+            chave_cache = cache.chave(image_path)
+            resultado = resultado_do_cache(cache, image_path, output_dir, area_nome, chave=chave_cache)
+        except OSError as e:
+            print(f"Aviso: cache de predições indisponível: {e}", file=sys.stderr)
+            cache = chave_cache = resultado = None
+        if resultado is not None:
+            if tempos:
+                resultado['tempos'] = CRONOMETRO.resumo()
+            print(json.dumps(resultado, indent=2))
+            return
+
+    import torch
+
+    # bf16 é o modo de CPU (AMX/AVX512-BF16): não vai para a GPU mesmo que exista
+    usar_gpu = torch.cuda.is_available() and backend == 'torch' and precisao != 'bf16'
+    device = torch.device("cuda" if usar_gpu else "cpu")
+    print(f"Usando dispositivo: {device} (backend: {backend})", file=sys.stderr)
+    
+    try:
+        with etapa('carregar_modelo'):
+            model = carregar_modelo(model_path, device, backend=backend, otimizar=otimizar,
+                                    output_stride=output_stride, precisao=precisao)
+        print("Modelo carregado de objeto completo", file=sys.stderr)
+    except Exception as e:
+        print(f"Erro ao carregar modelo: {e}", file=sys.stderr)
+        return
+
+    if not isinstance(image_path, (list, tuple)) and eh_video(image_path):
+        from inference_video import processar_video
+        try:
+            resultado = processar_video(model, device, image_path, output_dir, area_nome, batch_size=batch_size,
+                                        codificacao=codificacao, **(video or {}))
+        except ValueError as e:
+            resultado = {"error": str(e)}
+    elif isinstance(image_path, (list, tuple)):
+        resultado = processar_lote(model, device, list(image_path), output_dir, area_nome,
+                                   batch_size=batch_size, tiling=tiling, codificacao=codificacao,
+                                   reduzir_jpeg=reduzir_jpeg, threads_decodificacao=threads_decodificacao)
+    else:
+        resultado = processar_imagem(model, device, image_path, output_dir, area_nome, tiling=tiling,
+                                     codificacao=codificacao, reduzir_jpeg=reduzir_jpeg, cache=cache,
+                                     chave_cache=chave_cache)
+    if resultado is not None:
+        if tempos:
+            resultado['tempos'] = CRONOMETRO.resumo()
+        # Imprime o JSON final para o Node.js
+        print(json.dumps(resultado, indent=2))
 
 # --- 6. PONTO DE ENTRADA (MAIN) ---
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Teste de inferência para modelo')
     parser.add_argument('--model_path', required=True, help='Caminho para o modelo .pt')
-    parser.add_argument('--image_path', required=True, help='Caminho para a imagem de teste')
+    parser.add_argument('--image_path', nargs='+', help='Caminho para a imagem de teste (várias = modo lote)')
+    parser.add_argument('--image_dir', help='Pasta com imagens da mesma área (modo lote)')
+    parser.add_argument('--sample_fps', type=float, default=FPS_AMOSTRA_PADRAO,
+                        help='Vídeo (--image_path video.mp4): quadros analisados por segundo de vídeo')
+    parser.add_argument('--scene_threshold', type=float, default=LIMIAR_CENA_PADRAO,
+                        help='Vídeo: diferença mínima (0-1) para um quadro não ser descartado como repetido')
+    parser.add_argument('--save_frame_overlays', action='store_true',
+                        help='Vídeo: salva o overlay de cada quadro inferido (padrão: só o do quadro com mais pixels)')
+    parser.add_argument('--batch_size', type=int, default=8, help='Imagens por forward no modo lote')
+    parser.add_argument('--tile_size', type=int, default=0,
+                        help='Inferência por janelas na resolução nativa com este lado em pixels (0 = desligado)')
+    parser.add_argument('--tile_overlap', type=int, default=None, help='Sobreposição entre janelas (padrão: tile/4)')
+    parser.add_argument('--tile_memory_mb', type=float, default=None,
+                        help='Escolhe tile/overlap automaticamente para este orçamento de memória (MB)')
     parser.add_argument('--output_dir', default='./inference_results', help='Pasta para salvar resultados')
+    parser.add_argument('--full_decode', action='store_true',
+                        help='Decodifica o JPEG inteiro antes de reduzir (sem o modo draft do PIL)')
+    parser.add_argument('--decode_threads', type=int, default=2,
+                        help='Threads que decodificam as fotos em paralelo ao modelo (modo lote)')
+    parser.add_argument('--overlay_format', choices=sorted(EXTENSAO_FORMATO), default=CODIFICACAO_PADRAO['formato'],
+                        help='Formato do overlay/original salvos')
+    parser.add_argument('--png_compress_level', type=int, choices=range(10),
+                        default=CODIFICACAO_PADRAO['png_compress_level'], help='Compressão PNG (0-9)')
+    parser.add_argument('--quality', type=int, default=CODIFICACAO_PADRAO['qualidade'],
+                        help='Qualidade JPEG/WebP (1-100)')
     parser.add_argument('--channels', type=int, default=4, help='Número de classes')
     parser.add_argument('--area', required=True, help='A zona de inspeção (ex: plataforma)')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch',
+                        help='Motor de execução: PyTorch eager ou ONNX Runtime (CPU; exporta o .onnx ao lado do .Pt)')
+    parser.add_argument('--optimize', action='store_true',
+                        help='Dobra BatchNorm nas convs e funde pads/ReLUs antes de inferir (verifica equivalência)')
+    parser.add_argument('--output_stride', type=int, choices=[8, 16, 32],
+                        help='Troca o output stride do modelo sem retreinar (16 = prévia ~3x mais rápida; '
+                             'ver output_stride_report.py)')
+    parser.add_argument('--precision', choices=['fp32', 'bf16'], default='fp32',
+                        help='bf16: CPU em channels_last sob autocast bfloat16, argmax e contagem exatos '
+                             '(ver precision_report.py)')
+    parser.add_argument('--no_cache', action='store_true', help='Não usa o cache de predições')
+    parser.add_argument('--cache_dir', default=PASTA_CACHE, help='Pasta do cache de predições')
+    parser.add_argument('--cache_mb', type=float, default=LIMITE_MB_PADRAO,
+                        help='Espaço máximo do cache em disco (MB); as entradas menos usadas saem primeiro')
+    parser.add_argument('--worker_url', default=os.environ.get('INFERENCE_WORKER_URL'),
+                        help='URL do worker residente (inference_worker.py). Se ausente, roda localmente')
+    parser.add_argument('--timings', action='store_true',
+                        help='Inclui no JSON o tempo de parede e de CPU de cada etapa (roda localmente)')
+    parser.add_argument('--profile_trace', help='Grava o forward com torch.profiler neste arquivo (trace Chrome)')
     
     args = parser.parse_args()
+    if not args.image_path and not args.image_dir:
+        parser.error('informe --image_path ou --image_dir')
+    if args.batch_size < 1:
+        parser.error('--batch_size deve ser >= 1')
+    if args.decode_threads < 1:
+        parser.error('--decode_threads deve ser >= 1')
+    if args.output_stride and args.backend == 'onnx':
+        parser.error('--output_stride só funciona com --backend torch')
+    if args.precision == 'bf16' and args.backend == 'onnx':
+        parser.error('--precision bf16 só funciona com --backend torch')
+
+    tiling = None
+    if args.tile_memory_mb:
+        tile, overlap = escolher_tile_por_memoria(args.tile_memory_mb)
+        tiling = {'tile': tile, 'overlap': overlap if args.tile_overlap is None else args.tile_overlap}
+    elif args.tile_size:
+        tiling = {'tile': args.tile_size,
+                  'overlap': args.tile_size // 4 if args.tile_overlap is None else args.tile_overlap}
+    if tiling and not 0 <= tiling['overlap'] < tiling['tile']:
+        parser.error('--tile_overlap deve estar entre 0 e o tamanho do tile')
+
+    modo_lote = bool(args.image_dir) or len(args.image_path) > 1
+    if modo_lote:
+        imagens = listar_imagens((args.image_path or []) + ([args.image_dir] if args.image_dir else []))
+    else:
+        imagens = args.image_path[0]
+        if eh_video(imagens) and tiling:
+            parser.error('Vídeo não usa tiling (os quadros entram no modelo em 512x512)')
     
     print("Iniciando teste de inferência...", file=sys.stderr)
     print(f"Modelo: {args.model_path}", file=sys.stderr)
-    print(f"Imagem: {args.image_path}", file=sys.stderr)
+    print(f"Imagem: {args.image_dir or args.image_path}", file=sys.stderr)
     print(f"Saída: {args.output_dir}", file=sys.stderr)
     print(f"Classes: {args.channels}", file=sys.stderr)
     print(f"Área: {args.area}", file=sys.stderr)
+    if tiling:
+        print(f"Tiling: tile={tiling['tile']} overlap={tiling['overlap']}", file=sys.stderr)
+    if modo_lote:
+        print(f"Modo lote: {len(imagens)} imagem(ns), batch_size={args.batch_size}", file=sys.stderr)
     print("-" * 50, file=sys.stderr)
+
+    # --- MODO CLIENTE: delega o job ao worker (modelo já carregado em memória) ---
+    codificacao = {'formato': args.overlay_format, 'png_compress_level': args.png_compress_level,
+                   'qualidade': args.quality}
+
+    # As opções vão no job: o worker recusa (409) o que não atende (outro modelo, outro cache...).
+    # Lote, vídeo e medições de tempo rodam sempre localmente.
+    if (args.worker_url and not modo_lote and not eh_video(imagens) and not args.timings
+            and not args.profile_trace):
+        from inference_worker import ConfiguracaoIncompativel, WorkerIndisponivel, config_modelo, enviar_para_worker
+        try:
+            resultado = enviar_para_worker(
+                args.worker_url,
+                image_path=imagens,
+                output_dir=args.output_dir,
+                area_nome=args.area,
+                modelo=config_modelo(args.model_path, args.backend, args.optimize, args.output_stride,
+                                     args.precision),
+                opcoes={'codificacao': codificacao, 'reduzir_jpeg': not args.full_decode, 'tiling': tiling},
+                cache=None if args.no_cache else {'pasta': args.cache_dir, 'limite_mb': args.cache_mb}
+            )
+            print(json.dumps(resultado, indent=2))
+            sys.exit(0)
+        except WorkerIndisponivel as e:
+            print(f"Worker indisponível ({e}). Rodando localmente...", file=sys.stderr)
+        except ConfiguracaoIncompativel as e:
+            print(f"Worker não atende estas opções ({e}). Rodando localmente...", file=sys.stderr)
+        except RuntimeError as e:
+            print(f"Erro no worker: {e}", file=sys.stderr)
+            sys.exit(1)
     
     inference_model(
         model_path=args.model_path,
-        image_path=args.image_path,
+        image_path=imagens,
         output_dir=args.output_dir,
         channels=args.channels,
-        area_nome=args.area
+        area_nome=args.area,
+        batch_size=args.batch_size,
+        tiling=tiling,
+        backend=args.backend,
+        otimizar=args.optimize,
+        codificacao=codificacao,
+        tempos=args.timings,
+        trace_forward=args.profile_trace,
+        output_stride=args.output_stride,
+        precisao=args.precision,
+        reduzir_jpeg=not args.full_decode,
+        threads_decodificacao=args.decode_threads,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        cache_mb=args.cache_mb,
+        video={'fps_amostra': args.sample_fps, 'limiar_cena': args.scene_threshold,
+               'salvar_overlays': args.save_frame_overlays}
     )
\ No newline at end of file
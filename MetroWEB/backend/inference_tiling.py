@@ -0,0 +1,100 @@
+import math
+import sys
+
+import numpy as np
+
+# --- INFERÊNCIA POR JANELAS (TILING) NA RESOLUÇÃO NATIVA ---
+# Em vez de espremer a foto (ex: 4000x3000) para 512x512, o modelo roda em
+# janelas sobrepostas de tamanho fixo e os logits são misturados nas emendas
+# com um peso que decai nas bordas de cada janela.
+#
+# A memória do forward depende só do tamanho da janela. Os logits são
+# acumulados numa FAIXA com a altura de uma janela (C x tile x W); cada linha
+# da imagem é finalizada (argmax -> uint8) assim que nenhuma janela futura a
+# alcança. Da imagem inteira só fica em memória o mapa de predição uint8.
+
+# Memória de ativação medida para o ResNet-101 OS8 em fp32 (CPU, no_grad),
+# por pixel de entrada, com folga para o alocador.
+BYTES_POR_PIXEL_PADRAO = 1200
+TILE_MINIMO = 128
+TILE_MAXIMO = 2048
+MULTIPLO_TILE = 32  # mantém as janelas alinhadas com o stride da rede
+
+
+def escolher_tile_por_memoria(memoria_mb, bytes_por_pixel=BYTES_POR_PIXEL_PADRAO):
+    """Escolhe (tile, overlap) que cabem no orçamento de memória de ativação (em MB)."""
+    lado = int(math.sqrt(memoria_mb * 1024 * 1024 / bytes_por_pixel))
+    tile = max(TILE_MINIMO, min(TILE_MAXIMO, lado // MULTIPLO_TILE * MULTIPLO_TILE))
+    overlap = tile // 4 // 16 * 16
+    return tile, overlap
+
+
+def _posicoes(tamanho, tile, passo):
+    """Inícios das janelas ao longo de um eixo (a última encosta na borda)."""
+    if tamanho <= tile:
+        return [0]
+    posicoes = list(range(0, tamanho - tile, passo))
+    posicoes.append(tamanho - tile)
+    return posicoes
+
+
+def _rampa(tamanho, overlap):
+    """Peso 1D: sobe linearmente nas 'overlap' bordas e vale 1 no miolo (nunca zero)."""
+    peso = np.ones(tamanho, dtype=np.float32)
+    if overlap > 0:
+        rampa = (np.arange(1, overlap + 1, dtype=np.float32)) / (overlap + 1)
+        n = min(overlap, tamanho // 2)
+        peso[:n] = rampa[:n]
+        peso[tamanho - n:] = rampa[:n][::-1]
+    return peso
+
+
+def inferir_tiled(model, image_pil, device, tile=512, overlap=128, tiles_por_lote=1):
+    """
+    Roda o modelo em janelas sobrepostas e devolve o mapa de predição uint8
+    (H x W) na resolução original da imagem.
+    """
+    import torch  # importado aqui: escolher_tile_por_memoria não precisa dele
+
+    if overlap >= tile:
+        raise ValueError(f"overlap ({overlap}) deve ser menor que o tile ({tile})")
+
+    imagem = np.asarray(image_pil)  # H x W x 3, uint8 (sem cópia float da imagem inteira)
+    altura, largura = imagem.shape[:2]
+    tile_h, tile_w = min(tile, altura), min(tile, largura)
+    passo = tile - overlap
+
+    ys = _posicoes(altura, tile_h, passo)
+    xs = _posicoes(largura, tile_w, passo)
+    peso = torch.from_numpy(np.outer(_rampa(tile_h, overlap), _rampa(tile_w, overlap)))
+
+    prediction_map = np.zeros((altura, largura), dtype=np.uint8)
+    faixa = None        # C x tile_h x W (logits ponderados)
+    topo_faixa = 0      # linha da imagem correspondente à linha 0 da faixa
+
+    print(f"Tiling: {len(ys) * len(xs)} janela(s) de {tile_w}x{tile_h} (overlap {overlap}) "
+          f"para imagem {largura}x{altura}", file=sys.stderr)
+
+    with torch.no_grad():
+        for y0 in ys:
+            # Finaliza as linhas que nenhuma janela a partir de y0 alcança
+            if faixa is not None and y0 > topo_faixa:
+                prontas = y0 - topo_faixa
+                prediction_map[topo_faixa:y0] = torch.argmax(faixa[:, :prontas], dim=0).numpy().astype(np.uint8)
+                faixa = torch.cat([faixa[:, prontas:], torch.zeros_like(faixa[:, :prontas])], dim=1)
+                topo_faixa = y0
+
+            for i in range(0, len(xs), tiles_por_lote):
+                grupo = xs[i:i + tiles_por_lote]
+                lote = np.stack([imagem[y0:y0 + tile_h, x0:x0 + tile_w] for x0 in grupo])
+                tensor = torch.from_numpy(lote).permute(0, 3, 1, 2).float().to(device)
+                logits = model(tensor).float().cpu()
+
+                if faixa is None:
+                    faixa = torch.zeros((logits.shape[1], tile_h, largura), dtype=torch.float32)
+                for x0, logit in zip(grupo, logits):
+                    faixa[:, y0 - topo_faixa:y0 - topo_faixa + tile_h, x0:x0 + tile_w] += logit * peso
+
+    # Últimas linhas (a faixa final inteira)
+    prediction_map[topo_faixa:] = torch.argmax(faixa[:, :altura - topo_faixa], dim=0).numpy().astype(np.uint8)
+    return prediction_map
@@ -0,0 +1,102 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# --- TEMPO POR ETAPA DA INFERÊNCIA ---
+# Mede, quando ligado (inference_test.py --timings), o tempo de parede e de CPU
+# de cada etapa do pipeline: carregar o modelo, decodificar a foto, redimensionar,
+# forward, argmax, overlay, salvar os arquivos e atualizar o progresso.
+# Desligado, nada é medido (as etapas viram blocos vazios).
+#
+# A decodificação roda em threads junto com o forward, então as etapas se
+# sobrepõem: total_wall_ms é o tempo de iniciar() até resumo(), não a soma das
+# etapas. O CPU de cada etapa é o do processo inteiro (cpu_processo_ms), porque
+# o forward roda nas threads do torch: inclui o que outras threads fizeram no
+# mesmo intervalo.
+#
+# O forward também pode ser gravado com o torch.profiler (--profile_trace),
+# gerando um trace Chrome/Perfetto (chrome://tracing ou ui.perfetto.dev).
+
+
+class Cronometro:
+    """Acumula tempo de parede e de CPU do processo por etapa (na ordem em que aparecem)."""
+
+    def __init__(self):
+        self.ativo = False
+        self.trace = None
+        self.etapas = {}
+        self.inicio = None
+        self._lock = threading.Lock()  # etapas medidas nas threads de decodificação
+
+    def iniciar(self):
+        with self._lock:
+            self.ativo = True
+            self.etapas = {}
+            self.inicio = (time.perf_counter(), time.process_time())
+
+    @contextmanager
+    def etapa(self, nome):
+        if not self.ativo:
+            yield
+            return
+        inicio_parede, inicio_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            _sincronizar_gpu()
+            parede_ms = (time.perf_counter() - inicio_parede) * 1000
+            cpu_ms = (time.process_time() - inicio_cpu) * 1000
+            with self._lock:
+                etapa = self.etapas.setdefault(nome, {"wall_ms": 0.0, "cpu_processo_ms": 0.0, "chamadas": 0})
+                etapa["wall_ms"] += parede_ms
+                etapa["cpu_processo_ms"] += cpu_ms
+                etapa["chamadas"] += 1
+
+    @contextmanager
+    def perfil(self):
+        """Grava o bloco com torch.profiler e exporta o trace (só o primeiro bloco é gravado)."""
+        if not self.trace:
+            yield
+            return
+        from torch.profiler import ProfilerActivity, profile
+
+        atividades = [ProfilerActivity.CPU]
+        if _gpu_em_uso():
+            atividades.append(ProfilerActivity.CUDA)
+        caminho, self.trace = self.trace, None
+        with profile(activities=atividades, record_shapes=True, profile_memory=True) as perfil:
+            yield
+        perfil.export_chrome_trace(caminho)
+        print(f"Trace do forward salvo em: {caminho}", file=sys.stderr)
+
+    def resumo(self):
+        """Etapas medidas (ms, arredondados) e os totais de parede e CPU desde iniciar()."""
+        with self._lock:
+            etapas = {
+                nome: {"wall_ms": round(e["wall_ms"], 2), "cpu_processo_ms": round(e["cpu_processo_ms"], 2),
+                       "chamadas": e["chamadas"]}
+                for nome, e in self.etapas.items()
+            }
+        resultado = {"etapas": etapas}
+        if self.inicio is not None:
+            inicio_parede, inicio_cpu = self.inicio
+            resultado["total_wall_ms"] = round((time.perf_counter() - inicio_parede) * 1000, 2)
+            resultado["total_cpu_processo_ms"] = round((time.process_time() - inicio_cpu) * 1000, 2)
+        return resultado
+
+
+def _gpu_em_uso():
+    torch = sys.modules.get('torch')  # não importa o torch só para isso
+    return torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized()
+
+
+def _sincronizar_gpu():
+    # Kernels CUDA são assíncronos: sem sincronizar, o tempo cairia na etapa seguinte
+    if _gpu_em_uso():
+        sys.modules['torch'].cuda.synchronize()
+
+
+# Instância única usada pelo inference_test.py
+CRONOMETRO = Cronometro()
+etapa = CRONOMETRO.etapa
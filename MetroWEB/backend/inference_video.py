@@ -0,0 +1,190 @@
+import os
+import queue
+import sys
+import threading
+import time
+
+from inference_timing import etapa
+
+# --- INFERÊNCIA EM VÍDEO (AMOSTRAGEM + DESCARTE DE QUADROS REPETIDOS) ---
+# O vídeo é lido em streaming com o OpenCV numa thread própria: só um quadro a
+# cada 1/fps_amostra segundos é decodificado (os demais são apenas avançados com
+# grab()). Um quadro amostrado que quase não difere do último quadro aceito
+# (diferença média absoluta numa miniatura em tons de cinza abaixo do limiar) é
+# descartado antes de chegar ao modelo. Os quadros restantes são agrupados em
+# lotes, e o progresso da área é atualizado a cada lote (máximo por classe).
+#
+# A memória é limitada pela fila entre a leitura e o modelo e pelo lote, e não
+# depende da duração do vídeo. O cv2 e o torch só são importados ao processar
+# um vídeo (o inference_test.py importa este módulo sempre).
+
+FPS_AMOSTRA_PADRAO = 1.0
+LIMIAR_CENA_PADRAO = 0.03     # fração da escala (0-1) de diferença média para aceitar um quadro
+TAMANHO_MINIATURA = (64, 36)  # (largura, altura) usada na métrica de mudança de cena
+EXTENSOES_VIDEO = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+_FIM = object()
+
+
+def eh_video(caminho):
+    return caminho.lower().endswith(EXTENSOES_VIDEO)
+
+
+def diferenca_cena(miniatura, anterior):
+    """Diferença média absoluta (0-1) entre duas miniaturas em tons de cinza."""
+    import cv2
+    return float(cv2.absdiff(miniatura, anterior).mean()) / 255.0
+
+
+def amostrar_quadros(video_path, fps_amostra=FPS_AMOSTRA_PADRAO, limiar_cena=LIMIAR_CENA_PADRAO,
+                     target_size=512, estatisticas=None):
+    """
+    Gera (indice_quadro, tempo_s, quadro RGB target_size x target_size uint8) dos
+    quadros amostrados que passaram pelo filtro de mudança de cena.
+    'estatisticas' (dict), se dado, recebe os contadores da leitura.
+    """
+    import cv2
+
+    captura = cv2.VideoCapture(video_path)
+    if not captura.isOpened():
+        raise ValueError(f"Não foi possível abrir o vídeo '{video_path}'")
+    fps_video = captura.get(cv2.CAP_PROP_FPS) or 30.0
+    passo = max(1, int(round(fps_video / fps_amostra))) if fps_amostra > 0 else 1
+    estatisticas = estatisticas if estatisticas is not None else {}
+    estatisticas.update({"fps_video": round(fps_video, 3), "passo_quadros": passo,
+                         "quadros_lidos": 0, "quadros_amostrados": 0, "quadros_repetidos": 0})
+    anterior = None
+    indice = -1
+    try:
+        while True:
+            # grab() só avança o demuxer/decodificador; retrieve() converte o quadro amostrado
+            if not captura.grab():
+                break
+            indice += 1
+            estatisticas["quadros_lidos"] += 1
+            if indice % passo:
+                continue
+            ok, quadro = captura.retrieve()
+            if not ok:
+                break
+            estatisticas["quadros_amostrados"] += 1
+            miniatura = cv2.cvtColor(cv2.resize(quadro, TAMANHO_MINIATURA, interpolation=cv2.INTER_AREA),
+                                     cv2.COLOR_BGR2GRAY)
+            if anterior is not None and diferenca_cena(miniatura, anterior) < limiar_cena:
+                estatisticas["quadros_repetidos"] += 1
+                continue
+            anterior = miniatura
+            reduzido = cv2.resize(quadro, (target_size, target_size), interpolation=cv2.INTER_AREA)
+            yield indice, indice / fps_video, cv2.cvtColor(reduzido, cv2.COLOR_BGR2RGB)
+    finally:
+        captura.release()
+
+
+def _ler_em_fundo(gerador, fila_max):
+    """Consome o gerador numa thread, entregando os itens por uma fila limitada."""
+    fila = queue.Queue(maxsize=fila_max)
+    parar = threading.Event()
+
+    def produtor():
+        try:
+            for item in gerador:
+                while not parar.is_set():
+                    try:
+                        fila.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if parar.is_set():
+                    return
+            fila.put(_FIM)
+        except Exception as e:
+            fila.put(e)
+
+    thread = threading.Thread(target=produtor, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = fila.get()
+            if item is _FIM:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        parar.set()  # consumidor parou antes do fim: o produtor desiste e libera o vídeo
+
+
+def processar_video(model, device, video_path, output_dir, area_nome, batch_size=8,
+                    fps_amostra=FPS_AMOSTRA_PADRAO, limiar_cena=LIMIAR_CENA_PADRAO,
+                    salvar_overlays=False, codificacao=None):
+    """
+    Inferência dos quadros amostrados do vídeo, em lotes, com o progresso da área
+    atualizado a cada lote. Devolve o JSON de progresso (último lote) com as
+    estatísticas do vídeo; o overlay devolvido é o do quadro com mais pixels detectados.
+    """
+    import torch
+    from PIL import Image
+    from inference_test import (atualizar_progresso, contar_area_pixels, guardar_mascara, juntar_contagens_max,
+                                prever_lote, salvar_imagens_resultado, tensor_da_imagem)
+
+    inicio = time.perf_counter()
+    nome_video = os.path.splitext(os.path.basename(video_path))[0]
+    estatisticas = {}
+    quadros = _ler_em_fundo(amostrar_quadros(video_path, fps_amostra, limiar_cena, estatisticas=estatisticas),
+                            fila_max=batch_size * 2)
+    estado = {"resultado": None, "inferidos": 0, "melhor": None}  # melhor: só UM quadro fica guardado
+
+    def inferir(lote):
+        with etapa('preparar_tensor'):
+            tensor = torch.cat([tensor_da_imagem(quadro, device) for _, _, quadro in lote], dim=0)
+        mapas = prever_lote(model, tensor)
+
+        observacoes = []
+        for (_, tempo, quadro), mapa in zip(lote, mapas):
+            quadro_id = f"{nome_video}_{int(tempo * 1000):09d}ms"
+            contagem = contar_area_pixels(mapa)
+            observacoes.append((quadro_id, contagem))
+            guardar_mascara(area_nome, quadro_id, mapa)
+            if salvar_overlays:
+                imagem = Image.fromarray(quadro)
+                salvar_imagens_resultado(imagem, mapa, os.path.join(output_dir, quadro_id),
+                                         imagem_reduzida=imagem, codificacao=codificacao)
+            total = sum(contagem.values())
+            if estado["melhor"] is None or total > estado["melhor"][0]:
+                estado["melhor"] = (total, quadro_id, quadro, mapa)
+
+        try:
+            with etapa('progresso'):
+                estado["resultado"] = atualizar_progresso(area_nome, juntar_contagens_max([c for _, c in observacoes]),
+                                                          observacoes=observacoes)
+        except Exception as e:
+            estado["resultado"] = {"error": f"Falha ao calcular progresso: {e}"}
+        estado["inferidos"] += len(lote)
+        print(f"Vídeo: {estado['inferidos']} quadro(s) inferido(s) (t={lote[-1][1]:.1f}s), "
+              f"progresso {estado['resultado'].get('porcentagem_geral')}%", file=sys.stderr)
+
+    lote = []
+    for quadro in quadros:
+        lote.append(quadro)
+        if len(lote) == batch_size:
+            inferir(lote)
+            lote = []
+    if lote:
+        inferir(lote)
+
+    resultado, inferidos, melhor = estado["resultado"], estado["inferidos"], estado["melhor"]
+    if resultado is None:
+        resultado = {"error": "Nenhum quadro do vídeo foi lido"}
+    elif melhor is not None:
+        _, quadro_id, quadro, mapa = melhor
+        imagem = Image.fromarray(quadro)
+        nome_overlay = salvar_imagens_resultado(imagem, mapa, output_dir, imagem_reduzida=imagem,
+                                                codificacao=codificacao)
+        resultado['overlay'] = f"/results/{os.path.basename(output_dir)}/{nome_overlay}"
+        resultado['quadro_overlay'] = quadro_id
+    resultado.pop('porcentagem_imagem', None)
+
+    duracao = time.perf_counter() - inicio
+    resultado['video'] = {**estatisticas, "quadros_inferidos": inferidos, "duracao_s": round(duracao, 3),
+                          "quadros_inferidos_por_segundo": round(inferidos / duracao, 3) if duracao > 0 else None}
+    return resultado
+
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- WORKER RESIDENTE DE INFERÊNCIA ---
+# Mantém o DeepLabV3+ carregado em memória entre requisições. Assim cada foto
+# paga só o forward (e não o import do torch + torch.load do modelo inteiro).
+#
+# Uso:
+#   python inference_worker.py --model_path Var_2plus_weights_28.Pt --port 8765
+#   set INFERENCE_WORKER_URL=http://127.0.0.1:8765   (inference_test.py vira cliente)
+
+HOST_PADRAO = '127.0.0.1'
+PORTA_PADRAO = 8765
+TIMEOUT_PADRAO = 300  # segundos (primeira inferência de imagens grandes pode demorar)
+
+
+class WorkerIndisponivel(Exception):
+    """O worker não respondeu (não está rodando, porta errada, etc.)."""
+    pass
+
+
+class ConfiguracaoIncompativel(Exception):
+    """O worker respondeu, mas não atende o job com as opções pedidas (HTTP 409)."""
+    pass
+
+
+# Opções de um job repassadas ao processar_imagem (valem só para aquele job)
+OPCOES_JOB = ('codificacao', 'reduzir_jpeg', 'tiling')
+
+
+def config_modelo(model_path, backend='torch', otimizar=False, output_stride=None, precisao='fp32'):
+    """
+    Qual modelo e como foi carregado: o job só é atendido por um worker com a mesma
+    configuração. A assinatura (tamanho, mtime) do arquivo pega um checkpoint
+    substituído depois que o worker subiu.
+    """
+    try:
+        info = os.stat(model_path)
+        assinatura = [info.st_size, info.st_mtime_ns]
+    except OSError:
+        assinatura = None
+    return {"model_path": os.path.abspath(model_path), "assinatura_modelo": assinatura, "backend": backend,
+            "otimizar": otimizar, "output_stride": output_stride, "precisao": precisao}
+
+
+# --- 1. CLIENTE (usado pelo inference_test.py) ---
+def enviar_para_worker(worker_url, image_path, output_dir, area_nome, modelo=None, opcoes=None,
+                       cache=None, timeout=TIMEOUT_PADRAO):
+    """
+    Envia um job ao worker e devolve o mesmo JSON que o modo local imprime.
+    modelo: config_modelo() do job (obrigatória); opcoes: OPCOES_JOB do job (ex: codificacao do overlay);
+    cache: {'pasta', 'limite_mb'} do cache de predições, ou None para não usar.
+    Se o worker não atende essa configuração, levanta ConfiguracaoIncompativel
+    (o chamador roda localmente).
+    """
+    payload = json.dumps({
+        "image_path": os.path.abspath(image_path),
+        "output_dir": os.path.abspath(output_dir),
+        "area": area_nome,
+        "modelo": modelo,
+        "opcoes": opcoes or {},
+        "cache": {"pasta": os.path.abspath(cache['pasta']), "limite_mb": cache['limite_mb']} if cache else None
+    }).encode('utf-8')
+    req = urllib.request.Request(
+        worker_url.rstrip('/') + '/inferencia',
+        data=payload,
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        detalhes = e.read().decode('utf-8', errors='replace')
+        if e.code == 409:
+            raise ConfiguracaoIncompativel(detalhes)
+        # O worker respondeu, mas o job falhou (ex: imagem inválida)
+        raise RuntimeError(f"Worker retornou HTTP {e.code}: {detalhes}")
+    except (urllib.error.URLError, ConnectionError) as e:
+        raise WorkerIndisponivel(str(e))
+
+
+# --- 2. SERVIDOR ---
+class InferenceHandler(BaseHTTPRequestHandler):
+    # Preenchidos em servir()
+    model = None
+    device = None
+    model_path = None
+    modelo = None  # config_modelo() com que o modelo foi carregado
+    cache_dir = None
+    cache_mb = None
+    caches = {}  # um CachePredicoes por configuração de job (a codificação entra na chave)
+    lock = threading.Lock()
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path == '/saude':
+            self._responder(200, {"status": "ok", "modelo": self.model_path, "dispositivo": str(self.device),
+                                  "configuracao": self.modelo})
+        else:
+            self._responder(404, {"error": "Rota não encontrada"})
+
+    def do_POST(self):
+        if self.path != '/inferencia':
+            self._responder(404, {"error": "Rota não encontrada"})
+            return
+        try:
+            tamanho = int(self.headers.get('Content-Length', 0))
+            job = json.loads(self.rfile.read(tamanho).decode('utf-8'))
+            image_path, output_dir, area_nome = job['image_path'], job['output_dir'], job['area']
+            pedido = job['modelo']
+            opcoes = job.get('opcoes') or {}
+            cache_job = job.get('cache')
+        except Exception as e:
+            self._responder(400, {"error": f"Job inválido: {e}"})
+            return
+
+        diferencas = {chave: {"job": pedido.get(chave), "worker": self.modelo.get(chave)}
+                      for chave in sorted(set(pedido) | set(self.modelo))
+                      if pedido.get(chave) != self.modelo.get(chave)}
+        if diferencas:
+            self._responder(409, {"error": "O modelo do worker foi carregado com outra configuração",
+                                  "diferencas": diferencas})
+            return
+        desconhecidas = sorted(set(opcoes) - set(OPCOES_JOB))
+        if desconhecidas:
+            self._responder(409, {"error": f"Opções não suportadas pelo worker: {', '.join(desconhecidas)}"})
+            return
+        # Sem cache no worker, o job roda sem cache; com cache, só o mesmo (pasta e limite) serve
+        if cache_job and self.cache_dir and (os.path.abspath(cache_job['pasta']) != self.cache_dir
+                                             or cache_job['limite_mb'] != self.cache_mb):
+            self._responder(409, {"error": "O cache de predições do worker é outro",
+                                  "diferencas": {"cache": {"job": cache_job,
+                                                           "worker": {"pasta": self.cache_dir,
+                                                                      "limite_mb": self.cache_mb}}}})
+            return
+
+        from inference_test import processar_imagem
+
+        # Um forward por vez: o torch já paraleliza internamente (intra-op)
+        try:
+            with self.lock:
+                resultado = processar_imagem(self.model, self.device, image_path, output_dir, area_nome,
+                                             cache=self._cache_para(opcoes) if cache_job else None, **opcoes)
+        except Exception as e:
+            # Responde sempre: sem resposta o cliente acharia que o worker caiu e refaria o job localmente
+            print(f"[worker] Falha no job '{image_path}': {e!r}", file=sys.stderr)
+            self._responder(500, {"error": f"Falha na inferência: {e}"})
+            return
+
+        if resultado is None:
+            self._responder(500, {"error": f"Falha ao carregar a imagem '{image_path}'"})
+        else:
+            self._responder(200, resultado)
+
+    def _cache_para(self, opcoes):
+        """Cache com a mesma chave do modo local para este modelo + opções do job (None sem cache)."""
+        if not self.cache_dir:
+            return None
+        from inference_test import config_cache
+        from prediction_cache import CachePredicoes
+
+        config = config_cache(backend=self.modelo["backend"], otimizar=self.modelo["otimizar"],
+                              output_stride=self.modelo["output_stride"], precisao=self.modelo["precisao"],
+                              reduzir_jpeg=opcoes.get('reduzir_jpeg', True), tiling=opcoes.get('tiling'),
+                              codificacao=opcoes.get('codificacao'))
+        chave = json.dumps(config, sort_keys=True)
+        if chave not in self.caches:
+            try:
+                self.caches[chave] = CachePredicoes(self.model_path, config, pasta=self.cache_dir,
+                                                    limite_mb=self.cache_mb)
+            except OSError as e:
+                print(f"[worker] Aviso: cache de predições indisponível: {e}", file=sys.stderr)
+                return None
+        return self.caches[chave]
+
+    def log_message(self, format, *args):
+        # Logs no stderr (stdout fica livre, como nos outros scripts)
+        print(f"[worker] {self.address_string()} - {format % args}", file=sys.stderr)
+
+
+def servir(model_path, host=HOST_PADRAO, port=PORTA_PADRAO, backend='torch', otimizar=False, precisao='fp32',
+           output_stride=None, cache_dir=None, cache_mb=None):
+    """Carrega e aquece o modelo uma única vez e atende jobs até ser interrompido."""
+    import torch
+    from inference_test import aquecer_modelo, carregar_modelo
+    from prediction_cache import LIMITE_MB_PADRAO
+
+    usar_gpu = torch.cuda.is_available() and backend == 'torch' and precisao != 'bf16'
+    device = torch.device("cuda" if usar_gpu else "cpu")
+    print(f"Usando dispositivo: {device} (backend: {backend})", file=sys.stderr)
+    configuracao = config_modelo(model_path, backend, otimizar, output_stride, precisao)  # antes de ler o arquivo
+    model = carregar_modelo(model_path, device, backend=backend, otimizar=otimizar, output_stride=output_stride,
+                            precisao=precisao)
+    print("Modelo carregado de objeto completo", file=sys.stderr)
+    aquecer_modelo(model, device)
+    print("Modelo aquecido", file=sys.stderr)
+
+    InferenceHandler.model = model
+    InferenceHandler.device = device
+    InferenceHandler.model_path = model_path
+    InferenceHandler.modelo = configuracao
+    # Mesmas chaves do modo local: as entradas do cache valem para os dois
+    InferenceHandler.cache_dir = os.path.abspath(cache_dir) if cache_dir else None
+    InferenceHandler.cache_mb = cache_mb or LIMITE_MB_PADRAO
+
+    server = ThreadingHTTPServer((host, port), InferenceHandler)
+    print(f"Worker de inferência ouvindo em http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# --- 3. PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Worker residente de inferência (modelo carregado uma vez)')
+    parser.add_argument('--model_path', required=True, help='Caminho para o modelo .pt')
+    parser.add_argument('--host', default=HOST_PADRAO, help='Interface local de escuta')
+    parser.add_argument('--port', type=int, default=PORTA_PADRAO, help='Porta HTTP')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch', help='Motor de execução')
+    parser.add_argument('--optimize', action='store_true', help='Aplica network.optimize_for_inference ao carregar')
+    parser.add_argument('--precision', choices=['fp32', 'bf16'], default='fp32',
+                        help='bf16: CPU em channels_last sob autocast bfloat16')
+    parser.add_argument('--output_stride', type=int, choices=[8, 16, 32], help='Troca o output stride do modelo')
+    parser.add_argument('--no_cache', action='store_true', help='Não usa o cache de predições')
+    parser.add_argument('--cache_dir', default=None, help='Pasta do cache de predições (padrão: a do inference_test)')
+    parser.add_argument('--cache_mb', type=float, default=None, help='Espaço máximo do cache em disco (MB)')
+    args = parser.parse_args()
+
+    from prediction_cache import PASTA_CACHE
+    servir(args.model_path, host=args.host, port=args.port, backend=args.backend, otimizar=args.optimize,
+           precisao=args.precision, output_stride=args.output_stride,
+           cache_dir=None if args.no_cache else (args.cache_dir or PASTA_CACHE), cache_mb=args.cache_mb)
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# --- MÁSCARAS DE PREDIÇÃO COMPACTAS (RECÁLCULO DO PROGRESSO SEM O MODELO) ---
+# Cada foto inferida tem seu mapa de predição guardado em mascaras/<área>/<id da foto>.npz,
+# codificado em run-length (valores + comprimentos das sequências de pixels
+# iguais, na ordem das linhas) e comprimido: um mapa 512x512 ocupa poucos KB.
+#
+# Quando o plano_base_<área>.json é regenerado (nova revisão do IFC, mudança no
+# MAPEAMENTO_CLASSES) o progresso pode ser recalculado a partir dessas máscaras:
+# a contagem por classe sai direto do RLE (bincount ponderado pelos comprimentos,
+# sem reconstruir o mapa) e passa pela mesma lógica de progresso da inferência.
+#
+# Uso:
+#   python mask_store.py --area plataforma        (recalcula o progresso da área)
+#   python mask_store.py --todas                  (todas as áreas com máscaras)
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+PASTA_MASCARAS = os.path.join(base_dir, "mascaras")
+
+
+# --- 1. CODIFICAÇÃO RUN-LENGTH ---
+def codificar_rle(mapa):
+    """Mapa uint8 (H x W) -> (valores uint8, comprimentos uint32) das sequências na ordem das linhas."""
+    plano = np.ascontiguousarray(mapa, dtype=np.uint8).ravel()
+    if plano.size == 0:
+        return np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint32)
+    inicios = np.concatenate(([0], np.flatnonzero(plano[1:] != plano[:-1]) + 1))
+    comprimentos = np.diff(np.append(inicios, plano.size)).astype(np.uint32)
+    return plano[inicios], comprimentos
+
+
+def decodificar_rle(valores, comprimentos, forma):
+    """Inverso de codificar_rle."""
+    return np.repeat(valores, comprimentos).reshape(forma)
+
+
+def histograma_rle(valores, comprimentos, minlength=0):
+    """Pixels por classe direto do RLE (mesmo resultado do bincount do mapa reconstruído)."""
+    return np.bincount(valores, weights=comprimentos, minlength=minlength).astype(np.int64)
+
+
+# --- 2. ARMAZENAMENTO ---
+def caminho_mascara(area, imagem_id, pasta=PASTA_MASCARAS):
+    return os.path.join(pasta, area, f"{imagem_id}.npz")
+
+
+def salvar_mascara(area, imagem_id, mapa, pasta=PASTA_MASCARAS):
+    """Grava a máscara da foto (escrita atômica; a mesma foto reprocessada sobrescreve)."""
+    valores, comprimentos = codificar_rle(mapa)
+    caminho = caminho_mascara(area, imagem_id, pasta)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'wb') as f:
+        np.savez_compressed(f, forma=np.array(mapa.shape, dtype=np.int64), valores=valores, comprimentos=comprimentos)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def carregar_mascara(caminho):
+    """(forma, valores, comprimentos) de uma máscara salva."""
+    with np.load(caminho) as dados:
+        return tuple(dados['forma']), dados['valores'], dados['comprimentos']
+
+
+def listar_mascaras(area, pasta=PASTA_MASCARAS):
+    """[(id da foto, caminho)] das máscaras da área, em ordem de id."""
+    pasta_area = os.path.join(pasta, area)
+    if not os.path.isdir(pasta_area):
+        return []
+    return [(nome[:-len('.npz')], os.path.join(pasta_area, nome))
+            for nome in sorted(os.listdir(pasta_area)) if nome.endswith('.npz')]
+
+
+def listar_areas(pasta=PASTA_MASCARAS):
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(nome for nome in os.listdir(pasta) if os.path.isdir(os.path.join(pasta, nome)))
+
+
+# --- 3. RECÁLCULO DO PROGRESSO ---
+def reavaliar_area(area, pasta=PASTA_MASCARAS):
+    """
+    Recalcula o progresso da área a partir das máscaras salvas, com o plano e o
+    mapeamento de classes atuais: máximo por classe entre as fotos, limitado ao
+    plano, substituindo o progresso anterior (o histórico de observações fica).
+    """
+    from inference_test import MAPEAMENTO_ID_NOME, atualizar_progresso, contagem_do_histograma, juntar_contagens_max
+
+    inicio = time.perf_counter()
+    contagens, ilegiveis = [], []
+    num_classes = max(MAPEAMENTO_ID_NOME) + 1
+    for imagem_id, caminho in listar_mascaras(area, pasta):
+        try:
+            _, valores, comprimentos = carregar_mascara(caminho)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Aviso: máscara '{caminho}' ilegível: {e}", file=sys.stderr)
+            ilegiveis.append(imagem_id)
+            continue
+        contagens.append(contagem_do_histograma(histograma_rle(valores, comprimentos, minlength=num_classes)))
+    if not contagens:
+        raise ValueError(f"Nenhuma máscara salva para a área '{area}' em {pasta}")
+
+    resultado = atualizar_progresso(area, juntar_contagens_max(contagens), observacoes=[], substituir=True)
+    resultado.pop('porcentagem_imagem', None)  # não há "imagem atual" no recálculo
+    resultado['fotos_reavaliadas'] = len(contagens)
+    resultado['mascaras_ilegiveis'] = ilegiveis
+    resultado['duracao_s'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+# --- 4. PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recalcula o progresso a partir das máscaras salvas (sem o modelo)')
+    parser.add_argument('--area', nargs='+', help='Área(s) a recalcular (ex: "plataforma")')
+    parser.add_argument('--todas', action='store_true', help='Recalcula todas as áreas com máscaras salvas')
+    parser.add_argument('--pasta', default=PASTA_MASCARAS, help='Pasta das máscaras')
+    args = parser.parse_args()
+
+    areas = listar_areas(args.pasta) if args.todas else (args.area or [])
+    if not areas:
+        parser.error('Informe --area ou --todas')
+
+    resultados, falhou = {}, False
+    for area in areas:
+        try:
+            resultados[area] = reavaliar_area(area, args.pasta)
+            print(f"{area}: {resultados[area]['fotos_reavaliadas']} foto(s) em {resultados[area]['duracao_s']} s",
+                  file=sys.stderr)
+        except Exception as e:
+            resultados[area] = {"error": str(e)}
+            falhou = True
+    print(json.dumps(resultados, indent=2))
+    sys.exit(1 if falhou else 0)
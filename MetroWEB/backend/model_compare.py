@@ -0,0 +1,97 @@
+import io
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from inference_test import MAPEAMENTO_ID_NOME, listar_imagens, prepare_image
+
+# --- COMPARAÇÃO ENTRE VARIANTES DO MODELO ---
+# Funções usadas pelas ferramentas que produzem uma variante mais rápida do
+# modelo (quantização, output stride, bf16, distilação...) para responder:
+# quanto ficou mais rápido e quanto mudou a contagem de pixels por classe?
+
+
+def carregar_tensores(pasta_ou_arquivos, device, target_size=512, limite=None):
+    """Lê as fotos (pasta e/ou arquivos) e devolve os tensores de entrada 1x3xHxW."""
+    caminhos = listar_imagens(pasta_ou_arquivos if isinstance(pasta_ou_arquivos, (list, tuple))
+                              else [pasta_ou_arquivos])
+    if limite:
+        caminhos = caminhos[:limite]
+    tensores = []
+    for caminho in caminhos:
+        try:
+            imagem = Image.open(caminho).convert('RGB')
+        except Exception as e:
+            print(f"Ignorando '{caminho}': {e}", file=sys.stderr)
+            continue
+        tensores.append(prepare_image(imagem, device, target_size=target_size)[0])
+    if not tensores:
+        raise ValueError(f"Nenhuma imagem válida em {pasta_ou_arquivos}")
+    return tensores
+
+
+def medir_latencia(model, entrada, repeticoes=10, aquecimento=2):
+    """Latência do forward (ms): mediana, p95 e média após alguns forwards de aquecimento."""
+    tempos = []
+    with torch.no_grad():
+        for i in range(aquecimento + repeticoes):
+            inicio = time.perf_counter()
+            model(entrada)
+            if i >= aquecimento:
+                tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos = np.array(tempos)
+    return {
+        "p50_ms": round(float(np.percentile(tempos, 50)), 2),
+        "p95_ms": round(float(np.percentile(tempos, 95)), 2),
+        "media_ms": round(float(tempos.mean()), 2),
+    }
+
+
+def tamanho_modelo_mb(model):
+    """Tamanho serializado (torch.save) do modelo em MB."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict() if hasattr(model, 'state_dict') else model, buffer)
+    return round(buffer.tell() / (1024 * 1024), 2)
+
+
+def prever_mapas(model, tensores):
+    """Mapas de predição uint8 (H x W) de cada tensor de entrada."""
+    mapas = []
+    with torch.no_grad():
+        for tensor in tensores:
+            mapas.append(torch.argmax(model(tensor).float(), dim=1)[0].cpu().numpy().astype(np.uint8))
+    return mapas
+
+
+def comparar_predicoes(mapas_referencia, mapas_variante, num_classes=None):
+    """
+    Compara os mapas de predição da variante com os da referência:
+    fração de pixels com a mesma classe e deriva da contagem de pixels por classe
+    (somada em todas as imagens) nas classes usadas pelo progresso.
+    """
+    if num_classes is None:
+        num_classes = max(MAPEAMENTO_ID_NOME) + 1
+    iguais = total = 0
+    contagem_ref = np.zeros(num_classes, dtype=np.int64)
+    contagem_var = np.zeros(num_classes, dtype=np.int64)
+    for ref, var in zip(mapas_referencia, mapas_variante):
+        iguais += int(np.count_nonzero(ref == var))
+        total += ref.size
+        contagem_ref += np.bincount(ref.ravel(), minlength=num_classes)[:num_classes]
+        contagem_var += np.bincount(var.ravel(), minlength=num_classes)[:num_classes]
+
+    deriva = {}
+    for class_id, class_name in MAPEAMENTO_ID_NOME.items():
+        ref, var = int(contagem_ref[class_id]), int(contagem_var[class_id])
+        deriva[class_name] = {
+            "referencia": ref,
+            "variante": var,
+            "deriva_percentual": round((var - ref) / ref * 100, 3) if ref else None,
+        }
+    return {
+        "concordancia_pixels_percentual": round(iguais / total * 100, 3) if total else None,
+        "deriva_por_classe": deriva,
+    }
@@ -1,2 +1,7 @@
 from .modeling import *
-from ._deeplab import convert_to_separable_conv
\ No newline at end of file
+from ._deeplab import convert_to_separable_conv
+from .optimize import optimize_for_inference
+from .profiling import ModuleProfiler, profile_forward
+from .stride import set_output_stride, get_output_stride
+from .precision import Bfloat16CPU, to_bfloat16_cpu
+from .weights import describe_architecture, save_weights, load_weights
\ No newline at end of file
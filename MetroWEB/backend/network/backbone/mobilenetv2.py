@@ -72,7 +72,8 @@ class InvertedResidual(nn.Module):
         self.input_padding = fixed_padding( 3, dilation )
 
     def forward(self, x):
-        x_pad = F.pad(x, self.input_padding)
+        # input_padding is zeroed when optimize_for_inference merges it into the conv
+        x_pad = F.pad(x, self.input_padding) if any(self.input_padding) else x
         if self.use_res_connect:
             return x + self.conv(x_pad)
         else:
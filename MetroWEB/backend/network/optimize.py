@@ -0,0 +1,148 @@
+import copy
+
+import torch
+from torch import nn
+from torch.nn import functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from .utils import IntermediateLayerGetter
+from .backbone.resnet import BasicBlock, Bottleneck
+from .backbone.mobilenetv2 import InvertedResidual
+
+__all__ = ['optimize_for_inference', 'FusedConvReLU2d']
+
+
+class FusedConvReLU2d(nn.Conv2d):
+    """Conv2d with the following ReLU / ReLU6 applied in place inside the same module.
+    """
+    def __init__(self, *args, relu6=False, **kwargs):
+        super(FusedConvReLU2d, self).__init__(*args, **kwargs)
+        self.relu6 = relu6
+
+    @classmethod
+    def from_conv(cls, conv, relu6=False):
+        fused = cls(conv.in_channels, conv.out_channels, conv.kernel_size, stride=conv.stride,
+                    padding=conv.padding, dilation=conv.dilation, groups=conv.groups,
+                    bias=conv.bias is not None, padding_mode=conv.padding_mode, relu6=relu6)
+        fused.weight = conv.weight
+        fused.bias = conv.bias
+        return fused
+
+    def forward(self, x):
+        x = self._conv_forward(x, self.weight, self.bias)
+        return F.hardtanh_(x, 0., 6.) if self.relu6 else F.relu_(x)
+
+
+def _is_sequential_container(module):
+    # Containers whose forward runs the children in registration order
+    return isinstance(module, (nn.Sequential, IntermediateLayerGetter))
+
+
+def _fold_container(container):
+    """Folds Conv->BN pairs and fuses Conv->ReLU(6) pairs among consecutive children.
+    Removed layers become nn.Identity so module names (and return_layers) are kept.
+    """
+    names = list(container._modules.keys())
+    for i, name in enumerate(names[:-1]):
+        conv, nxt = container._modules[name], container._modules[names[i + 1]]
+        if type(conv) is nn.Conv2d and isinstance(nxt, nn.BatchNorm2d):
+            container._modules[name] = fuse_conv_bn_eval(conv, nxt)
+            container._modules[names[i + 1]] = nn.Identity()
+
+    for i, name in enumerate(names[:-1]):
+        conv = container._modules[name]
+        if type(conv) is not nn.Conv2d:
+            continue
+        # Skip the Identity left behind by a folded BN
+        j = i + 1
+        while j < len(names) and isinstance(container._modules[names[j]], nn.Identity):
+            j += 1
+        if j < len(names) and type(container._modules[names[j]]) in (nn.ReLU, nn.ReLU6):
+            relu6 = isinstance(container._modules[names[j]], nn.ReLU6)
+            container._modules[name] = FusedConvReLU2d.from_conv(conv, relu6=relu6)
+            container._modules[names[j]] = nn.Identity()
+
+
+def _fold_block(block, pairs):
+    """Folds named conv/bn attribute pairs of a residual block.
+    The block's ReLU is shared (also used after the residual add) and is kept.
+    """
+    for conv_name, bn_name in pairs:
+        conv, bn = getattr(block, conv_name), getattr(block, bn_name)
+        if type(conv) is nn.Conv2d and isinstance(bn, nn.BatchNorm2d):
+            setattr(block, conv_name, fuse_conv_bn_eval(conv, bn))
+            setattr(block, bn_name, nn.Identity())
+
+
+def _first_conv(module):
+    while _is_sequential_container(module) and len(module) > 0:
+        module = module[0]
+    return module if isinstance(module, nn.Conv2d) else None
+
+
+def _merge_input_padding(block):
+    """Moves the explicit F.pad of an InvertedResidual into its first convolution.
+    Exact for zero padding: the padded border sees conv(0) = bias either way.
+    """
+    pad_left, pad_right, pad_top, pad_bottom = block.input_padding
+    conv = _first_conv(block.conv)
+    if (conv is None or conv.padding_mode != 'zeros' or tuple(conv.padding) != (0, 0)
+            or pad_left != pad_right or pad_top != pad_bottom):
+        return False
+    conv.padding = (pad_top, pad_left)
+    block.input_padding = (0, 0, 0, 0)
+    return True
+
+
+def _optimize(module):
+    for child in module.children():
+        _optimize(child)
+
+    if _is_sequential_container(module):
+        _fold_container(module)
+    elif isinstance(module, Bottleneck):
+        _fold_block(module, [('conv1', 'bn1'), ('conv2', 'bn2'), ('conv3', 'bn3')])
+    elif isinstance(module, BasicBlock):
+        _fold_block(module, [('conv1', 'bn1'), ('conv2', 'bn2')])
+
+    if isinstance(module, InvertedResidual):
+        _merge_input_padding(module)
+
+
+def optimize_for_inference(model, example_input=None, check=True, rtol=1e-4, inplace=False):
+    """Inference-only graph cleanup for models built by network.modeling.
+
+    Folds every BatchNorm2d into the preceding convolution, merges the explicit
+    F.pad of MobileNetV2 blocks into the convolution padding and fuses
+    Conv+ReLU/ReLU6 pairs inside sequential containers.
+
+    Args:
+        model (nn.Module): model to optimize (it is put in eval mode).
+        example_input (Tensor, optional): input used for the equivalence check.
+            Defaults to a random 1x3x128x128 image in the 0-255 range.
+        check (bool): compare the outputs before/after and raise if they differ.
+        rtol (float): allowed max |diff| relative to the largest |output|.
+        inplace (bool): modify ``model`` instead of a deep copy.
+    """
+    model.eval()
+    optimized = model if inplace else copy.deepcopy(model)
+
+    if check:
+        if example_input is None:
+            device = next(model.parameters()).device
+            example_input = torch.rand(1, 3, 128, 128, device=device) * 255
+        with torch.no_grad():
+            expected = model(example_input).clone()
+
+    with torch.no_grad():
+        _optimize(optimized)
+
+    if check:
+        with torch.no_grad():
+            output = optimized(example_input)
+        scale = max(expected.abs().max().item(), 1.0)
+        diff = (expected - output).abs().max().item() / scale
+        if diff > rtol:
+            raise RuntimeError("optimize_for_inference changed the model output "
+                               "(max relative diff {:.2e} > {:.0e})".format(diff, rtol))
+    return optimized
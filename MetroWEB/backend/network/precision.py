@@ -0,0 +1,35 @@
+import torch
+from torch import nn
+
+__all__ = ['Bfloat16CPU', 'to_bfloat16_cpu']
+
+
+class Bfloat16CPU(nn.Module):
+    """Runs a segmentation model on CPU in channels_last layout under bfloat16 autocast.
+
+    Convolutions, matmuls and interpolation run in bfloat16 (AMX / AVX512-BF16
+    kernels on recent Xeons); the logits are returned as float32 so ``argmax``
+    and everything after it stays exactly as in the fp32 path. Works for every
+    backbone of network.modeling (ResNet, MobileNetV2), also after
+    optimize_for_inference or set_output_stride. The wrapped model keeps its
+    fp32 weights; autocast casts them per op.
+
+    Args:
+        model (nn.Module): fp32 model on CPU.
+    """
+    def __init__(self, model):
+        super(Bfloat16CPU, self).__init__()
+        self.model = model.to(memory_format=torch.channels_last)
+
+    def forward(self, x):
+        x = x.contiguous(memory_format=torch.channels_last)
+        with torch.autocast('cpu', dtype=torch.bfloat16):
+            output = self.model(x)
+        return output.float()
+
+
+def to_bfloat16_cpu(model):
+    """Wraps ``model`` (in eval mode, on CPU) in :class:`Bfloat16CPU`."""
+    if any(p.device.type != 'cpu' for p in model.parameters()):
+        raise ValueError("bfloat16 CPU execution needs the model on CPU")
+    return Bfloat16CPU(model.eval()).eval()
@@ -0,0 +1,223 @@
+import time
+from collections import OrderedDict
+
+import torch
+from torch import nn
+from torch.nn import functional as F
+
+from ._deeplab import ASPP
+
+__all__ = ['ModuleProfiler', 'profile_forward']
+
+
+def _default_targets(model):
+    """Top two levels of the model (backbone stages, head parts) plus every ASPP branch and projection."""
+    names = []
+    for name, module in model.named_modules():
+        if name.count('.') < 2:
+            names.append(name)
+        if isinstance(module, ASPP):
+            names.append(name)
+            names.extend('{}.convs.{}'.format(name, i) for i in range(len(module.convs)))
+            names.append('{}.project'.format(name))
+    return list(OrderedDict.fromkeys(names))
+
+
+def _tensors(output):
+    if torch.is_tensor(output):
+        return [output]
+    if isinstance(output, dict):
+        output = list(output.values())
+    if isinstance(output, (list, tuple)):
+        return [t for t in output if torch.is_tensor(t)]
+    return []
+
+
+def _conv_flops(module, output):
+    # 2 * MACs: every output element of a conv is a dot product over (C_in / groups) * kH * kW
+    kernel = module.in_channels // module.groups
+    for k in module.kernel_size:
+        kernel *= k
+    return 2 * output.numel() * kernel
+
+
+class ModuleProfiler(object):
+    """Per-module forward profiler for models built by network.modeling.
+
+    Records, for each selected module, the inclusive latency, FLOPs (Conv2d and
+    Linear layers inside it, plus bilinear interpolation), output shape and
+    output activation memory. While attached, ``F.interpolate`` is wrapped so
+    the upsampling calls of ``DeepLabHeadV3Plus``, ``ASPPPooling`` and
+    ``_SimpleSegmentationModel.forward`` appear as ``<module>.interpolate``,
+    ``<module>`` being the innermost profiled module running the call.
+
+    ``remove()`` detaches every hook and restores ``F.interpolate``, leaving
+    the model exactly as it was (no residual overhead). Also usable as a
+    context manager::
+
+        with ModuleProfiler(model) as prof:
+            model(x)
+        print(prof.table())
+
+    Args:
+        model (nn.Module): model to profile.
+        modules (list[str], optional): qualified module names to time
+            ('' is the whole model). Defaults to the top two levels of the
+            model plus every ASPP branch and projection.
+        sync_cuda (bool): synchronize CUDA around each timed module so the
+            latency is not charged to the next one.
+    """
+    def __init__(self, model, modules=None, sync_cuda=True):
+        self.model = model
+        self.sync_cuda = sync_cuda and torch.cuda.is_available()
+        self.records = OrderedDict()
+        self._stack = []
+        self._handles = []
+        self._interpolate = None
+
+        # FLOPs hooks first: on a timed Conv2d they must run before its own record is closed
+        for module in model.modules():
+            if isinstance(module, (nn.Conv2d, nn.Linear)):
+                self._handles.append(module.register_forward_hook(self._flops_hook))
+        targets = _default_targets(model) if modules is None else list(modules)
+        named = dict(model.named_modules())
+        for name in targets:
+            if name not in named:
+                raise KeyError("Module '{}' not found in the model".format(name))
+            module = named[name]
+            label = name or 'model'
+            self._handles.append(module.register_forward_pre_hook(self._pre_hook(label)))
+            self._handles.append(module.register_forward_hook(self._post_hook(label)))
+        self._patch_interpolate()
+
+    # --- hooks ---
+    def _now(self):
+        if self.sync_cuda:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def _record(self, label):
+        if label not in self.records:
+            self.records[label] = {'calls': 0, 'time_ms': 0.0, 'flops': 0,
+                                   'output_shape': None, 'activation_mb': 0.0}
+        return self.records[label]
+
+    def _pre_hook(self, label):
+        def hook(module, inputs):
+            if label == 'model':
+                self._stack = []  # drop leftovers of a forward that raised
+            self._stack.append([label, 0, self._now()])
+        return hook
+
+    def _post_hook(self, label):
+        def hook(module, inputs, output):
+            end = self._now()
+            while self._stack and self._stack[-1][0] != label:
+                self._stack.pop()
+            if not self._stack:
+                return
+            _, flops, start = self._stack.pop()
+            self._finish(label, start, end, flops, output)
+        return hook
+
+    def _finish(self, label, start, end, flops, output):
+        record = self._record(label)
+        record['calls'] += 1
+        record['time_ms'] += (end - start) * 1000
+        record['flops'] = flops
+        tensors = _tensors(output)
+        record['output_shape'] = [list(t.shape) for t in tensors] if len(tensors) > 1 else \
+            (list(tensors[0].shape) if tensors else None)
+        record['activation_mb'] = sum(t.numel() * t.element_size() for t in tensors) / (1024 * 1024)
+
+    def _add_flops(self, flops):
+        for entry in self._stack:
+            entry[1] += flops
+
+    def _flops_hook(self, module, inputs, output):
+        if isinstance(module, nn.Conv2d):
+            self._add_flops(_conv_flops(module, output))
+        else:
+            self._add_flops(2 * output.numel() * module.in_features)
+
+    def _patch_interpolate(self):
+        original = F.interpolate
+        profiler = self
+
+        def interpolate(input, *args, **kwargs):
+            label = '{}.interpolate'.format(profiler._stack[-1][0] if profiler._stack else 'model')
+            start = profiler._now()
+            output = original(input, *args, **kwargs)
+            end = profiler._now()
+            # Bilinear: 4 multiply-adds per output element
+            flops = 8 * output.numel()
+            profiler._add_flops(flops)
+            profiler._finish(label, start, end, flops, output)
+            return output
+
+        self._interpolate = original
+        F.interpolate = interpolate
+
+    def remove(self):
+        """Detaches all hooks and restores F.interpolate."""
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        if self._interpolate is not None:
+            F.interpolate = self._interpolate
+            self._interpolate = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.remove()
+        return False
+
+    # --- report ---
+    def reset(self):
+        self.records = OrderedDict()
+
+    def summary(self, sort_by='time_ms'):
+        """Records as a list of dicts (average time per call), ranked by ``sort_by``."""
+        total = self.records.get('model', {}).get('time_ms') or \
+            sum(r['time_ms'] for r in self.records.values()) or 1.0
+        rows = []
+        for label, record in self.records.items():
+            calls = max(record['calls'], 1)
+            rows.append({
+                'module': label,
+                'calls': record['calls'],
+                'time_ms': record['time_ms'] / calls,
+                'time_pct': 100.0 * record['time_ms'] / total,
+                'gflops': record['flops'] / 1e9,
+                'output_shape': record['output_shape'],
+                'activation_mb': record['activation_mb'],
+            })
+        return sorted(rows, key=lambda row: row[sort_by], reverse=True)
+
+    def table(self, sort_by='time_ms', top=None):
+        """Ranked text table (inclusive times: parents include their children)."""
+        rows = self.summary(sort_by)[:top]
+        width = max([len('module')] + [len(row['module']) for row in rows])
+        lines = ['{:<{w}}  {:>10}  {:>7}  {:>9}  {:>9}  {}'.format(
+            'module', 'time_ms', '%', 'GFLOPs', 'act_MB', 'output_shape', w=width)]
+        for row in rows:
+            lines.append('{:<{w}}  {:>10.2f}  {:>6.1f}%  {:>9.2f}  {:>9.2f}  {}'.format(
+                row['module'], row['time_ms'], row['time_pct'], row['gflops'],
+                row['activation_mb'], row['output_shape'], w=width))
+        return '\n'.join(lines)
+
+
+def profile_forward(model, example_input, modules=None, repeats=3, warmup=1):
+    """Profiles ``repeats`` forwards of ``model`` on ``example_input`` (after ``warmup``
+    unprofiled ones) and returns the detached ModuleProfiler with the records.
+    """
+    model.eval()
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(example_input)
+        with ModuleProfiler(model, modules=modules) as profiler:
+            for _ in range(repeats):
+                model(example_input)
+    return profiler
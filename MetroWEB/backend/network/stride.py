@@ -0,0 +1,144 @@
+from torch import nn
+
+from ._deeplab import ASPP
+from .backbone.resnet import Bottleneck
+from .backbone.mobilenetv2 import InvertedResidual, fixed_padding
+
+__all__ = ['set_output_stride', 'get_output_stride']
+
+# (t, c, n, s) of network.backbone.mobilenetv2.MobileNetV2 (the default setting)
+_MOBILENET_SETTING = [
+    [1, 16, 1, 1],
+    [6, 24, 2, 2],
+    [6, 32, 3, 2],
+    [6, 64, 4, 2],
+    [6, 96, 3, 1],
+    [6, 160, 3, 2],
+    [6, 320, 1, 1],
+]
+
+
+def _set_conv(conv, stride, dilation, padding=None):
+    conv.stride = (stride, stride)
+    conv.dilation = (dilation, dilation)
+    if padding is not None:
+        conv.padding = (padding, padding)
+
+
+def _is_resnet(backbone):
+    return all(hasattr(backbone, name) for name in ('layer1', 'layer2', 'layer3', 'layer4'))
+
+
+def _mobilenet_blocks(backbone):
+    return [m for m in backbone.modules() if isinstance(m, InvertedResidual)]
+
+
+def get_output_stride(model):
+    """Output stride of the backbone of a network.modeling model (product of its strides)."""
+    backbone = model.backbone
+    if _is_resnet(backbone):
+        stride = backbone.conv1.stride[0] * backbone.maxpool.stride
+        for name in ('layer2', 'layer3', 'layer4'):
+            stride *= getattr(backbone, name)[0].conv2.stride[0]
+        return stride
+    blocks = _mobilenet_blocks(backbone)
+    if blocks:
+        stride = 2  # stem ConvBNReLU
+        for block in blocks:
+            stride *= block.stride
+        return stride
+    raise NotImplementedError("Unsupported backbone: {}".format(type(backbone).__name__))
+
+
+def _resnet_output_stride(backbone, output_stride):
+    # Same rule as ResNet._make_layer with replace_stride_with_dilation
+    replace = {8: [False, True, True], 16: [False, False, True], 32: [False, False, False]}[output_stride]
+    dilation = 1
+    for name, dilate in zip(('layer2', 'layer3', 'layer4'), replace):
+        layer = getattr(backbone, name)
+        if not all(isinstance(block, Bottleneck) for block in layer):
+            raise NotImplementedError("Only Bottleneck ResNets can change output stride")
+        previous_dilation = dilation
+        if dilate:
+            dilation *= 2
+            stride = 1
+        else:
+            stride = 2
+        first = layer[0]
+        first.stride = stride
+        _set_conv(first.conv2, stride, previous_dilation, previous_dilation)
+        if first.downsample is not None:
+            first.downsample[0].stride = (stride, stride)
+        for block in list(layer)[1:]:
+            _set_conv(block.conv2, 1, dilation, dilation)
+
+
+def _mobilenet_output_stride(backbone, output_stride):
+    # Same rule as MobileNetV2.__init__ with the default inverted_residual_setting
+    blocks = _mobilenet_blocks(backbone)
+    if len(blocks) != sum(n for _, _, n, _ in _MOBILENET_SETTING):
+        raise NotImplementedError("Only the default MobileNetV2 setting can change output stride")
+    current_stride, dilation, index = 2, 1, 0
+    for _, _, n, s in _MOBILENET_SETTING:
+        previous_dilation = dilation
+        if current_stride == output_stride:
+            stride = 1
+            dilation *= s
+        else:
+            stride = s
+            current_stride *= s
+        for i in range(n):
+            block = blocks[index]
+            index += 1
+            block_stride, block_dilation = (stride, previous_dilation) if i == 0 else (1, dilation)
+            depthwise = next(m for m in block.conv.modules() if isinstance(m, nn.Conv2d) and m.groups > 1)
+            first_conv = next(m for m in block.conv.modules() if isinstance(m, nn.Conv2d))
+            last_conv = [m for m in block.conv.modules() if isinstance(m, nn.Conv2d)][-1]
+            pad = fixed_padding(3, block_dilation)
+            _set_conv(depthwise, block_stride, block_dilation)
+            if any(block.input_padding):
+                block.input_padding = pad
+            else:
+                # optimize_for_inference moved the F.pad into the padding of the first conv
+                first_conv.padding = (pad[0], pad[0])
+            block.stride = block_stride
+            block.use_res_connect = block_stride == 1 and first_conv.in_channels == last_conv.out_channels
+    if hasattr(backbone, 'output_stride'):
+        backbone.output_stride = output_stride
+
+
+def set_output_stride(model, output_stride):
+    """Re-parameterizes a DeepLabV3/V3+ model in place to a new output stride.
+
+    Strides and dilations of the backbone are recomputed as if the model had
+    been built with ``output_stride`` (``replace_stride_with_dilation`` for
+    ResNet, ``output_stride`` for MobileNetV2) and the ASPP rates are scaled so
+    they keep covering the same image area. The weights are untouched, so no
+    retraining is needed; expect small prediction changes (see model_compare).
+    Typical use: a model trained at OS8 run at OS16 for ~3x less backbone compute.
+
+    Args:
+        model (nn.Module): model built by network.modeling (also after
+            optimize_for_inference).
+        output_stride (int): 8, 16 or 32.
+
+    Returns:
+        the same model.
+    """
+    if output_stride not in (8, 16, 32):
+        raise ValueError("output_stride should be 8, 16 or 32, got {}".format(output_stride))
+    current = get_output_stride(model)
+    if current == output_stride:
+        return model
+
+    if _is_resnet(model.backbone):
+        _resnet_output_stride(model.backbone, output_stride)
+    else:
+        _mobilenet_output_stride(model.backbone, output_stride)
+
+    for aspp in (m for m in model.modules() if isinstance(m, ASPP)):
+        for branch in list(aspp.convs)[1:4]:
+            conv = branch[0]
+            rate = max(1, conv.dilation[0] * current // output_stride)
+            _set_conv(conv, 1, rate, rate)
+    return model
@@ -0,0 +1,157 @@
+import contextlib
+
+import torch
+from torch import nn
+
+from . import modeling
+from ._deeplab import ASPP, DeepLabHead, DeepLabHeadV3Plus
+from .stride import _is_resnet, _set_conv, get_output_stride
+
+__all__ = ['describe_architecture', 'build_model', 'save_weights', 'load_weights', 'StaleWeightsError']
+
+FORMAT_VERSION = 1
+
+# number of Bottlenecks in layer3 -> ResNet variant available in network.modeling
+_RESNET_DEPTH = {6: 'resnet50', 23: 'resnet101'}
+
+
+class StaleWeightsError(ValueError):
+    """The weights file was not made from the checkpoint it is supposed to replace."""
+
+
+# in-place initializers of torch.nn.init called by the constructors of network/
+_INITIALIZERS = ('uniform_', 'normal_', 'constant_', 'ones_', 'zeros_', 'kaiming_uniform_', 'kaiming_normal_',
+                 'xavier_uniform_', 'xavier_normal_', 'trunc_normal_')
+
+
+@contextlib.contextmanager
+def _skip_init():
+    # Random init is wasted work when every tensor is replaced by the checkpoint,
+    # and on the meta device normal_/uniform_ go through the slow reference path.
+    saved = {name: getattr(nn.init, name) for name in _INITIALIZERS}
+    try:
+        for name in _INITIALIZERS:
+            setattr(nn.init, name, lambda tensor, *args, **kwargs: tensor)
+        yield
+    finally:
+        for name, fn in saved.items():
+            setattr(nn.init, name, fn)
+
+
+def _aspp_rates(model):
+    aspp = next((m for m in model.modules() if isinstance(m, ASPP)), None)
+    if aspp is None:
+        return None
+    return [branch[0].dilation[0] for branch in list(aspp.convs)[1:4]]
+
+
+def describe_architecture(model):
+    """Everything needed to rebuild ``model`` with network.modeling (no weights).
+
+    Returns a dict with ``arch`` (name of the network.modeling constructor,
+    e.g. ``'deeplabv3plus_resnet101'``), ``num_classes``, ``output_stride`` and
+    ``aspp_dilate``. Models whose head was replaced after construction (like
+    model_plus.createDeepLabv3Plus does) are described by what they contain,
+    not by how they were built.
+    """
+    head = model.classifier
+    if isinstance(head, DeepLabHeadV3Plus):
+        name = 'deeplabv3plus'
+    elif isinstance(head, DeepLabHead):
+        name = 'deeplabv3'
+    else:
+        raise NotImplementedError("Unsupported head: {}".format(type(head).__name__))
+
+    if _is_resnet(model.backbone):
+        depth = len(model.backbone.layer3)
+        if depth not in _RESNET_DEPTH:
+            raise NotImplementedError("Unsupported ResNet depth (layer3 has {} blocks)".format(depth))
+        backbone = _RESNET_DEPTH[depth]
+    else:
+        backbone = 'mobilenet'
+
+    return {
+        'arch': '{}_{}'.format(name, backbone),
+        'num_classes': head.classifier[-1].out_channels,
+        'output_stride': get_output_stride(model),
+        'aspp_dilate': _aspp_rates(model),
+    }
+
+
+def build_model(architecture, device=None):
+    """Builds an uninitialized model from :func:`describe_architecture` output.
+
+    No backbone weights are downloaded and the random initialization done by
+    the constructors is skipped (tensors hold whatever memory they got). With
+    ``device='meta'`` no memory is allocated for parameters at all; use it
+    together with ``load_state_dict(..., assign=True)``.
+    """
+    constructor = modeling.__dict__[architecture['arch']]
+    with torch.device(device or 'cpu'), _skip_init():
+        model = constructor(num_classes=architecture['num_classes'],
+                            output_stride=architecture['output_stride'],
+                            pretrained_backbone=False)
+    rates = architecture.get('aspp_dilate')
+    if rates and _aspp_rates(model) != rates:
+        aspp = next(m for m in model.modules() if isinstance(m, ASPP))
+        for branch, rate in zip(list(aspp.convs)[1:4], rates):
+            _set_conv(branch[0], 1, rate, rate)
+    return model
+
+
+def save_weights(model, path, source=None):
+    """Saves the architecture description and the ``state_dict`` of ``model``.
+
+    The file is a regular ``torch.save`` zip archive holding only tensors and
+    plain Python types, so it loads with ``weights_only=True`` (no code is
+    unpickled) and can be memory-mapped by :func:`load_weights`.
+
+    Args:
+        model (nn.Module): model built by network.modeling.
+        path (str): output file.
+        source (dict, optional): plain description of the checkpoint the
+            weights come from (e.g. its size and sha256), stored as is and
+            handed to ``check_source`` in :func:`load_weights`.
+    """
+    state_dict = {k: v.detach().cpu().contiguous() for k, v in model.state_dict().items()}
+    torch.save({'format_version': FORMAT_VERSION,
+                'architecture': describe_architecture(model),
+                'source': source,
+                'state_dict': state_dict}, path)
+    return path
+
+
+def load_weights(path, device='cpu', check_source=None):
+    """Rebuilds the model saved by :func:`save_weights`, in eval mode.
+
+    The model is built on the meta device and the tensors of the file are
+    memory-mapped and assigned to it without being copied: loading only reads
+    the pickled metadata, weights are paged in by the OS on first use, and
+    processes loading the same file share those pages. In-place changes to the
+    weights (e.g. optimize_for_inference) are private to the process and never
+    written back to the file.
+
+    Args:
+        path (str): file written by :func:`save_weights`.
+        device (str or torch.device): target device. For non-CPU devices the
+            weights are copied there from the mapping.
+        check_source (callable, optional): called with the ``source`` stored
+            by :func:`save_weights` (None if absent); a false result raises
+            :class:`StaleWeightsError` before the model is built.
+
+    Returns:
+        (model, architecture dict)
+    """
+    checkpoint = torch.load(path, map_location='cpu', weights_only=True, mmap=True)
+    if checkpoint.get('format_version') != FORMAT_VERSION:
+        raise ValueError("Unsupported weights file version: {}".format(checkpoint.get('format_version')))
+    if check_source is not None and not check_source(checkpoint.get('source')):
+        raise StaleWeightsError("{} does not match its source checkpoint".format(path))
+    architecture = checkpoint['architecture']
+    model = build_model(architecture, device='meta')
+    model.load_state_dict(checkpoint['state_dict'], assign=True)
+    missing = [name for name, t in list(model.named_parameters()) + list(model.named_buffers())
+               if t.is_meta]
+    if missing:
+        raise RuntimeError("Tensors not found in {}: {}".format(path, ', '.join(missing)))
+    return model.to(device).eval(), architecture
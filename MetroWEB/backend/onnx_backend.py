@@ -0,0 +1,161 @@
+import argparse
+import contextlib
+import os
+import sys
+
+import torch
+
+# --- BACKEND ONNX RUNTIME ---
+# Exporta um DeepLabV3 (de network.modeling ou do .Pt serializado) para ONNX
+# com eixos dinâmicos de lote e de resolução, e roda o grafo no ONNX Runtime
+# (CPU) com a mesma interface de chamada do modelo PyTorch.
+#
+# Uso:
+#   python onnx_backend.py --model_path Var_2plus_weights_28.Pt --verificar
+#   python onnx_backend.py --arch deeplabv3plus_mobilenet --num_classes 4 --output model.onnx
+#   python inference_test.py --backend onnx --model_path Var_2plus_weights_28.Pt ...
+
+OPSET_PADRAO = 17
+NOME_ENTRADA = 'input'
+NOME_SAIDA = 'logits'
+TOLERANCIA_PADRAO = 1e-4  # diferença máxima aceita, relativa ao maior |logit| do PyTorch
+
+ARQUITETURAS = ('deeplabv3plus_resnet50', 'deeplabv3plus_resnet101', 'deeplabv3plus_mobilenet',
+                'deeplabv3_resnet50', 'deeplabv3_resnet101', 'deeplabv3_mobilenet')
+
+
+# --- 1. EXPORTAÇÃO ---
+def exportar_onnx(model, caminho_onnx, tamanho_exemplo=512, opset=OPSET_PADRAO):
+    """Exporta o modelo (em eval, CPU) para ONNX com lote, altura e largura dinâmicos."""
+    model = model.cpu().eval()
+    exemplo = torch.zeros(1, 3, tamanho_exemplo, tamanho_exemplo)
+    eixos = {0: 'lote', 2: 'altura', 3: 'largura'}
+    # O exportador imprime progresso ("[torch.onnx] ...") no stdout, que nos scripts
+    # chamados pelo server.js deve conter só o JSON de resultado
+    with torch.no_grad(), contextlib.redirect_stdout(sys.stderr):
+        torch.onnx.export(
+            model, exemplo, caminho_onnx,
+            input_names=[NOME_ENTRADA],
+            output_names=[NOME_SAIDA],
+            dynamic_axes={NOME_ENTRADA: eixos, NOME_SAIDA: eixos},
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    return caminho_onnx
+
+
+def caminho_onnx_para(model_path):
+    """Caminho do .onnx correspondente a um checkpoint (.Pt -> .onnx ao lado)."""
+    return os.path.splitext(model_path)[0] + '.onnx'
+
+
+# --- 2. EXECUÇÃO ---
+class ModeloOnnx:
+    """Sessão ONNX Runtime com a interface usada pelo inference_test (model(tensor) -> tensor)."""
+
+    def __init__(self, caminho_onnx, threads=None):
+        import onnxruntime as ort
+
+        opcoes = ort.SessionOptions()
+        opcoes.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opcoes.intra_op_num_threads = threads
+        self.caminho = caminho_onnx
+        self.sessao = ort.InferenceSession(caminho_onnx, sess_options=opcoes,
+                                           providers=['CPUExecutionProvider'])
+
+    def __call__(self, input_tensor):
+        entrada = input_tensor.detach().cpu().float().numpy()
+        saida = self.sessao.run([NOME_SAIDA], {NOME_ENTRADA: entrada})[0]
+        return torch.from_numpy(saida)
+
+    # Compatibilidade com o fluxo do PyTorch (model.to(device).eval())
+    def to(self, *args, **kwargs):
+        return self
+
+    def eval(self):
+        return self
+
+
+def carregar_modelo_onnx(model_path, threads=None):
+    """
+    Abre o .onnx indicado ou, para um checkpoint PyTorch, o .onnx ao lado dele
+    (exportado na hora se não existir ou estiver mais velho que o checkpoint).
+    """
+    if model_path.endswith('.onnx'):
+        return ModeloOnnx(model_path, threads=threads)
+
+    caminho_onnx = caminho_onnx_para(model_path)
+    if not os.path.exists(caminho_onnx) or os.path.getmtime(caminho_onnx) < os.path.getmtime(model_path):
+        from inference_test import carregar_modelo
+        print(f"Exportando '{model_path}' para ONNX em '{caminho_onnx}'...", file=sys.stderr)
+        exportar_onnx(carregar_modelo(model_path, torch.device('cpu')), caminho_onnx)
+    return ModeloOnnx(caminho_onnx, threads=threads)
+
+
+# --- 3. VERIFICAÇÃO NUMÉRICA ---
+def verificar_equivalencia(model, modelo_onnx, formas=((1, 512, 512), (2, 384, 640)),
+                           tolerancia=TOLERANCIA_PADRAO, seed=0):
+    """
+    Compara logits e argmax do PyTorch e do ONNX Runtime em entradas aleatórias
+    (0-255, como as fotos) de várias formas. Devolve a maior diferença relativa
+    (|diff| / maior |logit|), já que a escala dos logits varia muito entre backbones.
+    """
+    gerador = torch.Generator().manual_seed(seed)
+    model = model.cpu().eval()
+    maior_diferenca = 0.0
+    for lote, altura, largura in formas:
+        entrada = torch.rand(lote, 3, altura, largura, generator=gerador) * 255
+        with torch.no_grad():
+            esperado = model(entrada)
+        obtido = modelo_onnx(entrada)
+        escala = max(esperado.abs().max().item(), 1.0)
+        diferenca = (esperado - obtido).abs().max().item() / escala
+        concordancia = (esperado.argmax(1) == obtido.argmax(1)).float().mean().item()
+        print(f"  forma {lote}x3x{altura}x{largura}: max |diff| relativo = {diferenca:.2e}, "
+              f"argmax igual em {concordancia * 100:.3f}% dos pixels", file=sys.stderr)
+        maior_diferenca = max(maior_diferenca, diferenca)
+    if maior_diferenca > tolerancia:
+        raise RuntimeError(f"ONNX diverge do PyTorch: max |diff| relativo {maior_diferenca:.2e} > {tolerancia:.0e}")
+    return maior_diferenca
+
+
+# --- 4. PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Exporta o DeepLabV3 para ONNX e verifica contra o PyTorch')
+    parser.add_argument('--model_path', help='Checkpoint PyTorch (.Pt com o objeto completo)')
+    parser.add_argument('--arch', choices=ARQUITETURAS,
+                        help='Constrói a arquitetura via network.modeling (pesos aleatórios) em vez de --model_path')
+    parser.add_argument('--num_classes', type=int, default=4, help='Número de classes (com --arch)')
+    parser.add_argument('--output_stride', type=int, default=8, choices=[8, 16], help='Output stride (com --arch)')
+    parser.add_argument('--output', help='Arquivo .onnx de saída (padrão: ao lado do checkpoint)')
+    parser.add_argument('--opset', type=int, default=OPSET_PADRAO, help='Versão do opset ONNX')
+    parser.add_argument('--verificar', action='store_true', help='Compara ONNX Runtime com PyTorch após exportar')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO, help='Diferença relativa máxima aceita nos logits')
+    args = parser.parse_args()
+
+    if bool(args.model_path) == bool(args.arch):
+        parser.error('informe exatamente um entre --model_path e --arch')
+
+    if args.model_path:
+        from inference_test import carregar_modelo
+        model = carregar_modelo(args.model_path, torch.device('cpu'))
+        saida = args.output or caminho_onnx_para(args.model_path)
+    else:
+        import network
+        model = network.modeling.__dict__[args.arch](num_classes=args.num_classes,
+                                                     output_stride=args.output_stride,
+                                                     pretrained_backbone=False)
+        saida = args.output or f"{args.arch}_os{args.output_stride}.onnx"
+
+    print(f"Exportando para '{saida}' (opset {args.opset})...", file=sys.stderr)
+    exportar_onnx(model, saida, opset=args.opset)
+    print("Exportação concluída.", file=sys.stderr)
+
+    if args.verificar:
+        try:
+            diferenca = verificar_equivalencia(model, ModeloOnnx(saida), tolerancia=args.tolerancia)
+            print(f"OK: ONNX equivalente ao PyTorch (max |diff| relativo = {diferenca:.2e})", file=sys.stderr)
+        except RuntimeError as e:
+            print(f"FALHA: {e}", file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,65 @@
+import argparse
+import copy
+import json
+import sys
+
+import torch
+
+from inference_test import carregar_modelo
+from model_compare import carregar_tensores, comparar_predicoes, medir_latencia, prever_mapas
+from network.stride import get_output_stride, set_output_stride
+
+# --- RELATÓRIO DE OUTPUT STRIDE ---
+# O modelo de produção foi treinado em output stride 8 (layer3/layer4 dilatados
+# em 1/8 da resolução). Trocando para OS16 sem retreinar (network.stride) o
+# backbone faz ~3-4x menos contas. Este relatório mede, em fotos reais, quanto
+# fica mais rápido e quanto muda a contagem de pixels por classe, para decidir
+# se o OS16 serve para prévias (inference_test.py --output_stride 16).
+#
+# Uso:
+#   python output_stride_report.py --model_path Var_2plus_weights_28.Pt --image_dir fotos/ --output_strides 16
+
+
+def relatorio_output_stride(model, tensores, output_strides, repeticoes=5):
+    """Latência e deriva da contagem de pixels de cada output stride em relação ao do modelo."""
+    entrada = tensores[0]
+    referencia = prever_mapas(model, tensores)
+    latencia_ref = medir_latencia(model, entrada, repeticoes=repeticoes)
+    relatorio = {
+        "output_stride_original": get_output_stride(model),
+        "latencia_original": latencia_ref,
+        "imagens_avaliadas": len(tensores),
+        "variantes": [],
+    }
+    for output_stride in output_strides:
+        variante = set_output_stride(copy.deepcopy(model), output_stride)
+        latencia = medir_latencia(variante, entrada, repeticoes=repeticoes)
+        relatorio["variantes"].append({
+            "output_stride": output_stride,
+            "latencia": latencia,
+            "speedup": round(latencia_ref["p50_ms"] / latencia["p50_ms"], 2),
+            **comparar_predicoes(referencia, prever_mapas(variante, tensores)),
+        })
+        del variante
+    return relatorio
+
+
+# --- PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Velocidade e deriva de contagem ao trocar o output stride')
+    parser.add_argument('--model_path', required=True, help='Checkpoint (.Pt com o objeto completo)')
+    parser.add_argument('--image_dir', required=True, help='Pasta com fotos da obra')
+    parser.add_argument('--output_strides', nargs='+', type=int, default=[16], choices=[8, 16, 32])
+    parser.add_argument('--max_images', type=int, default=None, help='Máximo de fotos avaliadas')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Forwards medidos por variante na latência')
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = carregar_modelo(args.model_path, device)
+    print(f"Modelo carregado de '{args.model_path}'", file=sys.stderr)
+    tensores = carregar_tensores(args.image_dir, device, limite=args.max_images)
+    print(f"Avaliando {len(tensores)} foto(s)...", file=sys.stderr)
+
+    relatorio = relatorio_output_stride(model, tensores, args.output_strides, repeticoes=args.repeticoes)
+    # Relatório em JSON no stdout (mesmo padrão dos outros scripts)
+    print(json.dumps(relatorio, indent=2))
@@ -0,0 +1,65 @@
+import argparse
+import copy
+import json
+import sys
+
+import torch
+
+from inference_test import carregar_modelo
+from model_compare import carregar_tensores, comparar_predicoes, medir_latencia, prever_mapas
+from network.precision import to_bfloat16_cpu
+
+# --- RELATÓRIO DE PRECISÃO (FP32 x BF16 NA CPU) ---
+# Nos Xeon com AMX/AVX512-BF16 o forward em fp32 NCHW deixa a maior parte da
+# vazão sem uso. O modo bf16 (inference_test.py --precision bf16) roda o modelo
+# em channels_last sob autocast bfloat16 e devolve os logits em fp32, de modo
+# que o argmax e a contagem de pixels continuam exatos. Este relatório mede, em
+# fotos reais, o ganho de velocidade e quantos pixels mudam de classe.
+#
+# Uso:
+#   python precision_report.py --model_path Var_2plus_weights_28.Pt --image_dir fotos/
+
+
+def relatorio_precisao(model, tensores, repeticoes=5):
+    """Latência fp32 x bf16 e divergência do mapa de predição bf16 em relação ao fp32."""
+    entrada = tensores[0]
+    latencia_fp32 = medir_latencia(model, entrada, repeticoes=repeticoes)
+    referencia = prever_mapas(model, tensores)
+
+    # to(channels_last) altera o modelo no lugar: a cópia preserva a referência fp32
+    bf16 = to_bfloat16_cpu(copy.deepcopy(model))
+    latencia_bf16 = medir_latencia(bf16, entrada, repeticoes=repeticoes)
+    comparacao = comparar_predicoes(referencia, prever_mapas(bf16, tensores))
+    concordancia = comparacao["concordancia_pixels_percentual"]
+    return {
+        "cpu": torch.backends.cpu.get_cpu_capability(),
+        "threads": torch.get_num_threads(),
+        "imagens_avaliadas": len(tensores),
+        "latencia_fp32": latencia_fp32,
+        "latencia_bf16": latencia_bf16,
+        "speedup": round(latencia_fp32["p50_ms"] / latencia_bf16["p50_ms"], 2),
+        "pixels_divergentes_percentual": round(100 - concordancia, 3) if concordancia is not None else None,
+        **comparacao,
+    }
+
+
+# --- PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Velocidade e divergência do modo bf16 em relação ao fp32 (CPU)')
+    parser.add_argument('--model_path', required=True, help='Checkpoint (.Pt com o objeto completo)')
+    parser.add_argument('--image_dir', required=True, help='Pasta com fotos da obra')
+    parser.add_argument('--max_images', type=int, default=None, help='Máximo de fotos avaliadas')
+    parser.add_argument('--optimize', action='store_true',
+                        help='Aplica network.optimize_for_inference antes (compara as duas versões otimizadas)')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Forwards medidos por variante na latência')
+    args = parser.parse_args()
+
+    device = torch.device("cpu")
+    model = carregar_modelo(args.model_path, device, otimizar=args.optimize)
+    print(f"Modelo carregado de '{args.model_path}'", file=sys.stderr)
+    tensores = carregar_tensores(args.image_dir, device, limite=args.max_images)
+    print(f"Avaliando {len(tensores)} foto(s)...", file=sys.stderr)
+
+    relatorio = relatorio_precisao(model, tensores, repeticoes=args.repeticoes)
+    # Relatório em JSON no stdout (mesmo padrão dos outros scripts)
+    print(json.dumps(relatorio, indent=2))
@@ -0,0 +1,175 @@
+import hashlib
+import io
+import json
+import os
+import sys
+
+import numpy as np
+
+# --- CACHE DE PREDIÇÕES (ENDEREÇADO PELO CONTEÚDO) ---
+# Na interface o usuário pode pedir a inferência da mesma foto várias vezes; cada
+# pedido rodaria o forward inteiro de novo. A chave do cache é o hash do conteúdo
+# da foto + o hash dos pesos do modelo + a configuração de pré-processamento e
+# execução (tiling, output stride, precisão...). Cada entrada (um .npz) guarda o
+# mapa de predição comprimido, a contagem de pixels por classe e o overlay já
+# codificado. Num acerto o modelo nem é carregado: só o progresso é atualizado.
+#
+# O espaço em disco é limitado: passando do limite, as entradas usadas há mais
+# tempo (mtime, renovado a cada acerto) são apagadas primeiro (LRU). Para não
+# listar a pasta inteira a cada entrada nova, o tamanho total fica estimado em
+# tamanho.json (somado a cada gravação); a pasta só é percorrida quando a
+# estimativa passa do limite ou a cada RECONTAGEM_CADA gravações (corrige a
+# estimativa quando vários processos gravam ao mesmo tempo).
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+PASTA_CACHE = os.path.join(base_dir, "cache_predicoes")
+LIMITE_MB_PADRAO = 512
+VERSAO_CACHE = 1
+ARQUIVO_HASHES_MODELO = 'modelos.json'
+ARQUIVO_TAMANHO = 'tamanho.json'
+RECONTAGEM_CADA = 256
+FRACAO_APOS_DESPEJO = 0.9  # o despejo libera até esta fração do limite (folga até o próximo)
+BLOCO_LEITURA = 1024 * 1024
+
+
+def hash_arquivo(caminho):
+    """SHA-256 do conteúdo do arquivo (lido em blocos)."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(BLOCO_LEITURA), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+class CachePredicoes:
+    """Cache em disco das predições de UM modelo com UMA configuração."""
+
+    def __init__(self, model_path, config, pasta=PASTA_CACHE, limite_mb=LIMITE_MB_PADRAO):
+        self.pasta = pasta
+        self.limite_bytes = int(limite_mb * 1024 * 1024)
+        os.makedirs(pasta, exist_ok=True)
+        prefixo = {"versao": VERSAO_CACHE, "modelo": self._hash_modelo(model_path), "config": config}
+        self.prefixo = json.dumps(prefixo, sort_keys=True).encode('utf-8')
+
+    def _hash_modelo(self, model_path):
+        """Hash dos pesos, recalculado só quando o arquivo muda (tamanho/mtime)."""
+        caminho_hashes = os.path.join(self.pasta, ARQUIVO_HASHES_MODELO)
+        try:
+            with open(caminho_hashes, 'r', encoding='utf-8') as f:
+                hashes = json.load(f)
+        except (OSError, ValueError):
+            hashes = {}
+        info = os.stat(model_path)
+        assinatura = [info.st_size, info.st_mtime_ns]
+        registro = hashes.get(os.path.abspath(model_path))
+        if registro and registro["assinatura"] == assinatura:
+            return registro["sha256"]
+        sha256 = hash_arquivo(model_path)
+        hashes[os.path.abspath(model_path)] = {"assinatura": assinatura, "sha256": sha256}
+        temporario = f"{caminho_hashes}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(hashes, f, indent=2)
+        os.replace(temporario, caminho_hashes)
+        return sha256
+
+    def chave(self, image_path):
+        """Chave da foto: hash(conteúdo da foto + pesos + configuração)."""
+        h = hashlib.sha256(self.prefixo)
+        h.update(hash_arquivo(image_path).encode('ascii'))
+        return h.hexdigest()
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, chave[:2], chave + '.npz')
+
+    def ler(self, chave):
+        """Entrada do cache ({'mapa', 'contagem', 'overlay', 'nome_overlay'}) ou None."""
+        caminho = self._caminho(chave)
+        try:
+            with np.load(caminho) as dados:
+                meta = json.loads(dados['meta'].tobytes().decode('utf-8'))
+                entrada = {"mapa": dados['mapa'], "overlay": dados['overlay'].tobytes(), **meta}
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(caminho)  # LRU: marca o uso
+        except OSError:
+            pass
+        return entrada
+
+    def guardar(self, chave, prediction_map, contagem, arquivo_overlay):
+        """Grava a entrada (escrita atômica) e aplica o limite de espaço."""
+        with open(arquivo_overlay, 'rb') as f:
+            overlay = f.read()
+        meta = {"contagem": contagem, "nome_overlay": os.path.basename(arquivo_overlay)}
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer, mapa=prediction_map,
+            overlay=np.frombuffer(overlay, dtype=np.uint8),
+            meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+        )
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(temporario, caminho)
+        self._somar_gravacao(len(buffer.getvalue()))
+
+    def _ler_tamanho(self):
+        try:
+            with open(os.path.join(self.pasta, ARQUIVO_TAMANHO), 'r', encoding='utf-8') as f:
+                estado = json.load(f)
+            return int(estado["bytes"]), int(estado["gravacoes"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _gravar_tamanho(self, total, gravacoes):
+        caminho = os.path.join(self.pasta, ARQUIVO_TAMANHO)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        try:
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump({"bytes": total, "gravacoes": gravacoes}, f)
+            os.replace(temporario, caminho)
+        except OSError:
+            pass  # sem a estimativa, a próxima gravação percorre a pasta
+
+    def _somar_gravacao(self, tamanho):
+        """Soma a entrada nova à estimativa; percorre a pasta só quando necessário."""
+        estado = self._ler_tamanho()
+        if estado is None or estado[1] + 1 >= RECONTAGEM_CADA or estado[0] + tamanho > self.limite_bytes:
+            self.despejar()
+        else:
+            self._gravar_tamanho(estado[0] + tamanho, estado[1] + 1)
+
+    def despejar(self):
+        """
+        Percorre o cache e, se passou do limite, apaga as entradas menos usadas até
+        FRACAO_APOS_DESPEJO do limite; a estimativa de tamanho é refeita. Devolve
+        quantas entradas apagou.
+        """
+        entradas = []
+        for raiz, _, arquivos in os.walk(self.pasta):
+            for nome in arquivos:
+                if nome.endswith('.npz'):
+                    caminho = os.path.join(raiz, nome)
+                    try:
+                        info = os.stat(caminho)
+                    except OSError:
+                        continue  # apagado por outro processo
+                    entradas.append((info.st_mtime, info.st_size, caminho))
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        alvo = self.limite_bytes if total <= self.limite_bytes else int(self.limite_bytes * FRACAO_APOS_DESPEJO)
+        apagadas = 0
+        for _, tamanho, caminho in sorted(entradas):
+            if total <= alvo:
+                break
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            total -= tamanho
+            apagadas += 1
+        self._gravar_tamanho(total, 0)
+        if apagadas:
+            print(f"Cache de predições: {apagadas} entrada(s) antiga(s) removida(s)", file=sys.stderr)
+        return apagadas
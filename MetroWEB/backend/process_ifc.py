@@ -1,4 +1,3 @@
-import ifcopenshell
 import json
 import sys
 import os
@@ -23,49 +22,74 @@ MAPEAMENTO_CLASSES = {
 }
 # -----------------------------------------------------------
 
-def encontrar_area_no_ifc(ifc_file, nome_area_ifc):
-    """Encontra um elemento espacial (Andar ou Espaço) pelo nome técnico."""
-    for element_type in ['IfcBuildingStorey', 'IfcSpace']:
-        elements = ifc_file.by_type(element_type)
-        for element in elements:
-            if element.Name == nome_area_ifc:
-                return element
-    return None
-
-def contar_elementos_na_area(ifc_file, area_encontrada):
-    """Conta os elementos (baseado no MAPEAMENTO_CLASSES) dentro de uma área espacial."""
-    plano_esperado = { nome_ia: 0 for nome_ia in MAPEAMENTO_CLASSES.keys() }
-    plano_esperado['total_elementos_geral'] = 0
-
-    for nome_ia, tipos_ifc in MAPEAMENTO_CLASSES.items():
-        for tipo_ifc in tipos_ifc:
-            elementos = ifc_file.by_type(tipo_ifc)
-            for elemento in elementos:
-                try:
-                    if elemento.ContainedInStructure and len(elemento.ContainedInStructure) > 0:
-                        estrutura_pai = elemento.ContainedInStructure[0].RelatingStructure
-                        if estrutura_pai.id() == area_encontrada.id():
-                            plano_esperado[nome_ia] += 1
-                            plano_esperado['total_elementos_geral'] += 1
-                except Exception:
-                    pass # Ignora elementos sem estrutura
-    return plano_esperado
-
-def gerar_plano_unico(base_dir, ifc_file, nome_pasta_limpo, nome_ifc):
-    """Gera um único arquivo de plano base."""
+# --- ÍNDICE DE CONTENÇÃO (montado UMA vez por arquivo IFC carregado) ---
+class IndiceContencao:
+    """
+    Nome técnico -> elemento espacial (Andar ou Espaço) e elemento espacial ->
+    contagem por grupo do MAPEAMENTO_CLASSES, montados numa única passada pelas
+    relações IfcRelContainedInSpatialStructure. Cada plano sai do índice em O(1).
+    """
+    def __init__(self, ifc_file):
+        # 1. Nomes: Andares antes de Espaços; em nomes repetidos vale o primeiro encontrado
+        self.areas_por_nome = {}
+        for element_type in ['IfcBuildingStorey', 'IfcSpace']:
+            for element in ifc_file.by_type(element_type):
+                if element.Name is not None and element.Name not in self.areas_por_nome:
+                    self.areas_por_nome[element.Name] = element
+
+        # 2. Contagens: cada elemento conta só na sua primeira estrutura espacial
+        self.contagens_por_area = {}
+        grupo_por_classe = {}  # ex: 'IfcWallStandardCase' -> 'total_concreto' (ou None)
+        elementos_vistos = set()
+        for rel in ifc_file.by_type('IfcRelContainedInSpatialStructure'):
+            estrutura = rel.RelatingStructure
+            if estrutura is None:
+                continue
+            for elemento in rel.RelatedElements or ():
+                if elemento.id() in elementos_vistos:
+                    continue
+                elementos_vistos.add(elemento.id())
+
+                classe = elemento.is_a()
+                if classe not in grupo_por_classe:
+                    grupo_por_classe[classe] = next(
+                        (nome_ia for nome_ia, tipos_ifc in MAPEAMENTO_CLASSES.items()
+                         if any(elemento.is_a(tipo_ifc) for tipo_ifc in tipos_ifc)),
+                        None
+                    )
+                nome_ia = grupo_por_classe[classe]
+                if nome_ia is None:
+                    continue
+
+                contagem = self.contagens_por_area.setdefault(estrutura.id(), {})
+                contagem[nome_ia] = contagem.get(nome_ia, 0) + 1
+
+    def encontrar_area(self, nome_area_ifc):
+        """Encontra um elemento espacial (Andar ou Espaço) pelo nome técnico."""
+        return self.areas_por_nome.get(nome_area_ifc)
+
+    def contar_elementos(self, area_encontrada):
+        """Conta os elementos (baseado no MAPEAMENTO_CLASSES) dentro de uma área espacial."""
+        contagem = self.contagens_por_area.get(area_encontrada.id(), {})
+        plano_esperado = { nome_ia: contagem.get(nome_ia, 0) for nome_ia in MAPEAMENTO_CLASSES.keys() }
+        plano_esperado['total_elementos_geral'] = sum(plano_esperado.values())
+        return plano_esperado
+
+def gerar_plano_unico(base_dir, catalogo, nome_pasta_limpo, nome_ifc):
+    """Gera um único arquivo de plano base a partir do catálogo do IFC."""
     print(f"\nProcessando pasta: '{nome_pasta_limpo}' (Mapeada para: '{nome_ifc}')")
     
-    # 1. Encontrar a área no IFC
-    area_ifc = encontrar_area_no_ifc(ifc_file, nome_ifc)
+    # 1. Encontrar a área no catálogo
+    area_ifc = catalogo['planos'].get(nome_ifc)
     
     if not area_ifc:
         print(f"  [ERRO] A área técnica '{nome_ifc}' não foi encontrada no IFC. Pulando...")
         return False
         
-    print(f"  -> Área '{nome_ifc}' encontrada (ID: {area_ifc.id()}). Contando elementos...")
+    print(f"  -> Área '{nome_ifc}' encontrada (ID: {area_ifc['id']}).")
     
-    # 2. Contar os elementos dentro dela
-    plano_json = contar_elementos_na_area(ifc_file, area_ifc)
+    # 2. Plano já contado (índice de contenção, ver ifc_cache.py)
+    plano_json = area_ifc['plano']
     
     # --- MUDANÇA AQUI ---
     # 3. Salvar o arquivo de plano na pasta 'json_files'
@@ -89,28 +113,35 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Gerador de Plano Base BIM.')
     parser.add_argument('--folder', type=str, help='Nome da pasta amigável (ex: "joao")')
     parser.add_argument('--ifc_name', type=str, help='Nome técnico da área no IFC (ex: "EST - 04.PLATAFORMA")')
+    parser.add_argument('--rebuild_cache', action='store_true', help='Ignora o catálogo salvo e relê o IFC')
+    parser.add_argument('--ifc', nargs='+',
+                        help='Arquivos IFC ou pastas com IFCs (padrão: variável IFC_PATHS ou o IFC da pasta /backend). '
+                             'Com vários modelos as áreas viram "<modelo>::<área>"')
     args = parser.parse_args()
 
     # base_dir já foi definido no topo
+    from ifc_cache import obter_catalogos, resolver_ifcs
     
-    # 1. Carregar o arquivo IFC (uma única vez)
-    if not os.path.exists(CAMINHO_DO_IFC):
-        print(f"Erro CRÍTICO: Arquivo IFC não encontrado em '{CAMINHO_DO_IFC}'.")
+    # 1. Carregar o catálogo do(s) IFC(s) (só abre um IFC se ele mudou desde o último catálogo)
+    try:
+        caminhos_ifc = resolver_ifcs(args.ifc)
+    except FileNotFoundError as e:
+        print(f"Erro CRÍTICO: {e}")
         print("Certifique-se que 'MB-1.04.04.00-6B3-1001-1_v32.ifc' está na pasta /backend.", file=sys.stderr)
         sys.exit(1)
         
     try:
-        print(f"Carregando arquivo BIM de: {CAMINHO_DO_IFC}")
-        ifc_file = ifcopenshell.open(CAMINHO_DO_IFC)
+        catalogo = obter_catalogos(caminhos_ifc, reconstruir=args.rebuild_cache, log=print)
     except Exception as e:
         print(f"Erro CRÍTICO ao abrir o arquivo IFC: {e}", file=sys.stderr)
         sys.exit(1)
+    print(f"Catálogo: {len(catalogo['planos'])} áreas com plano disponível.")
 
     # --- MODO 2: GERAÇÃO ÚNICA (Chamado pelo Node.js) ---
     if args.folder and args.ifc_name:
         print(f"Modo de Geração Única para pasta: {args.folder}")
         nome_pasta_limpo = args.folder.lower().strip()
-        gerar_plano_unico(base_dir, ifc_file, nome_pasta_limpo, args.ifc_name)
+        gerar_plano_unico(base_dir, catalogo, nome_pasta_limpo, args.ifc_name)
     
     # --- MODO 1: GERAÇÃO EM LOTE (Legado, para rodar manualmente) ---
     else:
@@ -130,7 +161,7 @@ if __name__ == "__main__":
 
         for nome_pasta, nome_ifc in mapeamento_pastas.items():
             nome_pasta_limpo = nome_pasta.lower().strip()
-            gerar_plano_unico(base_dir, ifc_file, nome_pasta_limpo, nome_ifc)
+            gerar_plano_unico(base_dir, catalogo, nome_pasta_limpo, nome_ifc)
             
         print("-" * 50)
         print("Geração de planos em lote concluída.")
\ No newline at end of file
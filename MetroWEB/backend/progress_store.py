@@ -0,0 +1,199 @@
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# --- ARMAZENAMENTO TRANSACIONAL DO PROGRESSO ---
+# O progresso de cada área fica num SQLite (modo WAL) em json_files/. Cada
+# inferência faz, numa única transação, o "recorde" por classe
+# (MIN(MAX(antigo, novo), limite do plano)) e grava a observação no histórico
+# (imagem, data, pixels por classe). Duas inferências simultâneas na mesma área
+# não perdem atualização e o custo não cresce com o histórico.
+#
+# O progresso_<area>.json continua sendo escrito (dentro da transação, de forma
+# atômica) como cópia de leitura para o server.js.
+#
+# Uso:
+#   python progress_store.py --area plataforma          (progresso atual)
+#   python progress_store.py --area plataforma --historico 20
+#   python progress_store.py --migrar                   (importa os progresso_*.json)
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+JSON_DIR = os.path.join(base_dir, "json_files")
+ARQUIVO_BANCO = os.path.join(JSON_DIR, "progresso.sqlite3")
+VERSAO_ESQUEMA = 1
+CHAVE_TOTAL = 'elementos_executados_geral'
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS progresso (
+    area TEXT NOT NULL,
+    classe TEXT NOT NULL,
+    pixels INTEGER NOT NULL,
+    PRIMARY KEY (area, classe)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS observacoes (
+    id INTEGER PRIMARY KEY,
+    area TEXT NOT NULL,
+    imagem TEXT,
+    criado_em REAL NOT NULL,
+    pixels TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_observacoes_area_data ON observacoes (area, criado_em);
+CREATE INDEX IF NOT EXISTS idx_observacoes_imagem ON observacoes (imagem);
+"""
+
+
+# --- 1. CONEXÃO E MIGRAÇÃO ---
+def abrir(caminho=ARQUIVO_BANCO):
+    """Abre o banco em modo WAL (cria o esquema e migra os JSON antigos na primeira vez)."""
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    # isolation_level=None: as transações são abertas explicitamente (BEGIN IMMEDIATE)
+    conexao = sqlite3.connect(caminho, timeout=30, isolation_level=None)
+    conexao.execute("PRAGMA journal_mode=WAL")
+    conexao.execute("PRAGMA synchronous=NORMAL")
+    if conexao.execute("PRAGMA user_version").fetchone()[0] < VERSAO_ESQUEMA:
+        with transacao(conexao):
+            # Outro processo pode ter migrado enquanto este esperava o lock
+            if conexao.execute("PRAGMA user_version").fetchone()[0] < VERSAO_ESQUEMA:
+                # executescript() faria COMMIT no meio da transação
+                for comando in ESQUEMA.split(';'):
+                    if comando.strip():
+                        conexao.execute(comando)
+                migrar_json(conexao, os.path.dirname(caminho))
+                conexao.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+    return conexao
+
+
+class transacao:
+    """BEGIN IMMEDIATE ... COMMIT (ou ROLLBACK em caso de erro). Escritores concorrentes esperam o lock."""
+
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def __enter__(self):
+        self.conexao.execute("BEGIN IMMEDIATE")
+        return self.conexao
+
+    def __exit__(self, tipo, valor, tb):
+        self.conexao.execute("ROLLBACK" if tipo else "COMMIT")
+        return False
+
+
+def separar_ilegivel(caminho):
+    """Renomeia um progresso_<area>.json ilegível para <arquivo>.ilegivel (sem apagar um anterior)."""
+    destino = f"{caminho}.ilegivel"
+    if os.path.exists(destino):
+        destino = f"{caminho}.{int(time.time())}.ilegivel"
+    try:
+        os.replace(caminho, destino)
+    except OSError as e:
+        return f"não foi possível renomeá-lo: {e}"
+    return f"movido para '{destino}'"
+
+
+def migrar_json(conexao, json_dir=JSON_DIR):
+    """Importa os progresso_<area>.json existentes (áreas que ainda não estão no banco)."""
+    migradas = 0
+    for caminho in sorted(glob.glob(os.path.join(json_dir, "progresso_*.json"))):
+        area = os.path.basename(caminho)[len("progresso_"):-len(".json")]
+        if conexao.execute("SELECT 1 FROM progresso WHERE area = ? LIMIT 1", (area,)).fetchone():
+            continue
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                progresso = json.load(f)
+        except (OSError, ValueError) as e:
+            # A área começa vazia no banco e a próxima salvar_copia_json sobrescreveria
+            # o arquivo: guarda ele ao lado para recuperação manual
+            print(f"Aviso: '{caminho}' ilegível, não migrado ({e}); {separar_ilegivel(caminho)}", file=sys.stderr)
+            continue
+        conexao.executemany(
+            "INSERT INTO progresso (area, classe, pixels) VALUES (?, ?, ?)",
+            [(area, classe, int(valor)) for classe, valor in progresso.items()
+             if classe != CHAVE_TOTAL and isinstance(valor, (int, float))]
+        )
+        migradas += 1
+    if migradas:
+        print(f"Progresso de {migradas} área(s) migrado de {json_dir}", file=sys.stderr)
+    return migradas
+
+
+# --- 2. LEITURA E ESCRITA ---
+def ler_progresso(conexao, area):
+    """Progresso atual da área: {classe: pixels}."""
+    return dict(conexao.execute("SELECT classe, pixels FROM progresso WHERE area = ?", (area,)))
+
+
+def registrar(conexao, area, contagem, limites, observacoes=(), classes=None, json_dir=JSON_DIR, substituir=False):
+    """
+    Aplica o recorde por classe e grava as observações numa única transação.
+
+    contagem: {classe: pixels} já combinada (ex: máximo entre as fotos do lote).
+    limites: {classe: limite do plano base}.
+    observacoes: [(imagem_id, {classe: pixels})] para o histórico.
+    classes: classes somadas no total geral (padrão: as da contagem salva).
+    substituir: apaga o progresso anterior da área antes (recálculo completo).
+    Devolve o progresso da área com o total geral, no formato do progresso_<area>.json.
+    """
+    agora = time.time()
+    with transacao(conexao):
+        if substituir:
+            conexao.execute("DELETE FROM progresso WHERE area = ?", (area,))
+        conexao.executemany(
+            "INSERT INTO observacoes (area, imagem, criado_em, pixels) VALUES (?, ?, ?, ?)",
+            [(area, imagem, agora, json.dumps(pixels)) for imagem, pixels in observacoes]
+        )
+        conexao.executemany(
+            "INSERT INTO progresso (area, classe, pixels) VALUES (?1, ?2, MIN(?3, ?4)) "
+            "ON CONFLICT (area, classe) DO UPDATE SET pixels = MIN(MAX(pixels, ?3), ?4)",
+            [(area, classe, int(pixels), int(limites.get(classe, 0))) for classe, pixels in contagem.items()]
+        )
+        progresso = ler_progresso(conexao, area)
+        progresso[CHAVE_TOTAL] = sum(progresso.get(c, 0) for c in (classes or list(progresso)))
+        # Cópia para o server.js, escrita ainda com o lock de escrita (ordem garantida)
+        salvar_copia_json(json_dir, area, progresso)
+    return progresso
+
+
+def salvar_copia_json(json_dir, area, progresso):
+    """Grava progresso_<area>.json de forma atômica (arquivo temporário + rename)."""
+    caminho = os.path.join(json_dir, f"progresso_{area}.json")
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(progresso, f, indent=4)
+    os.replace(temporario, caminho)
+
+
+def historico(conexao, area, limite=50):
+    """Últimas observações da área (mais recentes primeiro)."""
+    linhas = conexao.execute(
+        "SELECT imagem, criado_em, pixels FROM observacoes WHERE area = ? ORDER BY criado_em DESC, id DESC LIMIT ?",
+        (area, limite)
+    )
+    return [{"imagem": imagem, "criado_em": criado_em, "pixels": json.loads(pixels)}
+            for imagem, criado_em, pixels in linhas]
+
+
+# --- 3. PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Consulta/migração do banco de progresso')
+    parser.add_argument('--banco', default=ARQUIVO_BANCO, help='Arquivo SQLite do progresso')
+    parser.add_argument('--area', help='Área a consultar (ex: "plataforma")')
+    parser.add_argument('--historico', type=int, metavar='N', help='Mostra as N últimas observações da área')
+    parser.add_argument('--migrar', action='store_true', help='Importa os progresso_*.json que ainda não estão no banco')
+    args = parser.parse_args()
+
+    conexao = abrir(args.banco)
+    if args.migrar:
+        with transacao(conexao):
+            migrar_json(conexao, os.path.dirname(os.path.abspath(args.banco)))
+    if args.area:
+        saida = {"area": args.area, "progresso": ler_progresso(conexao, args.area)}
+        if args.historico:
+            saida["historico"] = historico(conexao, args.area, args.historico)
+        print(json.dumps(saida, indent=2))
+    conexao.close()
@@ -0,0 +1,101 @@
+import argparse
+import copy
+import json
+import os
+import sys
+
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from inference_test import carregar_modelo
+from model_compare import carregar_tensores, comparar_predicoes, medir_latencia, prever_mapas, tamanho_modelo_mb
+
+# --- QUANTIZAÇÃO INT8 PÓS-TREINO (CPU) ---
+# Quantiza o DeepLabV3+ inteiro (stem e blocos Bottleneck do ResNet, ramos do
+# ASPP e DeepLabHeadV3Plus) com FX graph mode: o grafo é tracado, os Conv+BN+ReLU
+# são fundidos, observadores medem as ativações em fotos reais da obra e o
+# modelo é convertido para kernels INT8 (fbgemm/x86). As somas residuais dos
+# Bottleneck e o torch.cat do ASPP/head viram ops quantizadas sem mudar o código
+# de network/.
+#
+# Uso:
+#   python quantize_model.py --model_path Var_2plus_weights_28.Pt --calib_dir fotos_calibracao/ \
+#       --output Var_2plus_weights_28_int8.Pt
+#
+# O modelo é salvo em TorchScript (tracado e congelado, com altura/largura
+# dinâmicas) e pode ser usado diretamente em inference_test.py --model_path.
+
+
+def quantizar_modelo(model, tensores_calibracao, engine='x86'):
+    """Quantização estática INT8: prepara o grafo, calibra com as fotos e converte."""
+    torch.backends.quantized.engine = engine
+    model = copy.deepcopy(model).cpu().eval()
+    qconfig_mapping = get_default_qconfig_mapping(engine)
+    exemplo = (tensores_calibracao[0].cpu(),)
+
+    preparado = prepare_fx(model, qconfig_mapping, exemplo)
+    with torch.no_grad():
+        for i, tensor in enumerate(tensores_calibracao, start=1):
+            preparado(tensor.cpu())
+            print(f"  calibração {i}/{len(tensores_calibracao)}", file=sys.stderr)
+    return convert_fx(preparado)
+
+
+def salvar_quantizado(model_int8, exemplo, caminho):
+    """Salva o modelo INT8 como TorchScript (módulos quantizados não são serializáveis com pickle)."""
+    with torch.no_grad():
+        tracado = torch.jit.freeze(torch.jit.trace(model_int8, exemplo.cpu()))
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    torch.jit.save(tracado, caminho)
+
+
+def relatorio_quantizacao(model_float, model_int8, tensores_avaliacao, repeticoes=5):
+    """Latência, tamanho e deriva da contagem de pixels por classe (INT8 vs float)."""
+    entrada = tensores_avaliacao[0].cpu()
+    latencia_float = medir_latencia(model_float, entrada, repeticoes=repeticoes)
+    latencia_int8 = medir_latencia(model_int8, entrada, repeticoes=repeticoes)
+    comparacao = comparar_predicoes(prever_mapas(model_float, tensores_avaliacao),
+                                    prever_mapas(model_int8, tensores_avaliacao))
+    return {
+        "latencia_float": latencia_float,
+        "latencia_int8": latencia_int8,
+        "speedup": round(latencia_float["p50_ms"] / latencia_int8["p50_ms"], 2),
+        "tamanho_float_mb": tamanho_modelo_mb(model_float),
+        "tamanho_int8_mb": tamanho_modelo_mb(model_int8),
+        "imagens_avaliadas": len(tensores_avaliacao),
+        **comparacao,
+    }
+
+
+# --- PONTO DE ENTRADA (MAIN) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Quantização INT8 pós-treino do DeepLabV3+ para CPU')
+    parser.add_argument('--model_path', required=True, help='Checkpoint float (.Pt com o objeto completo)')
+    parser.add_argument('--calib_dir', required=True, help='Pasta com fotos representativas da obra (calibração)')
+    parser.add_argument('--eval_dir', help='Pasta com fotos para o relatório (padrão: as de calibração)')
+    parser.add_argument('--max_calib', type=int, default=32, help='Máximo de fotos usadas na calibração')
+    parser.add_argument('--output', help='Arquivo do modelo quantizado (padrão: <modelo>_int8.Pt)')
+    parser.add_argument('--engine', default='x86', choices=['x86', 'fbgemm', 'qnnpack', 'onednn'],
+                        help='Backend de kernels quantizados')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Forwards medidos por modelo na latência')
+    args = parser.parse_args()
+
+    device = torch.device('cpu')
+    model_float = carregar_modelo(args.model_path, device)
+    print(f"Modelo float carregado de '{args.model_path}'", file=sys.stderr)
+
+    calibracao = carregar_tensores(args.calib_dir, device, limite=args.max_calib)
+    print(f"Calibrando com {len(calibracao)} foto(s)...", file=sys.stderr)
+    model_int8 = quantizar_modelo(model_float, calibracao, engine=args.engine)
+
+    saida = args.output or os.path.splitext(args.model_path)[0] + '_int8.Pt'
+    salvar_quantizado(model_int8, calibracao[0], saida)
+    print(f"Modelo INT8 salvo em '{saida}'", file=sys.stderr)
+
+    avaliacao = carregar_tensores(args.eval_dir, device) if args.eval_dir else calibracao
+    relatorio = relatorio_quantizacao(model_float, model_int8, avaliacao, repeticoes=args.repeticoes)
+    relatorio["modelo_int8"] = saida
+
+    # Relatório em JSON no stdout (mesmo padrão dos outros scripts)
+    print(json.dumps(relatorio, indent=2))
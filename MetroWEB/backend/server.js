@@ -93,6 +93,58 @@ const imgSchema = new mongoose.Schema({
 
 const Image = mongoose.model("Image", imgSchema);
 
+// -----------------------------------------------------
+// SERVIÇO IFC RESIDENTE (OPCIONAL)
+// -----------------------------------------------------
+// Com IFC_SERVICE_URL definido (ex: http://127.0.0.1:8766), áreas e planos base
+// vêm do ifc_service.py, que mantém o IFC em memória. Se o serviço não
+// responder, volta a rodar process_ifc.py / get_ifc_areas.py como antes.
+const IFC_SERVICE_URL = process.env.IFC_SERVICE_URL;
+
+function gerarPlanoBaseSpawn(pastaLimpa, ifcAreaName) {
+    const py = spawn("python", [
+        "process_ifc.py",
+        "--folder", pastaLimpa,
+        "--ifc_name", ifcAreaName
+    ]);
+
+    let pyError = '';
+    py.stderr.on("data", (data) => { pyError += data.toString(); });
+    py.stdout.on("data", (data) => { console.log(`PY (process_ifc): ${data}`); });
+
+    py.on("close", (code) => {
+        if (code !== 0) {
+            console.error(`❌ FALHA ao gerar plano base para ${pastaLimpa}: ${pyError}`);
+        } else {
+            console.log(`✅ Plano base para '${pastaLimpa}' gerado com sucesso.`);
+        }
+    });
+}
+
+async function gerarPlanoBase(pastaLimpa, ifcAreaName) {
+    console.log(`Gerando plano base para: ${pastaLimpa} (IFC: ${ifcAreaName})`);
+
+    if (IFC_SERVICE_URL) {
+        try {
+            const resp = await fetch(`${IFC_SERVICE_URL}/plano`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ folder: pastaLimpa, ifc_name: ifcAreaName })
+            });
+            const corpo = await resp.json();
+            if (resp.ok) {
+                console.log(`✅ Plano base para '${pastaLimpa}' gerado com sucesso (serviço IFC).`);
+            } else {
+                console.error(`❌ FALHA ao gerar plano base para ${pastaLimpa}: ${corpo.error}`);
+            }
+            return;
+        } catch (err) {
+            console.warn(`Serviço IFC indisponível (${err.message}). Usando process_ifc.py.`);
+        }
+    }
+    gerarPlanoBaseSpawn(pastaLimpa, ifcAreaName);
+}
+
 // Conexão MongoDB
 mongoose.connect(process.env.MONGO_URL)
     .then(() => console.log("✅ MongoDB conectado!"))
@@ -162,25 +214,7 @@ app.post('/api/captures/upload', async (req, res) => {
             console.log(`📁 Novo registro (sem imagem) criado: ${folder}`);
             
             // --- GERAÇÃO AUTOMÁTICA DO PLANO ---
-            console.log(`Gerando plano base para: ${pastaLimpa} (IFC: ${ifcAreaName})`);
-            
-            const py = spawn("python", [
-                "process_ifc.py", 
-                "--folder", pastaLimpa,
-                "--ifc_name", ifcAreaName
-            ]);
-            
-            let pyError = '';
-            py.stderr.on("data", (data) => { pyError += data.toString(); });
-            py.stdout.on("data", (data) => { console.log(`PY (process_ifc): ${data}`); });
-
-            py.on("close", (code) => {
-                if (code !== 0) {
-                    console.error(`❌ FALHA ao gerar plano base para ${pastaLimpa}: ${pyError}`);
-                } else {
-                    console.log(`✅ Plano base para '${pastaLimpa}' gerado com sucesso.`);
-                }
-            });
+            gerarPlanoBase(pastaLimpa, ifcAreaName);
             // --- FIM DA GERAÇÃO DO PLANO ---
 
             return res.status(201).json({ success: true, message: "Registro (sem imagem) criado." });
@@ -431,25 +465,7 @@ app.post('/upload', upload.array('images', 20), async (req, res) => {
             
             // --- GERAÇÃO AUTOMÁTICA DO PLANO (Se ifcAreaName foi enviado) ---
             if (ifcAreaName) {
-                console.log(`Gerando plano base para: ${pastaLimpa} (IFC: ${ifcAreaName})`);
-                
-                const py = spawn("python", [
-                    "process_ifc.py",
-                    "--folder", pastaLimpa,
-                    "--ifc_name", ifcAreaName
-                ]);
-                
-                let pyError = '';
-                py.stderr.on("data", (data) => { pyError += data.toString(); });
-                py.stdout.on("data", (data) => { console.log(`PY (process_ifc): ${data}`); });
-
-                py.on("close", (code) => {
-                    if (code !== 0) {
-                        console.error(`❌ FALHA ao gerar plano base para ${pastaLimpa}: ${pyError}`);
-                    } else {
-                        console.log(`✅ Plano base para '${pastaLimpa}' gerado com sucesso.`);
-                    }
-                });
+                gerarPlanoBase(pastaLimpa, ifcAreaName);
             }
             // --- FIM DA GERAÇÃO DO PLANO ---
             
@@ -610,7 +626,16 @@ app.get('/api/folders', async (req, res) => {
  
 
 // --- ROTA NOVA ADICIONADA (PARA LER AS ÁREAS DO IFC) ---
-app.get('/api/ifc/areas', (req, res) => {
+app.get('/api/ifc/areas', async (req, res) => {
+
+    if (IFC_SERVICE_URL) {
+        try {
+            const resp = await fetch(`${IFC_SERVICE_URL}/areas`);
+            return res.status(resp.ok ? 200 : 500).json(await resp.json());
+        } catch (err) {
+            console.warn(`Serviço IFC indisponível (${err.message}). Usando get_ifc_areas.py.`);
+        }
+    }
     
     const py = spawn("python", ["get_ifc_areas.py"]);
 